@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare :meth:`gpypi.enamer.Enamer.get_vars` called in a loop with
+:meth:`gpypi.enamer.Enamer.get_vars_many` over (uri, name, version)
+triples from enamer tests, each repeated as in a sync::
+
+    $ python benchmarks/bench_get_vars.py -n 20
+"""
+
+import timeit
+import logging
+import optparse
+
+import corpus
+from gpypi.enamer import Enamer
+from gpypi.exc import GPyPiInvalidAtom
+from gpypi.utils import memoize
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-n', '--number', type='int', default=20,
+        help="Times each triple is repeated [%default]")
+    parser.add_option('--no-memoize', action='store_true', default=False,
+        help="Disable memoization")
+    options, args = parser.parse_args()
+
+    logging.disable(logging.DEBUG)
+    memoize.enabled = not options.no_memoize
+    triples = corpus.triples() * options.number
+
+    def loop():
+        for triple in triples:
+            try:
+                Enamer.get_vars(*triple)
+            except GPyPiInvalidAtom:
+                pass
+
+    def many():
+        for triple, result in Enamer.get_vars_many(triples):
+            pass
+
+    for name, func in [('get_vars', loop), ('get_vars_many', many)]:
+        for f in memoize.functions:
+            f.cache_clear()
+        best = min(timeit.repeat(func, repeat=3, number=1))
+        print "%s: %d triples, %.2f us per triple" % (name, len(triples), best / len(triples) * 1e6)
+
+
+if __name__ == '__main__':
+    main()
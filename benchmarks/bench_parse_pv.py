@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark of :meth:`gpypi.enamer.Enamer.parse_pv`, comparing
+:class:`gpypi.version.VersionTokenizer` with the regex rules over
+versions from enamer tests, and over long versions that make regexes
+backtrack::
+
+    $ python benchmarks/bench_parse_pv.py -n 2000 -l 200
+"""
+
+import timeit
+import logging
+import optparse
+
+import corpus
+from gpypi.enamer import Enamer
+from gpypi.version import VersionTokenizer
+
+
+def measure(func, versions, number, repeat):
+    """Return best time per call in microseconds"""
+    def run():
+        for version in versions:
+            func(version)
+    best = min(timeit.repeat(run, repeat=repeat, number=number))
+    return best / (len(versions) * number) * 1e6
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-n', '--number', type='int', default=1000,
+        help="Passes over the corpus per measurement [%default]")
+    parser.add_option('-r', '--repeat', type='int', default=3,
+        help="Measurements, best is reported [%default]")
+    parser.add_option('-l', '--length', type='int', default=100,
+        help="Length of long versions [%default]")
+    options, args = parser.parse_args()
+
+    # debug logging is not what we measure
+    logging.disable(logging.DEBUG)
+    long_versions = [
+        '1' + '.-' * (options.length // 2) + 'x',
+        '1.0' + 'a' * options.length,
+        '1.0-' + '.' * options.length + 'dev',
+    ]
+    for name, func in [('regex', Enamer.parse_pv_regex),
+                       ('tokenizer', VersionTokenizer.parse)]:
+        print "%s: corpus %.2f us per call, length %d %.2f us per call" % (
+            name,
+            measure(func, corpus.versions(), options.number, options.repeat),
+            options.length,
+            measure(func, long_versions, 1, options.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Per-ebuild template cost: loading and compiling the ebuild template
+for every ebuild (as :class:`gpypi.ebuild.Ebuild` did before templates
+were shared), the same with a Jinja bytecode cache, and the shared
+template of :meth:`gpypi.ebuild.Ebuild.get_template`. Each case renders
+the template once::
+
+    $ python benchmarks/bench_render.py -n 200
+"""
+
+import shutil
+import timeit
+import logging
+import optparse
+import tempfile
+
+import corpus
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache
+from gpypi.config import ConfigManager
+from gpypi.ebuild import Ebuild, replace_re
+
+
+def make_ebuild():
+    config = ConfigManager(['pypi', 'ini'])
+    config.configs['ini'] = dict(up_pn='foobar', up_pv='1.0', category='dev-python',
+        uri='mirror://pypi/f/foobar/foobar-1.0.tar.gz', cache_dir='')
+    ebuild = Ebuild(config)
+    ebuild.update(rdepend=set(['dev-python/foo', '>=dev-python/bar-1.0']),
+        use=set(['doc']), docs_dir='docs', description='Foobar')
+    return ebuild
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option('-n', '--number', type='int', default=200,
+        help="Number of ebuilds [%default]")
+    options, args = parser.parse_args()
+
+    logging.disable(logging.DEBUG)
+    ebuild = make_ebuild()
+    bytecode_dir = tempfile.mkdtemp()
+
+    def compile_each(bytecode_cache=None):
+        def run():
+            env = Environment(loader=PackageLoader(Ebuild.EBUILD_TEMPLATE_PACKAGE, 'templates'),
+                trim_blocks=True, bytecode_cache=bytecode_cache)
+            env.filters['replace_re'] = replace_re
+            env.get_template(Ebuild.EBUILD_TEMPLATE).render(ebuild, options=ebuild.options)
+        return run
+
+    def shared():
+        Ebuild.get_template().render(ebuild, options=ebuild.options)
+
+    try:
+        cases = [
+            ('compiled per ebuild', compile_each()),
+            ('bytecode cache', compile_each(FileSystemBytecodeCache(bytecode_dir))),
+            ('shared template', shared),
+        ]
+        for name, func in cases:
+            # warm up caches
+            func()
+            best = min(timeit.repeat(func, repeat=3, number=options.number))
+            print "%s: %.1f us per ebuild" % (name, best / options.number * 1e6)
+    finally:
+        shutil.rmtree(bytecode_dir)
+
+
+if __name__ == '__main__':
+    main()
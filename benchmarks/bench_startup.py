@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Startup latency of the ``gpypi`` command. Each measurement runs
+``gpypi --version`` and ``gpypi echo`` (offline without cache, so it
+stops at the first PyPI query) in a fresh interpreter; best and median
+of ``-n`` runs are reported together with heavy modules that got
+imported (the coloured log formatter loads ``portage.output`` for the
+first message). Other gpypi arguments may be given after ``--``::
+
+    $ python benchmarks/bench_startup.py -n 20
+
+With ``--importtime``, prints a tree of imports with self and cumulative
+time in microseconds, like ``python -X importtime`` of newer Pythons::
+
+    $ python benchmarks/bench_startup.py --importtime 2> imports.txt
+"""
+
+import os
+import sys
+import time
+import optparse
+import subprocess
+
+import corpus
+
+ROOT = os.path.abspath(os.path.join(corpus.HERE, '..'))
+HEAVY_MODULES = ['yolk', 'jinja2', 'pygments', 'metagen', 'portage', 'gpypi.trove_map', 'gpypi.ebuild']
+CHILD = """
+import sys
+from gpypi.cli import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+print >> sys.stderr, 'loaded:', ' '.join(m for m in %r if m in sys.modules)
+""" % HEAVY_MODULES
+
+
+def install_import_timer(stream=sys.stderr):
+    """Wrap ``__import__`` to print time spent loading each module"""
+    import __builtin__
+    original_import = __builtin__.__import__
+    stack = []
+    print >> stream, "import time: self [us] | cumulative | imported package"
+
+    def timed_import(name, *args, **kwargs):
+        loaded = len(sys.modules)
+        stack.append(0)
+        start = time.time()
+        try:
+            return original_import(name, *args, **kwargs)
+        finally:
+            elapsed = (time.time() - start) * 1e6
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if len(sys.modules) > loaded:
+                print >> stream, "import time: %9d | %10d | %s%s" % (
+                    elapsed - children, elapsed, '  ' * len(stack), name)
+
+    __builtin__.__import__ = timed_import
+
+
+def run(args, env):
+    """Run gpypi in new interpreter, return (seconds, loaded heavy modules)"""
+    start = time.time()
+    process = subprocess.Popen([sys.executable, '-c', CHILD] + args,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    stdout, stderr = process.communicate()
+    elapsed = time.time() - start
+    loaded = [line for line in stderr.splitlines() if line.startswith('loaded:')]
+    return elapsed, loaded and loaded[-1][len('loaded:'):].split() or []
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] [-- gpypi arguments]")
+    parser.add_option('-n', '--number', type='int', default=10,
+        help="Number of runs [%default]")
+    parser.add_option('--importtime', action='store_true', default=False,
+        help="Print import times of gpypi.cli to stderr")
+    options, args = parser.parse_args()
+    commands = [args] if args else [['--version'], ['echo', '--offline', '--cache-dir=', 'foobar', '1.0']]
+
+    if options.importtime:
+        install_import_timer()
+        import gpypi.cli
+        return
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    for args in commands:
+        times = []
+        for i in range(options.number):
+            elapsed, loaded = run(args, env)
+            times.append(elapsed)
+        times.sort()
+        print "gpypi %s: best %.1f ms, median %.1f ms over %d runs" % (
+            ' '.join(args), times[0] * 1e3, times[len(times) // 2] * 1e3, len(times))
+        print "  heavy modules loaded: %s" % (' '.join(loaded) or 'none')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Inputs for benchmarks, collected from :mod:`gpypi.tests.test_enamer`.
+"""
+
+import os
+import re
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TEST_ENAMER = os.path.join(HERE, '..', 'gpypi', 'tests', 'test_enamer.py')
+
+# make gpypi importable from a checkout
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+
+def assignments(name, path=TEST_ENAMER):
+    """Return values of string literals assigned to ``name`` in test module"""
+    pattern = re.compile(r'^\s*%s = (["\'])(.*?)\1\s*$' % re.escape(name), re.M)
+    with open(path) as f:
+        return [m.group(2) for m in pattern.finditer(f.read())]
+
+
+def versions():
+    """Upstream versions used in enamer tests"""
+    return assignments('up_pv')
+
+
+def triples():
+    """(uri, up_pn, up_pv) used in enamer tests"""
+    return zip(assignments('uri'), assignments('up_pn'), assignments('up_pv'))
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.cache
+
+Persistent cache
+****************
+
+Implements :class:`DiskCache`, a directory of pickled values with
+expiration and size bounded eviction. Used to keep responses of
+network queries between runs. :class:`DistfileCache` keeps downloaded
+source archives the same way.
+
+"""
+
+import os
+import time
+import errno
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import cPickle
+
+log = logging.getLogger(__name__)
+
+
+class DiskCache(object):
+    """Stores pickled values under ``path``, one file per key. Keys are
+    grouped in namespaces (subdirectories). Least recently used entries
+    are removed when total size grows over ``max_size``.
+
+    Use :meth:`open` to share one instance per directory in a process.
+
+    :param path: Directory to store entries in
+    :type path: string
+    :param max_size: Maximum size in bytes, 0 for unbounded
+    :type max_size: int
+
+    Example::
+
+        >>> import tempfile
+        >>> cache = DiskCache(tempfile.mkdtemp())
+        >>> cache.set('release_data', ('foobar', '1.0'), {'name': 'foobar'})
+        >>> cache.get('release_data', ('foobar', '1.0'))
+        ({'name': 'foobar'}, True)
+
+    """
+    instances = {}
+    instances_lock = threading.Lock()
+
+    def __init__(self, path, max_size=0):
+        self.path = path
+        self.max_size = max_size
+        self.size = None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<DiskCache %s>" % self.path
+
+    @classmethod
+    def open(cls, path, max_size=0):
+        """Return :class:`DiskCache` for ``path``, shared within the process.
+
+        :raises: :exc:`OSError` if directory could not be created
+
+        """
+        path = os.path.abspath(path)
+        with cls.instances_lock:
+            if path not in cls.instances:
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+                cls.instances[path] = cls(path, max_size)
+            return cls.instances[path]
+
+    @classmethod
+    def make_key(cls, key):
+        """Return stable string for ``key``. Byte and unicode strings
+        with the same content give the same result.
+
+        :param key: Tuple, list or string
+        :rtype: string
+
+        """
+        if isinstance(key, unicode):
+            return repr(key.encode('utf-8'))
+        elif isinstance(key, (tuple, list)):
+            return '(%s)' % ', '.join(cls.make_key(k) for k in key)
+        else:
+            return repr(key)
+
+    def key_path(self, namespace, key):
+        """Return file path of an entry"""
+        digest = hashlib.sha1(self.make_key(key)).hexdigest()
+        return os.path.join(self.path, namespace, digest[:2], digest[2:])
+
+    def get(self, namespace, key, ttl=None):
+        """Return cached value and if it is still fresh.
+
+        :param namespace: Group of keys
+        :type namespace: string
+        :param key: Key of the entry
+        :param ttl: Seconds after which entry is not fresh anymore,
+            None for no expiration
+        :type ttl: int
+        :returns: (value, fresh)
+        :rtype: tuple
+        :raises: :exc:`KeyError` if no such entry
+
+        """
+        path = self.key_path(namespace, key)
+        try:
+            with open(path, 'rb') as f:
+                stored, value = cPickle.load(f)
+        except (IOError, OSError, EOFError, ValueError, cPickle.UnpicklingError):
+            raise KeyError(key)
+
+        try:
+            # mtime marks last use for eviction
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        fresh = ttl is None or time.time() - stored < ttl
+        return value, fresh
+
+    def set(self, namespace, key, value):
+        """Store ``value`` under ``key``. Entry is written atomically."""
+        path = self.key_path(namespace, key)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                cPickle.dump((time.time(), value), f, cPickle.HIGHEST_PROTOCOL)
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.rename(tmp_path, path)
+        except:
+            os.unlink(tmp_path)
+            raise
+
+        if self.max_size:
+            self.account(os.path.getsize(path) - old_size)
+
+    def delete(self, namespace, key):
+        """Remove entry if it exists"""
+        try:
+            os.unlink(self.key_path(namespace, key))
+        except OSError:
+            pass
+
+    def entries(self):
+        """Return list of (mtime, size, path) of all entries"""
+        entries = []
+        for root, dirs, files in os.walk(self.path):
+            for name in files:
+                if name.startswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def account(self, delta):
+        """Add ``delta`` bytes to total size and evict if needed"""
+        with self.lock:
+            if self.size is None:
+                self.size = sum(e[1] for e in self.entries())
+            else:
+                self.size += delta
+            if self.size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until cache takes
+        80% of :attr:`max_size`.
+        """
+        entries = sorted(self.entries())
+        self.size = sum(e[1] for e in entries)
+        target = self.max_size * 0.8
+        removed = 0
+        for mtime, size, path in entries:
+            if self.size <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self.size -= size
+            removed += 1
+        log.debug("Evicted %d entries from %s", removed, self.path)
+
+
+class DistfileCache(DiskCache):
+    """Content addressed store of downloaded source archives. Archives
+    are stored once per SHA-256 digest under ``path/sha256`` and URLs
+    map to digests in the ``urls`` namespace. Digest of an archive is
+    verified every time it is looked up. Archives and URLs share least
+    recently used eviction of :class:`DiskCache`.
+
+    Example::
+
+        >>> import tempfile
+        >>> cache = DistfileCache(tempfile.mkdtemp())
+        >>> source = tempfile.mktemp()
+        >>> open(source, 'w').write('foobar')
+        >>> path = cache.add('http://example.com/foobar-1.0.tar.gz', source)
+        >>> cache.lookup('http://example.com/foobar-1.0.tar.gz') == path
+        True
+
+    """
+
+    @classmethod
+    def file_digest(cls, path):
+        """Return SHA-256 hex digest of file at ``path``
+
+        :raises: :exc:`IOError`
+
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), ''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def blob_path(self, digest):
+        """Return path of archive with SHA-256 ``digest``"""
+        return os.path.join(self.path, 'sha256', digest[:2], digest[2:])
+
+    def lookup(self, url):
+        """Return path of archive downloaded from ``url``.
+
+        :raises: :exc:`KeyError` if archive is not cached or is corrupted
+
+        """
+        digest, fresh = self.get('urls', url)
+        path = self.blob_path(digest)
+        try:
+            actual = self.file_digest(path)
+        except IOError:
+            self.delete('urls', url)
+            raise KeyError(url)
+        if actual != digest:
+            log.warn("Removing distfile %s, SHA-256 does not match", path)
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            self.delete('urls', url)
+            raise KeyError(url)
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return path
+
+    def add(self, url, filename):
+        """Copy archive ``filename`` downloaded from ``url`` into
+        cache and return its path in cache.
+        """
+        digest = self.file_digest(filename)
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError, e:
+                    if e.errno != errno.EEXIST:
+                        raise
+
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    with open(filename, 'rb') as source:
+                        shutil.copyfileobj(source, f, 64 * 1024)
+                os.rename(tmp_path, path)
+            except:
+                os.unlink(tmp_path)
+                raise
+
+            if self.max_size:
+                self.account(os.path.getsize(path))
+
+        self.set('urls', url, digest)
+        return path
@@ -8,25 +8,22 @@ Command-line code for :mod:`gpypi`
 
 import os
 import sys
-import pdb
 import logging
+import collections
 
 import argparse
 
-from yolk.pypi import CheeseShop
-from yolk.yolklib import get_highest_version
-from yolk.setuptools_support import get_download_uri
-
 from gpypi import __version__
 from gpypi.exc import *
 from gpypi.enamer import Enamer
 from gpypi.config import Config, ConfigManager
-from gpypi.ebuild import Ebuild
 from gpypi.portage_utils import PortageUtils
-from gpypi.utils import PortageFormatter, PortageStreamHandler
+from gpypi.graph import DependencyGraph
+from gpypi.utils import PortageFormatter, PortageStreamHandler, ThreadLogBuffer, memoize
 
-# Portages' security level
-from portage.data import secpass, portage_gid
+# Modules needed only by some commands (yolk, jinja2, pygments, metagen,
+# portage) are imported where they are used, so that startup and
+# argument errors stay fast. See benchmarks/bench_startup.py.
 
 log = logging.getLogger(__name__)
 
@@ -44,58 +41,130 @@ class GPyPI(object):
     :param options: command-line options
     :type options: ArgParse options
 
+    :param pypi: PyPI client, created from options if not given
+    :type pypi: :class:`gpypi.pypi.CachedCheeseShop`
+
+    :attr:`graph` -- :class:`gpypi.graph.DependencyGraph` of packages to create
+
+    :attr:`snapshot` -- :class:`gpypi.pypi.PackageSnapshot` of current package
+
     """
 
-    def __init__(self, package_name, version, options):
+    def __init__(self, package_name, version, options, pypi=None):
         self.package_name = package_name
         self.version = version
         self.options = options
-        self.tree = [(package_name, version)]
-        self.pypi = CheeseShop()
+        self.snapshot = None
+        self.graph = DependencyGraph()
+        self.graph.add(package_name, version)
+        if pypi is None:
+            from gpypi.pypi import CachedCheeseShop
+            pypi = CachedCheeseShop.from_config(options)
+        self.pypi = pypi
 
     def create_ebuilds(self):
         """
         Create ebuild for given package_name and any ebuilds for dependencies
         if needed. If no version is given we use the highest available.
 
+        When ``jobs`` option is greater than one, work is delegated
+        to :meth:`create_ebuilds_concurrently`.
+
+        """
+        if self.options.jobs > 1:
+            self.create_ebuilds_concurrently(self.options.jobs)
+        else:
+            while self.graph.queue:
+                (project_name, version) = self.graph.pop()
+                self.package_name = project_name
+                self.version = version
+                requires = self.do_ebuild()
+                self.graph.mark_processed(project_name)
+                self.handle_requires(requires, project_name)
+                # TODO: disable some options after first ebuild is created
+                #self.options.overwrite = False
+                #self.options.category = None
+
+        log.debug("Dependency order: %s", ", ".join(name for name, version
+            in self.graph.topological_order()))
+
+    def create_ebuilds_concurrently(self, jobs):
+        """
+        Same as :meth:`create_ebuilds`, but up to `jobs` packages
+        from the dependency frontier are processed at the same time.
+
+        Results are consumed in the order packages were queued, so
+        dependencies are discovered and log messages are shown in the
+        same order as with a single job.
+
+        :param jobs: number of worker threads
+        :type jobs: int
+
         """
-        while len(self.tree):
-            (project_name, version) = self.tree.pop(0)
-            self.package_name = project_name
-            self.version = version
-            requires = self.do_ebuild()
-            if requires:
-                for req in requires:
-                    if self.options.no_deps:
-                        pass
-                    else:
-                        self.handle_dependencies(req.project_name)
-            # TODO: disable some options after first ebuild is created
-            #self.options.overwrite = False
-            #self.options.category = None
-
-    def handle_dependencies(self, project_name):
-        """Add dependency if not already in self.tree"""
-        pkgs = []
-        if len(self.tree):
-            for deps in self.tree:
-                pkgs.append(deps[0])
-
-        if project_name not in pkgs:
-            # TODO: document that we can not query pypi with version spec or use distutils2
-            # for dependencies
-            self.tree.append((project_name, None))
+        from multiprocessing.pool import ThreadPool
+        log_buffer = ThreadLogBuffer()
+        log_buffer.install()
+        pool = ThreadPool(jobs)
+        pending = collections.deque()
+        try:
+            while self.graph.queue or pending:
+                while self.graph.queue and len(pending) < jobs:
+                    (project_name, version) = self.graph.pop()
+                    pending.append((project_name, pool.apply_async(log_buffer.capture,
+                        (self.do_ebuild_job, project_name, version))))
+
+                project_name, result = pending.popleft()
+                # timeout keeps the wait interruptible by ^C
+                records, requires, exc_info = result.get(sys.maxint)
+                log_buffer.replay(records)
+                if exc_info:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                self.graph.mark_processed(project_name)
+                self.handle_requires(requires, project_name)
+        finally:
+            pool.terminate()
+            log_buffer.uninstall()
+
+    def do_ebuild_job(self, project_name, version):
+        """
+        Run :meth:`do_ebuild` for a package in a separate :class:`GPyPI`
+        instance with its own copy of options, so it can run in a thread.
+
+        :returns: pkg_resources requirements of the package
+
+        """
+        gpypi = self.__class__(project_name, version, self.options.copy())
+        return gpypi.do_ebuild()
+
+    def handle_requires(self, requires, parent=None):
+        """Queue requirements returned by :meth:`do_ebuild`"""
+        if requires and not self.options.no_deps:
+            for req in requires:
+                self.handle_dependencies(req.project_name, parent)
+
+    def handle_dependencies(self, project_name, parent=None):
+        """Add dependency to :attr:`graph`, queue it if not already known
+
+        :param project_name: name of the dependency
+        :type project_name: string
+        :param parent: name of the package that requires it
+        :type parent: string
+
+        """
+        # TODO: document that we can not query pypi with version spec or use distutils2
+        # for dependencies
+        if self.graph.add(project_name, parent=parent):
             log.info("Dependency needed: %s" % project_name)
 
     def url_from_pypi(self):
         """
-        Query PyPI to find a package's URI
+        Return package's source URI from PyPI :attr:`snapshot`
 
         :returns: source URL string
 
         """
         try:
-            return self.pypi.get_download_urls(self.package_name, self.version, pkg_type="source")[0]
+            return self.snapshot.urls[0]
         except IndexError:
             return None
 
@@ -106,6 +175,7 @@ class GPyPI(object):
         :returns: source URL string or None
 
         """
+        from yolk.setuptools_support import get_download_uri
         #if self.options.subversion:
         #    src_uri = get_download_uri(self.package_name, "dev", "source")
         #else:
@@ -144,18 +214,19 @@ class GPyPI(object):
         :returns: tuple with exit code and pkg_resources requirement
 
         """
+        self.snapshot = self.pypi.snapshot(self.package_name, self.version)
         #Get proper case for project name:
-        (self.package_name, versions) = self.pypi.query_versions_pypi(self.package_name)
+        self.package_name = self.snapshot.name
 
-        if not versions:
+        if not self.snapshot.versions:
             log.error("No package %s on PyPi." % self.package_name)
             return
 
-        if self.version and (self.version not in versions):
+        if self.snapshot.version is None:
             log.error("No package %s for version %s on PyPi." % (self.package_name, self.version))
             return
         else:
-            self.version = get_highest_version(versions)
+            self.version = self.snapshot.version
 
         # TODO: self.options.uri only for first ebuild
         # TODO: make find_uri method configurable
@@ -168,6 +239,7 @@ class GPyPI(object):
         self.options.configs['argparse']['up_pn'] = self.package_name
         self.options.configs['argparse']['up_pv'] = self.version
 
+        from gpypi.ebuild import Ebuild
         ebuild = Ebuild(self.options)
         ebuild.set_metadata(self.query_metadata())
 
@@ -179,17 +251,12 @@ class GPyPI(object):
 
     def query_metadata(self):
         """
-        Get package metadata from PyPI
+        Get package metadata from PyPI :attr:`snapshot`
 
         :returns: metadata text
 
         """
-
-        if self.version:
-            return self.pypi.release_data(self.package_name, self.version)
-        else:
-            (pn, vers) = self.pypi.query_versions_pypi(self.package_name)
-            return self.pypi.release_data(self.package_name, get_highest_version(vers))
+        return self.snapshot.release_data
 
 
 class CLI(object):
@@ -206,13 +273,27 @@ class CLI(object):
 
     def __init__(self, config):
         self.config = config
+        memoize.enabled = not config.no_memoize
+        PortageUtils.check_atoms = config.check_atoms
         try:
             getattr(self, config.command)()
         except GPyPiException, e:
             log.error("%s: %s", e.__class__.__name__, e)
+        memoize.log_stats()
+
+    def check_permissions(self):
+        """Warn if overlay may not be written to. Portage group access
+        must be used for write permission in overlay and for unpacking
+        of ebuilds.
+        """
+        from portage.data import secpass, portage_gid
+        if secpass < 1:
+            log.warn('Should be run as root or in group ' + str(portage_gid) +
+                    ". Expect more problems to come.\n")
 
     def create(self):
         """"""
+        self.check_permissions()
         gpypi = GPyPI(self.config.up_pn, self.config.up_pv, self.config)
         gpypi.create_ebuilds()
         # TODO: atomic cleanup
@@ -233,32 +314,16 @@ class CLI(object):
 
     def sync(self):
         """"""
-        pypi = CheeseShop()
-        for package in pypi.list_packages():
-            (pn, vers) = pypi.query_versions_pypi(package)
-            for version in vers:
-                # TODO: parse_* will not return anything for correct atoms
-                atom = Enamer.construct_atom(Enamer.parse_pn(pn)[0], self.config.category, Enamer.parse_pv(version[0]))
-
-                # we skip existing ebuilds
-                if PortageUtils.ebuild_exists(atom):
-                    continue
-                try:
-                    url = pypi.get_download_urls(pn, version)[0]
-                    # TODO: use setuptools way also
-                except IndexError:
-                    log.warn('Skipping %s, no download url', atom)
-                else:
-                    try:
-                        self.config.configs['argparse']['uri'] = url
-                        self.config.configs['argparse']['up_pn'] = pn
-                        self.config.configs['argparse']['up_pv'] = version
-                        gpypi = GPyPI(pn, version, self.config)
-                        gpypi.create_ebuilds()
-                    except KeyboardInterrupt:
-                        raise
-                    except:
-                        log.exception('Unexpected error occured during ebuild creation:')
+        # late import, gpypi.sync depends on this module
+        from gpypi.sync import Sync
+        self.check_permissions()
+        sync = Sync(self.config)
+        if self.config.plan:
+            sync.write_plan(self.config.plan)
+        elif self.config.from_plan:
+            sync.run_plan(self.config.from_plan)
+        else:
+            sync.run()
 
 
 def main(args=sys.argv[1:]):
@@ -305,6 +370,20 @@ def main(args=sys.argv[1:]):
         help=Config.allowed_options['nocolors'][0])
     parser.add_argument("--config-file", action='store', dest="config_file",
         default="/etc/gpypi", help="Absolute path to a config file")
+    parser.add_argument("--cache-dir", action='store', dest="cache_dir",
+        help=Config.allowed_options['cache_dir'][0])
+    parser.add_argument("--no-memoize", action='store_true', dest="no_memoize",
+        help=Config.allowed_options['no_memoize'][0])
+    parser.add_argument("--check-atoms", action='store_true', dest="check_atoms",
+        help=Config.allowed_options['check_atoms'][0])
+    parser.add_argument("--unpack", action='store', dest="unpack",
+        choices=['native', 'inspect', 'portage'], help=Config.allowed_options['unpack'][0])
+
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--offline", action='store_true', dest="offline",
+        help=Config.allowed_options['offline'][0])
+    cache_group.add_argument("--refresh", action='store_true', dest="refresh",
+        help=Config.allowed_options['refresh'][0])
 
     logging_group = parser.add_mutually_exclusive_group()
     logging_group.add_argument("-q", "--quiet", action='store_true',
@@ -325,6 +404,8 @@ def main(args=sys.argv[1:]):
         dest="overwrite", help=Config.allowed_options['overwrite'][0])
     create_install_parser.add_argument("--no-deps", action='store_true', dest="no_deps",
         help=Config.allowed_options['no_deps'][0])
+    create_install_parser.add_argument("-j", "--jobs", action='store', type=int,
+        dest="jobs", metavar='N', help=Config.allowed_options['jobs'][0])
     create_install_parser.add_argument("-c", "--category", default='dev-python', action='store',
         dest="category", help=Config.allowed_options['category'][0])
     # TODO: pretend
@@ -379,6 +460,20 @@ def main(args=sys.argv[1:]):
     parser_pypi = subparsers.add_parser('sync', help="Populate all packages from pypi into an overlay",
         description="Populate all packages from pypi into an overlay",
         parents=[parser, create_install_parser])
+    parser_pypi.add_argument("--multicall-size", action='store', type=int,
+        dest="multicall_size", metavar='N',
+        help=Config.allowed_options['multicall_size'][0])
+    parser_pypi.add_argument("--full", action='store_true', dest="full_sync",
+        help=Config.allowed_options['full_sync'][0])
+    plan_group = parser_pypi.add_mutually_exclusive_group()
+    plan_group.add_argument("--plan", action='store', dest="plan",
+        metavar='FILE', help=Config.allowed_options['plan'][0])
+    plan_group.add_argument("--from-plan", action='store', dest="from_plan",
+        metavar='FILE', help=Config.allowed_options['from_plan'][0])
+    parser_pypi.add_argument("--processes", action='store', type=int,
+        dest="processes", metavar='N', help=Config.allowed_options['processes'][0])
+    parser_pypi.add_argument("--shard", action='store', dest="shard",
+        metavar='I/N', help=Config.allowed_options['shard'][0])
 
     args = main_parser.parse_args(args)
 
@@ -399,12 +494,6 @@ def main(args=sys.argv[1:]):
     else:
         logger.setLevel(logging.INFO)
 
-    # portage group access must be used for write permission in overlay and for
-    # unpacking of ebuilds
-    if secpass < 1:
-        log.warn('Should be run as root or in group ' + str(portage_gid) +
-                ". Expect more problems to come.\n")
-
     config_mgr = ConfigManager.load_from_ini(args.config_file)
     config_mgr.configs['argparse'] = Config.from_argparse(args)
 
@@ -414,6 +503,7 @@ def main(args=sys.argv[1:]):
     except:
         # enter pdb debugger when debugging is enabled
         if args.debug:
+            import pdb
             pdb.post_mortem()
         else:
             raise
@@ -12,12 +12,11 @@ Implements :class:`Config` and :class:`ConfigManager` to be used as
 """
 
 import os
+import copy
 import shutil
 import logging
 from ConfigParser import SafeConfigParser
 
-from portage.output import colorize
-
 from gpypi.utils import asbool
 from gpypi.exc import *
 
@@ -58,10 +57,30 @@ class Config(dict):
         'overlay': ('Specify overlay to use by name (stored in $OVERLAY/profiles/repo_name)', str, "local"),
         'overwrite': ('Overwrite existing ebuild', bool, False),
         'no_deps': ("Don't create ebuilds for any needed dependencies", bool, False),
+        'jobs': ("Number of packages to generate ebuilds for concurrently", int, 1),
         'category': ("Specify portage category to use when creating ebuild", str, ""),
         'format': ("Format when printing to stdout (use pygments identifier)", str, "none"),
         'command': ("Name of command that was invoked on CLI", str, ""),
         'nocolors': ("Disable colorful output", bool, False),
+        'cache_dir': ("Directory for persistent caches (empty to disable caching)", str, "/var/cache/gpypi"),
+        'pypi_cache_size': ("Maximum size of PyPI response cache in megabytes", int, 64),
+        'template_cache': ("Store compiled ebuild template in cache_dir", bool, True),
+        'distfile_cache_size': ("Maximum size of downloaded source archive cache in megabytes", int, 1024),
+        'no_memoize': ("Do not cache results of name and version conversions", bool, False),
+        'check_atoms': ("Validate atoms with portage too and warn on disagreement", bool, False),
+        'offline': ("Use only cached PyPI responses, never query PyPI", bool, False),
+        'refresh': ("Ignore cached PyPI responses and query PyPI again", bool, False),
+        'full_sync': ("Check all packages on sync, not only those changed since last sync", bool, False),
+        'processes': ("Number of worker processes used by sync", int, 1),
+        'shard': ("Sync only shard I/N of packages, split by name hash", str, ""),
+        'plan': ("Write what sync would do to FILE, using only cached PyPI responses", str, ""),
+        'from_plan': ("Create ebuilds listed in sync plan FILE", str, ""),
+        'unpack': ("How to fetch and unpack sources: native (in process), inspect (extract only files needed to examine the package) or portage (ebuild unpack)", str, "native"),
+        'setup_py_timeout': ("Seconds setup.py of a package may run", int, 60),
+        'setup_py_memory_limit': ("Maximum address space setup.py may allocate in megabytes (0 for no limit)", int, 1024),
+        'probe_jobs': ("Number of mirror URIs probed concurrently", int, 8),
+        'probe_cache_ttl': ("Seconds results of mirror probes are cached", int, 24 * 60 * 60),
+        'multicall_size': ("Number of XML-RPC calls sent to PyPI in one request", int, 100),
         'background': ("Background of terminal when using formatting", str, 'dark'),
         #'pretend': ("Print ebuild to stdout, don't write ebuild file, don't download SRC_URI", bool, False),
         'license': ("Portage license for the ebuild", str, ""),
@@ -170,6 +189,18 @@ class Config(dict):
         except ValueError:
             raise GPyPiValidationError("Not a boolean (write y/n): %r" % value)
 
+    @classmethod
+    def validate_int(cls, value):
+        """Subvalidator which handles string values into int
+
+        :raises: :exc:`GPyPiValidationError` if not an integer
+
+        """
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise GPyPiValidationError("Not an integer: %r" % value)
+
     @classmethod
     def validate_str(cls, value, encoding='utf-8'):
         """Subvalidator for string. Also converts to unicode
@@ -247,6 +278,21 @@ class ConfigManager(object):
 
         return self.default_or_question(name)
 
+    def copy(self):
+        """Return a copy of the manager with its own configs, so that
+        options may be changed (as :class:`gpypi.ebuild.Ebuild` does)
+        without affecting this instance. Questionnaire answers are shared.
+
+        :returns: :class:`ConfigManager` instance
+
+        """
+        mgr = self.__class__.__new__(self.__class__)
+        mgr.__dict__.update(self.__dict__)
+        mgr.configs = dict((name, copy.copy(config))
+            for name, config in self.configs.iteritems())
+        mgr.configs['questionnaire'] = self.configs['questionnaire']
+        return mgr
+
     def default_or_question(self, name):
         """When no value is retrieved from :attr:`ConfigManager.configs`,
         :class:`Questionnaire` is used for interactive request if ``name``
@@ -326,6 +372,7 @@ class Questionnaire(object):
         if self.options.nocolors:
             msg = "%s [%r]: "
         else:
+            from portage.output import colorize
             msg = colorize("GOOD", " * ") + "%s" + colorize("BRACKET", " [")\
                 + "%r" + colorize("BRACKET", ']') + ": "
 
@@ -19,26 +19,27 @@ Creates an ebuild
 """
 
 import os
+import re
 import logging
 import tempfile
 import shutil
 import string
+import threading
 
 from pprint import pformat
 from datetime import date
 import distutils.core
 
-from jinja2 import Environment, PackageLoader
+from jinja2 import Environment, PackageLoader, FileSystemBytecodeCache
 from pygments import highlight
 from pygments.lexers import BashLexer
 from pygments.formatters import get_formatter_by_name
 from pkg_resources import parse_requirements
-import setuptools
 
 from gpypi import __version__
-from gpypi import utils
 from gpypi.portage_utils import PortageUtils
 from gpypi.enamer import Enamer
+from gpypi.sandbox import SetupPyPool
 from gpypi.workflow import Repoman, Echangelog, Metadata
 from gpypi.exc import *
 from gpypi.trove_map import topic_dict
@@ -46,6 +47,11 @@ from gpypi.trove_map import topic_dict
 log = logging.getLogger(__name__)
 
 
+def replace_re(s, find, replace):
+    """Jinja filter replacing regex ``find`` with ``replace``"""
+    return re.sub(find, replace, s)
+
+
 # TODO: dependency can be a string or list of strings
 class Ebuild(dict):
     """Contains, populates and renders an ebuild.
@@ -61,33 +67,32 @@ class Ebuild(dict):
 
     :attr:`requires` -- set of packages that this ebuild depends on
 
+    Jinja environments and templates are shared by all ebuilds in
+    a process, see :meth:`get_template`.
+
     """
     # TODO: __init__ attrs
     DOC_DIRS = ['doc', 'docs', 'documentation']
     EXAMPLES_DIRS = ['example', 'examples', 'demo', 'demos']
     EBUILD_TEMPLATE = 'ebuild.jinja'
     EBUILD_TEMPLATE_PACKAGE = 'gpypi'
+    _template_envs = {}
+    _templates = {}
+    _templates_lock = threading.Lock()
 
     def __init__(self, options):
         self.setup_keywords = {}
         self.metadata = {}
         self.unpacked_dir = None
+        self.workdir = None
         self.ebuild_path = None
         self.requires = set()
         self.has_tests = None
         self.options = options
 
         # init stuff
-        self.env = Environment(
-            loader=PackageLoader(self.EBUILD_TEMPLATE_PACKAGE, 'templates'),
-            trim_blocks=True)
-
-        import re
-        def replace_re(s, find, replace):
-            return re.sub(find, replace, s)
-        self.env.filters['replace_re'] = replace_re
-        
-        self.template = self.env.get_template(self.EBUILD_TEMPLATE)
+        self.template = self.get_template(options)
+        self.env = self.template.environment
 
         # Variables that will be passed to the Jinja template
         d = {
@@ -112,6 +117,56 @@ class Ebuild(dict):
     def __repr__(self):
         return '<Ebuild (%s)>' % pformat(dict.__repr__(self))
 
+    @classmethod
+    def get_template_env(cls, options=None):
+        """Return Jinja environment for :attr:`EBUILD_TEMPLATE_PACKAGE`,
+        created on first use. If `template_cache` and `cache_dir`
+        options are set, compiled templates are also stored in
+        ``cache_dir/templates`` for next runs.
+
+        :param options: Configuration
+        :type options: :class:`gpypi.config.ConfigManager` instance
+        :returns: :class:`jinja2.Environment`
+
+        """
+        env = cls._template_envs.get(cls.EBUILD_TEMPLATE_PACKAGE)
+        if env is None:
+            bytecode_cache = None
+            if options is not None and options.cache_dir and options.template_cache:
+                path = os.path.join(options.cache_dir, 'templates')
+                try:
+                    if not os.path.isdir(path):
+                        os.makedirs(path)
+                    bytecode_cache = FileSystemBytecodeCache(path)
+                except OSError, e:
+                    log.warn("Could not use template cache %s: %s", path, e)
+
+            env = Environment(
+                loader=PackageLoader(cls.EBUILD_TEMPLATE_PACKAGE, 'templates'),
+                trim_blocks=True, bytecode_cache=bytecode_cache)
+            env.filters['replace_re'] = replace_re
+            env = cls._template_envs.setdefault(cls.EBUILD_TEMPLATE_PACKAGE, env)
+        return env
+
+    @classmethod
+    def get_template(cls, options=None):
+        """Return compiled :attr:`EBUILD_TEMPLATE`, shared within
+        the process.
+
+        :param options: Configuration, see :meth:`get_template_env`
+        :returns: :class:`jinja2.Template`
+
+        """
+        key = (cls.EBUILD_TEMPLATE_PACKAGE, cls.EBUILD_TEMPLATE)
+        template = cls._templates.get(key)
+        if template is None:
+            with cls._templates_lock:
+                template = cls._templates.get(key)
+                if template is None:
+                    template = cls.get_template_env(options).get_template(cls.EBUILD_TEMPLATE)
+                    cls._templates[key] = template
+        return template
+
     def set_metadata(self, metadata):
         """Set metadata from :term:`PyPi`.
 
@@ -179,8 +234,8 @@ class Ebuild(dict):
         self.options.configs['setup_py'].update(self)
 
     def post_unpack(self):
-        """Perform finalization tasks. Dynamically imports *setup.py*
-        file and extracts it's kwargs.
+        """Perform finalization tasks. Runs *setup.py* file in
+        :class:`gpypi.sandbox.SetupPyPool` and extracts it's kwargs.
 
             * determine if :term:`PYTHON_MODNAME` is not
               :term:`PN` -- We inspect `packages`, `py_module` and `package_dir`
@@ -199,37 +254,11 @@ class Ebuild(dict):
 
         :raises: :exc:`gpypi.exc.GPyPiNoSetupFile`
         :raises: :exc:`gpypi.exc.GPyPiNoDistribution`
+        :raises: :exc:`gpypi.exc.GPyPiSetupPyError`
 
         """
-        # save original functions to undo monkeypaching at the end
-        temp_setup = setuptools.setup
-        temp_distutils = distutils.core.setup
-
-        # mock functions to get metadata
-        self.setup_keywords = {}
-
-        def wrapper(**kw):
-            self.setup_keywords.update(kw)
-
-        # monkeypatch setups
-        setuptools.setup = wrapper
-        distutils.core.setup = wrapper
-
         setup_file = os.path.join(self.unpacked_dir, "setup.py")
-        if os.path.exists(self.unpacked_dir):
-            if not os.path.exists(setup_file):
-                raise GPyPiNoSetupFile("%s does not exists." % setup_file)
-            else:
-                # run setup file from unpacked_dir
-                cwd = os.getcwdu()
-                try:
-                    os.chdir(self.unpacked_dir)
-                    utils.import_path(setup_file)
-                finally:
-                    os.chdir(cwd)
-        else:
-            raise GPyPiNoDistribution("Unpacked dir could not be found: %s"\
-                % self.unpacked_dir)
+        self.setup_keywords = SetupPyPool.get(self.options).run(self.unpacked_dir)
 
         # extract dependencies
         self.install_requires = self.setup_keywords.get('install_requires', '')
@@ -264,10 +293,6 @@ class Ebuild(dict):
         if len(module_names) == 1 and module_names[0] != self['pn']:
             self['python_modname'] = module_names
 
-        # undo monkeypatching
-        setuptools.setup = temp_setup
-        distutils.core.setup = temp_distutils
-
         # extract metadata
         if 'setup_py' in self.options.use:
             d = distutils.core.Distribution(self.setup_keywords)
@@ -350,7 +375,7 @@ class Ebuild(dict):
                     log.debug("Invalid PV in dependency: (Requirement %s) %s",
                         req, atom)
                     installed_pv = PortageUtils.get_installed_ver(Enamer.\
-                        construct_atom(pn, category, uses=extras, if_use=if_use))
+                        construct_atom(pn, category))
                     if installed_pv:
                         # If we have it installed, use >= installed version
                         self.add_rdepend(Enamer.construct_atom(pn, category,
@@ -416,18 +441,46 @@ class Ebuild(dict):
         """Add ${:term:`S`} to ebuild if needed."""
         log.debug("Trying to determine ${S}, unpacking...")
         if self.unpacked_dir is None:
-            unpacked_dir = PortageUtils.find_s_dir(self['p'], self.options.category)
+            workdir = self.workdir or PortageUtils.get_workdir(self['p'],
+                self.options.category)
+            unpacked_dir = PortageUtils.find_s_dir(self['p'],
+                self.options.category, workdir)
             if unpacked_dir == "":
                 self["s"] = "${WORKDIR}"
 
-            self.unpacked_dir = os.path.join(PortageUtils.get_workdir(self['p'],
-                self.options.category), unpacked_dir)
+            self.unpacked_dir = os.path.join(workdir, unpacked_dir)
 
         if self.get('my_p', None):
             self["s"] = "${WORKDIR}/${MY_P}"
         else:
             pass  # ${WORKDIR}/${P}
 
+    def inspect(self, unpacker):
+        """Examine package with only :attr:`gpypi.unpack.NativeUnpacker.ANALYSIS_FILES`
+        extracted. If setup.py needs other files, or finds no packages
+        or modules in them, extract everything and examine it again.
+
+        :param unpacker: Unpacker to fetch sources with
+        :type unpacker: :class:`gpypi.unpack.NativeUnpacker`
+
+        """
+        self.workdir = unpacker.inspect(self.options.uri)
+        self.update_with_s()
+        try:
+            self.post_unpack()
+        except (Exception, SystemExit), e:
+            reason = e
+        else:
+            if self.setup_keywords.get('packages') or self.setup_keywords.get('py_modules'):
+                return
+            reason = "no packages or modules found"
+        log.info("Could not examine %s from setup files only (%s), extracting all files",
+            self['p'], reason)
+        self.unpacked_dir = None
+        self.workdir = unpacker.unpack(self.options.uri)
+        self.update_with_s()
+        self.post_unpack()
+
     def render(self):
         """Generate ebuild from template"""
         self.output = self.template.render(self, options=self.options)
@@ -462,21 +515,40 @@ class Ebuild(dict):
             self.ebuild_path = ebuild_path
 
         if self.write(overwrite=self.options.overwrite):
-            if self.unpacked_dir is None:
-                PortageUtils.unpack_ebuild(self.ebuild_path)
-            self.update_with_s()
-            self.post_unpack()
+            unpacker = None
+            try:
+                if self.unpacked_dir is None:
+                    from gpypi.unpack import NativeUnpacker
+                    unpacker = NativeUnpacker.from_config(self.options)
+                    if self.options.unpack == 'portage':
+                        unpacker.seed_distdir(self.options.uri, PortageUtils.get_distdir())
+                        PortageUtils.unpack_ebuild(self.ebuild_path)
+                    elif self.options.unpack != 'inspect':
+                        self.workdir = unpacker.unpack(self.options.uri)
+
+                if unpacker is not None and self.options.unpack == 'inspect':
+                    self.inspect(unpacker)
+                else:
+                    self.update_with_s()
+                    self.post_unpack()
+
+                # Write ebuild again after unpacking and adding ${S}
+                self.write(overwrite=True)
 
-            # Write ebuild again after unpacking and adding ${S}
-            self.write(overwrite=True)
+                if self.options.command != 'echo':
+                    if unpacker is not None:
+                        # Manifest is generated from ${DISTDIR}
+                        unpacker.seed_distdir(self.options.uri, PortageUtils.get_distdir())
 
-            if self.options.command != 'echo':
-                # apply workflows
-                Metadata(self.options, os.path.dirname(self.ebuild_path))()
-                Echangelog(self.options, os.path.dirname(self.ebuild_path))()
-                Repoman(self.options, os.path.dirname(self.ebuild_path))()
+                    # apply workflows
+                    Metadata(self.options, os.path.dirname(self.ebuild_path))()
+                    Echangelog(self.options, os.path.dirname(self.ebuild_path))()
+                    Repoman(self.options, os.path.dirname(self.ebuild_path))()
 
-                log.info("Your ebuild is here: " + self.ebuild_path)
+                    log.info("Your ebuild is here: " + self.ebuild_path)
+            finally:
+                if unpacker is not None:
+                    unpacker.cleanup()
 
         # TODO: If ebuild already exists, we don't unpack and get dependencies
         # because they must exist.
@@ -519,6 +591,7 @@ class Ebuild(dict):
             out.write(self.render())
         finally:
             out.close()
+        PortageUtils.index_ebuild(self.ebuild_path)
         return True
 
     def show_warnings(self):
@@ -7,21 +7,85 @@ syntax to Gentoo ebuild syntax belongs to this module.
 
 """
 
+import copy
 import urlparse
-import socket
 import logging
-import httplib
 import re
 import os
 
-from portage import pkgsplit
-
+from gpypi.pms import pkgsplit
 from gpypi.portage_utils import PortageUtils
+from gpypi.probe import UriProber
+from gpypi.utils import memoize, chunked
+from gpypi.version import VersionTokenizer
 from gpypi.exc import *
 
 
 log = logging.getLogger(__name__)
 
+# last part of trove license classifier -> Portage license
+KNOWN_LICENSES = {
+    "Academic Free License (AFL)": "AFL-3.0",
+    "Aladdin Free Public License (AFPL)": "Aladdin",
+    "Apache Software License": "Apache-2.0",
+    "Apple Public Source License": "Apple",
+    "Artistic License": "Artistic-2",
+    "BSD License": "BSD-2",
+    "Common Public License": "CPL-1.0",
+    "GNU Affero General Public License v3": "AGPL-3",
+    "GNU Free Documentation License (FDL)": "FDL-3",
+    "GNU General Public License (GPL)": "GPL-2",
+    "GNU Library or Lesser General Public License (LGPL)": "LGPL-2.1",
+    "IBM Public License": "IBM",
+    "Intel Open Source License": "Intel",
+    "ISC License (ISCL)": "ISC",
+    "MIT License": "MIT",
+    "Mozilla Public License 1.0 (MPL)": "MPL",
+    "Mozilla Public License 1.1 (MPL 1.1)": "MPL-1.1",
+    "Nethack General Public License": "nethack",
+    "Netscape Public License (NPL)": "NPL-1.1",
+    "Open Group Test Suite License": "OGTSL",
+    "Public Domain": "public-domain",
+    "Python License (CNRI Python License)": "CNRI",
+    "Python Software Foundation License": "PSF-2.4",
+    "Qt Public License (QPL)": "QPL",
+    "Repoze Public License": "repoze",
+    "Sleepycat License": "DB",
+    "Sun Public License": "SPL",
+    "University of Illinois/NCSA Open Source License": "ncsa-1.3",
+    "W3C License": "WC3",
+    "zlib/libpng License": "ZLIB",
+    "Zope Public License": "ZPL",
+}
+
+# (substring of setup.py license, Portage license), first match wins
+GUESS_LICENSES = (
+    ('LGPL', 'LGPL-2.1'),
+    ('GPL', 'GPL-2'),
+)
+
+
+def compile_rules(rules):
+    """Compile (name, regex) rules into one case-insensitive pattern,
+    where rule N is wrapped in group named ``ruleN``. Alternatives are
+    tried in order, so :meth:`re.RegexObject.match` finds the same rule
+    as trying each regex in turn.
+
+    :param rules: (name, regex) pairs
+    :type rules: list of tuples
+    :returns: compiled pattern
+
+    **Example:**
+
+    >>> pattern = compile_rules([('a', r'(a)(\d)'), ('b', r'(a)(b)')])
+    >>> match = pattern.match('ab')
+    >>> match.lastgroup, match.group(match.lastindex + 1, match.lastindex + 2)
+    ('rule1', ('a', 'b'))
+
+    """
+    return re.compile('|'.join('(?P<rule%d>%s)' % (i, regex)
+        for i, (name, regex) in enumerate(rules)), re.I)
+
 
 class Enamer(object):
     """Ebuild namer
@@ -35,6 +99,28 @@ class Enamer(object):
     """
     VALID_EXTENSIONS = [".zip", ".tgz", ".tar.gz", ".tar.bz2", ".tbz2"]
 
+    # converts versions in :meth:`parse_pv`, None to use regexes below
+    PV_TOKENIZER = VersionTokenizer
+    # (portage suffix, regex) rules for :meth:`parse_pv_regex`, first match wins
+    PV_SUFFIX_RULES = [
+        ('_beta', r'(.*?)([\._-]*beta[\._-]*)([0-9]*)$'),
+        ('_beta', r'(.*?)([\._-]*b)([0-9]*)$'),
+        ('_beta', r'(.*[^a-z])(b)([0-9]*)$'),
+        ('_rc', r'(.*?)([\._-]*rc[\._-]*)([0-9]*)$'),
+        ('_rc', r'(.*?)([\._-]*c[\._-]*)([0-9]*)$'),
+        ('_rc', r'(.*[^a-z])(c[\._-]*)([0-9]+)$'),
+        ('_pre', r'(.*?)([\._-]*dev[\._-]*r?)([0-9]+)$'),
+        ('_pre', r'(.*?)([\._-]*(?:pre|preview)[\._-]*)([0-9]*)$'),
+        ('_alpha', r'(.*?)([\._-]*(?:alpha|test)[\._-]*)([0-9]*)$'),
+        ('_alpha', r'(.*?)([\._-]*a[\._-]*)([0-9]*)$'),
+        ('_alpha', r'(.*[^a-z])(a)([0-9]*)$'),
+    ]
+    PV_SUFFIX_PATTERN = compile_rules(PV_SUFFIX_RULES)
+    PV_BAD_SUFFIX_PATTERN = re.compile(
+        r'((?:[._-]*)(?:dev|devel|final|stable|snapshot)$)', re.I)
+    PV_REVISION_PATTERN = re.compile(
+        r'(.*?)([\._-]*(?:r|patch|p)[\._-]*)([0-9]*)$', re.I)
+
     @classmethod
     def get_filename(cls, uri):
         """
@@ -108,6 +194,7 @@ class Enamer(object):
                 return psplit
 
     @classmethod
+    @memoize(immutable=True)
     def split_uri(cls, uri):
         """Try to split a URI into PN, PV and REV
 
@@ -193,6 +280,7 @@ class Enamer(object):
         return d
 
     @classmethod
+    @memoize(immutable=True)
     def parse_pv(cls, up_pv, pv="", my_pv=None):
         """Convert PV to MY_PV if needed
 
@@ -201,9 +289,9 @@ class Enamer(object):
         :param my_pv: Bash substitutions for original package version
         :type up_pv: string
         :type pv: string
-        :type my_pv: list
-        :returns: (:term:`PN`, :term:`PV`, :term:`MY_PN`, :term:`MY_PV`)
-        :rtype: tuple of (string, string, list, list)
+        :type my_pv: tuple
+        :returns: (:term:`PV`, :term:`MY_PV`)
+        :rtype: tuple of (string, tuple)
 
         Can't determine PV from upstream's version.
         Do our best with some well-known versioning schemes:
@@ -240,44 +328,44 @@ class Enamer(object):
         **Example:**
 
         >>> Enamer.parse_pv('1.0b2')
-        ('1.0_beta2', ['${PV/_beta/b}'])
+        ('1.0_beta2', ('${PV/_beta/b}',))
+
+        Conversion is done by :attr:`PV_TOKENIZER` in linear time, see
+        :class:`gpypi.version.VersionTokenizer`. If it is None,
+        :meth:`parse_pv_regex` is used.
+
+        """
+        my_pv = list(my_pv or [])
+        if cls.PV_TOKENIZER is None:
+            pv, my_pv = cls.parse_pv_regex(up_pv, pv, my_pv)
+        else:
+            pv, my_pv = cls.PV_TOKENIZER.parse(up_pv, pv, my_pv)
+        return pv, tuple(my_pv)
+
+    @classmethod
+    def parse_pv_regex(cls, up_pv, pv="", my_pv=None):
+        """Convert PV to MY_PV with regexes, same arguments and result
+        as :meth:`parse_pv`.
+
+        Rules are tried in order of :attr:`PV_SUFFIX_RULES`, all at once
+        as :attr:`PV_SUFFIX_PATTERN`. Matching may take quadratic time
+        on long versions.
 
         .. note::
             The number of regex's could have been reduced, but we use four
             number of match.groups every time to simplify the code
 
+        **Example:**
+
+        >>> Enamer.parse_pv_regex('1.0b2')
+        ('1.0_beta2', ['${PV/_beta/b}'])
+
         """
-        bad_suffixes = re.compile(
-            r'((?:[._-]*)(?:dev|devel|final|stable|snapshot)$)', re.I)
-        revision_suffixes = re.compile(
-            r'(.*?)([\._-]*(?:r|patch|p)[\._-]*)([0-9]*)$', re.I)
-        suf_matches = {
-                '_pre': [
-                    r'(.*?)([\._-]*dev[\._-]*r?)([0-9]+)$',
-                    r'(.*?)([\._-]*(?:pre|preview)[\._-]*)([0-9]*)$',
-                ],
-                '_alpha': [
-                    r'(.*?)([\._-]*(?:alpha|test)[\._-]*)([0-9]*)$',
-                    r'(.*?)([\._-]*a[\._-]*)([0-9]*)$',
-                    r'(.*[^a-z])(a)([0-9]*)$',
-                ],
-                '_beta': [
-                    r'(.*?)([\._-]*beta[\._-]*)([0-9]*)$',
-                    r'(.*?)([\._-]*b)([0-9]*)$',
-                    r'(.*[^a-z])(b)([0-9]*)$',
-                ],
-                '_rc': [
-                    r'(.*?)([\._-]*rc[\._-]*)([0-9]*)$',
-                    r'(.*?)([\._-]*c[\._-]*)([0-9]*)$',
-                    r'(.*[^a-z])(c[\._-]*)([0-9]+)$',
-                ],
-        }
-        rs_match = None
         my_pv = my_pv or []
         additional_version = ""
         log.debug("parse_pv: up_pv(%s)", up_pv)
 
-        rev_match = revision_suffixes.search(up_pv)
+        rev_match = cls.PV_REVISION_PATTERN.search(up_pv)
         if rev_match:
             pv = up_pv = rev_match.group(1)
             replace_me = rev_match.group(2)
@@ -288,28 +376,21 @@ class Enamer(object):
                 up_pv, additional_version, my_pv)
             # TODO: if ALSO suf_matches succeeds, it's not implemented
 
-        for this_suf in suf_matches.keys():
-            if rs_match:
-                break
-            for regex in suf_matches[this_suf]:
-                rsuffix_regex = re.compile(regex, re.I)
-                rs_match = rsuffix_regex.match(up_pv)
-                if rs_match:
-                    log.debug("parse_pv: chosen regex: %s", regex)
-                    portage_suffix = this_suf
-                    break
-
+        rs_match = cls.PV_SUFFIX_PATTERN.match(up_pv)
         if rs_match:
             # e.g. 1.0.dev-r1234
-            major_ver = rs_match.group(1)  # 1.0
-            replace_me = rs_match.group(2)  # .dev-r
-            rev = rs_match.group(3)  # 1234
+            rule = rs_match.lastindex
+            portage_suffix, regex = cls.PV_SUFFIX_RULES[int(rs_match.lastgroup[len('rule'):])]
+            log.debug("parse_pv: chosen regex: %s", regex)
+            major_ver = rs_match.group(rule + 1)  # 1.0
+            replace_me = rs_match.group(rule + 2)  # .dev-r
+            rev = rs_match.group(rule + 3)  # 1234
             pv = major_ver + portage_suffix + rev
             my_pv.append("${PV/%s/%s}" % (portage_suffix, replace_me))
             log.debug("parse_pv: major_ver(%s) replace_me(%s), rev(%s)", major_ver, replace_me, rev)
         else:
             # Single suffixes with no numeric component are simply removed.
-            match = bad_suffixes.search(up_pv)
+            match = cls.PV_BAD_SUFFIX_PATTERN.search(up_pv)
             if match:
                 suffix = match.groups()[0]
                 my_pv.append("${PV}%s" % suffix)
@@ -321,6 +402,7 @@ class Enamer(object):
         return pv, my_pv
 
     @classmethod
+    @memoize(immutable=True)
     def parse_pn(cls, up_pn, pn="", my_pn=None):
         """Convert PN to MY_PN if needed
 
@@ -329,19 +411,19 @@ class Enamer(object):
         :params my_pn: Bash substitutions to get original name
         :type up_pn: string
         :type pn: string
-        :type my_pn: list
+        :type my_pn: tuple
         :returns: (:term:`PN`, :term:`MY_PN`)
-        :rtype: tuple of (string, list)
+        :rtype: tuple of (string, tuple)
 
         **Example:**
 
         >>> Enamer.parse_pn('Test-Me')
-        ('test-me', ['Test-Me'])
+        ('test-me', ('Test-Me',))
         >>> Enamer.parse_pn('test.me')
-        ('test-me', ['${PN/-/.}'])
+        ('test-me', ('${PN/-/.}',))
 
         """
-        my_pn = my_pn or []
+        my_pn = list(my_pn or [])
         if not up_pn.islower():
             # up_pn is lower but uri has upper-case
             log.debug('parse_pn: pn is not lowercase, converting to my_pn')
@@ -366,9 +448,10 @@ class Enamer(object):
             #log.debug("set my_on to %s", my_pn)
 
         log.debug("parse_pn: my_pn(%s) pn(%s)", my_pn, pn)
-        return pn, my_pn
+        return pn, tuple(my_pn)
 
     @classmethod
+    @memoize()
     def get_vars(cls, uri, up_pn, up_pv, pn="", pv="", my_pn=None, my_pv=None):
         """
         Determine P* and MY_* ebuild variables
@@ -454,8 +537,12 @@ class Enamer(object):
 
         """
         log.debug("get_vars: %r" % locals())
-        my_pn = my_pn or []
-        my_pv = my_pv or []
+        return cls._get_vars(PortageUtils.is_valid_atom, uri, up_pn, up_pv,
+            pn, pv, my_pn, my_pv)
+
+    @classmethod
+    def _get_vars(cls, is_valid_atom, uri, up_pn, up_pv, pn="", pv="", my_pn=None, my_pv=None):
+        """:meth:`get_vars` checking atoms with ``is_valid_atom``"""
         my_p = ""
         INVALID_VERSION = False
         uri = cls.sanitize_uri(uri)
@@ -469,13 +556,16 @@ class Enamer(object):
             log.debug("We have a version with a -r### suffix")
 
         portage_atom = "=dev-python/%s-%s" % (up_pn, up_pv)
-        if not PortageUtils.is_valid_atom(portage_atom):
+        if not is_valid_atom(portage_atom):
             INVALID_VERSION = True
             log.debug("%s is not valid portage atom", portage_atom)
 
+        # tuples keep the calls memoized
         if INVALID_VERSION:
-            pv, my_pv = cls.parse_pv(up_pv, pv, my_pv)
-        pn, my_pn = cls.parse_pn(up_pn, pn, my_pn)
+            pv, my_pv = cls.parse_pv(up_pv, pv, tuple(my_pv or ()))
+        pn, my_pn = cls.parse_pn(up_pn, pn, tuple(my_pn or ()))
+        my_pn = list(my_pn)
+        my_pv = list(my_pv or ())
 
         # No PN or PV given on command-line, try upstream's name/version
         if not pn and not pv:
@@ -502,7 +592,7 @@ class Enamer(object):
 
         # Make sure we have a valid P
         atom = "=dev-python/%s-%s" % (pn, pv)
-        if not PortageUtils.is_valid_atom(atom):
+        if not is_valid_atom(atom):
             log.debug(locals())
             raise GPyPiInvalidAtom("%s is not a valid portage atom. "
                 "We could not determine it from upstream pn(%s) and pv(%s)." %
@@ -517,6 +607,7 @@ class Enamer(object):
             src_uri = src_uri.replace("${MY_P}", "${P}")
         elif not (my_pn or my_pv):
             src_uri, my_p, my_pn, my_p_raw = cls._get_src_uri(uri, my_pn)
+            my_pn = list(my_pn)
             log.debug("getting SRC_URI: %s %s %s", src_uri, my_p, my_p_raw)
 
         log.debug("before MY_P guessing: %r", locals())
@@ -535,6 +626,78 @@ class Enamer(object):
             'src_uri': src_uri,
         }
 
+    @classmethod
+    def parse_pv_many(cls, versions, batch_size=1000):
+        """Convert many upstream versions with :meth:`parse_pv`.
+
+        Versions are read ``batch_size`` at a time and each distinct
+        version in a batch is converted once.
+
+        :param versions: Upstream package versions
+        :type versions: iterable of strings
+        :param batch_size: Number of versions read at once
+        :type batch_size: int
+        :returns: generator of (up_pv, (pv, my_pv)) in order of ``versions``
+
+        **Example:**
+
+        >>> list(Enamer.parse_pv_many(['1.0b2', '1.0', '1.0b2']))
+        [('1.0b2', ('1.0_beta2', ('${PV/_beta/b}',))), ('1.0', ('', ())), ('1.0b2', ('1.0_beta2', ('${PV/_beta/b}',)))]
+
+        """
+        for batch in chunked(versions, batch_size):
+            results = {}
+            for up_pv in batch:
+                if up_pv not in results:
+                    results[up_pv] = cls.parse_pv(up_pv)
+            for up_pv in batch:
+                yield up_pv, results[up_pv]
+
+    @classmethod
+    def get_vars_many(cls, args, batch_size=1000):
+        """Determine ebuild variables for many packages with :meth:`get_vars`.
+
+        Arguments are read ``batch_size`` at a time and each distinct
+        set of arguments in a batch is converted once. Atoms are
+        validated once per batch and arguments are not logged.
+        Conversion errors do not stop the stream, the exception is
+        yielded instead of result.
+
+        :param args: (uri, up_pn, up_pv) tuples, optionally followed
+            by other positional arguments of :meth:`get_vars`
+        :type args: iterable of tuples
+        :param batch_size: Number of tuples read at once
+        :type batch_size: int
+        :returns: generator of (args, dict or :exc:`GPyPiInvalidAtom`)
+            in order of ``args``
+
+        **Example:**
+
+        >>> for args, d in Enamer.get_vars_many([('http://www.foo.com/pkgfoo-1.0.tbz2', 'pkgfoo', '1.0')]):
+        ...     print d['p'], d['src_uri']
+        pkgfoo-1.0 http://www.foo.com/${P}.tbz2
+
+        """
+        for batch in chunked(args, batch_size):
+            batch = [tuple(a) for a in batch]
+            results = {}
+            valid = {}
+
+            def is_valid_atom(atom):
+                if atom not in valid:
+                    valid[atom] = PortageUtils.is_valid_atom(atom)
+                return valid[atom]
+
+            for a in batch:
+                if a in results:
+                    continue
+                try:
+                    results[a] = cls._get_vars(is_valid_atom, *a)
+                except GPyPiInvalidAtom, e:
+                    results[a] = e
+            for a in batch:
+                yield a, copy.deepcopy(results[a])
+
     @classmethod
     def _get_src_uri(cls, uri, my_pn):
         """
@@ -610,51 +773,12 @@ class Enamer(object):
             if line.startswith("License :: "):
                 my_license = line
 
-        my_license = my_license.split(":: ")[-1]
-        known_licenses = {
-            "Academic Free License (AFL)": "AFL-3.0",
-            "Aladdin Free Public License (AFPL)": "Aladdin",
-            "Aladdin Free Public License (AFPL)": "Aladdin",
-            "Apache Software License": "Apache-2.0",
-            "Apple Public Source License": "Apple",
-            "Artistic License": "Artistic-2",
-            "BSD License": "BSD-2",
-            "Common Public License": "CPL-1.0",
-            "GNU Affero General Public License v3": "AGPL-3",
-            "GNU Free Documentation License (FDL)": "FDL-3",
-            "GNU General Public License (GPL)": "GPL-2",
-            "GNU Library or Lesser General Public License (LGPL)": "LGPL-2.1",
-            "IBM Public License": "IBM",
-            "Intel Open Source License": "Intel",
-            "ISC License (ISCL)": "ISC",
-            "MIT License": "MIT",
-            "Mozilla Public License 1.0 (MPL)": "MPL",
-            "Mozilla Public License 1.1 (MPL 1.1)": "MPL-1.1",
-            "Nethack General Public License": "nethack",
-            "Netscape Public License (NPL)": "NPL-1.1",
-            "Open Group Test Suite License": "OGTSL",
-            "Public Domain": "public-domain",
-            "Python License (CNRI Python License)": "CNRI",
-            "Python Software Foundation License": "PSF-2.4",
-            "Qt Public License (QPL)": "QPL",
-            "Repoze Public License": "repoze",
-            "Sleepycat License": "DB",
-            "Sun Public License": "SPL",
-            "University of Illinois/NCSA Open Source License": "ncsa-1.3",
-            "W3C License": "WC3",
-            "zlib/libpng License": "ZLIB",
-            "Zope Public License": "ZPL",
-        }
-        guess_license = {
-            'LGPL': 'LGPL-2.1',
-            'GPL': 'GPL-2',
-        }
-        license = known_licenses.get(my_license, "")
+        license = KNOWN_LICENSES.get(my_license.split(":: ")[-1])
         if license:
             return license
         else:
             if isinstance(setup_license, str) and not Enamer.is_valid_portage_license(setup_license):
-                for guess, value in guess_license.iteritems():
+                for guess, value in GUESS_LICENSES:
                     if guess in setup_license:
                         return value
                 return ""
@@ -679,7 +803,7 @@ class Enamer(object):
         False
 
         """
-        return os.path.exists(os.path.join(PortageUtils.get_portdir(), "licenses", license))
+        return license in PortageUtils.get_license_index()
 
     @classmethod
     def construct_atom(cls, pn, category, pv=None, operator="", uses=None, if_use=None):
@@ -746,14 +870,23 @@ class SrcUriNamer(object):
     Plugins should subclass this class and provide methods
     for conversion.
 
+    Candidate URIs of all providers are probed at once, concurrently
+    (see :class:`gpypi.probe.UriProber`).
+
     :param uri: HTTP URI
     :type uri: string
+    :param prober: Prober for candidate URIs, by default the one
+        shared within the process (see :meth:`gpypi.probe.UriProber.get`),
+        or an uncached one if ``options`` are not given either
+    :type prober: :class:`gpypi.probe.UriProber`
+    :param options: Configuration of the shared prober
+    :type options: :class:`gpypi.config.ConfigManager` instance
     """
     __metaclass__ = SrcUriMetaclass
     BASE_HOMEPAGE = None
     BASE_URI = None
 
-    def __init__(self, uri, enamer, up_pn, my_pn, up_pv, my_pv, my_p, p):
+    def __init__(self, uri, enamer, up_pn, my_pn, up_pv, my_pv, my_p, p, prober=None, options=None):
         self.uris = []
         self.homepages = []
         self.uri = uri
@@ -764,6 +897,9 @@ class SrcUriNamer(object):
         self.my_pn = my_pn
         self.my_pv = my_pv
         self.my_p = my_p
+        if prober is None:
+            prober = UriProber.get(options) if options is not None else UriProber()
+        self.prober = prober
 
         # bash substitution variables
         if my_pv:
@@ -778,46 +914,64 @@ class SrcUriNamer(object):
             self.pn0 = "${PN:0:1}"
         self.p = my_p or "${P}"
 
+        # the same variables expanded, for probing
+        self.values = {
+            'pn': up_pn,
+            'pn0': up_pn[:1],
+            'pv': up_pv,
+            'p': '%s-%s' % (up_pn, up_pv),
+            'up_pn': up_pn,
+        }
+
     def __call__(self):
-        """"""
-        for provider in self.providers:
-            p = provider(self.uri)
-            self.uris.extend(p.convert_src_uri())
-            if self.uris:
-                self.homepages.extend(p.convert_homepage())
+        """Return :term:`SRC_URI` and :term:`HOMEPAGE` lists of
+        providers whose candidate URIs are online
+
+        """
+        args = (self.uri, self.enamer, self.up_pn, self.my_pn,
+            self.up_pv, self.my_pv, self.my_p, self.p)
+        providers = [provider(*args, prober=self.prober)
+            for provider in SrcUriMetaclass.providers]
+        candidates = [p.candidates() for p in providers]
+
+        online = self.prober.probe_many([probe_uri
+            for uris in candidates for uri, probe_uri in uris])
+        for provider, uris in zip(providers, candidates):
+            found = [uri for uri, probe_uri in uris if online[probe_uri]]
+            if found:
+                self.uris.extend(found)
+                self.homepages.extend(provider.convert_homepage())
         return self.uris, self.homepages
 
-    def is_uri_online(self, uri):
-        """Issue HTTP HEAD request to confirm location of URI"""
-        log.debug('is_uri_online: %s', uri)
-        up = urlparse.urlparse(uri)
-        conn = httplib.HTTPConnection(up.netloc, timeout=3)
-        try:
-            conn.request('HEAD', up.path)
-            resp = conn.getresponse()
-        except (httplib.HTTPException, socket.error):
-            log.error('is_uri_online: timeout')
-            return False
-        log.error('is_uri_online: status(%r)' % resp.status)
-        return resp.status in (302, 200)  # HEAD requests returns 302 FOUND when valid
+    def candidates(self):
+        """Return (uri, probe uri) for each valid extension, where
+        ``uri`` has bash variables and ``probe uri`` is expanded
 
-    def convert_src_uri(self):
-        """"""
+        """
         uris = []
         for ext in self.enamer.VALID_EXTENSIONS:
-            if self.is_valid_for_uri():
-                uri = self.BASE_URI % self.__dict__
-                uris.append(uri)
+            ext = ext.lstrip('.')
+            uris.append((self.BASE_URI % dict(self.__dict__, ext=ext),
+                self.BASE_URI % dict(self.values, ext=ext)))
         return uris
 
+    def is_uri_online(self, uri):
+        """Issue HTTP HEAD request to confirm location of URI"""
+        return self.prober.probe(uri)
+
+    def convert_src_uri(self):
+        """Return candidate URIs of this provider that are online"""
+        uris = self.candidates()
+        online = self.prober.probe_many([probe_uri for uri, probe_uri in uris])
+        return [uri for uri, probe_uri in uris if online[probe_uri]]
+
     def is_valid_for_uri(self):
         """
         Is plugin the right one for uri mirror?
 
         :rtype: bool
         """
-        uri = self.BASE_URI % __dict__
-        return self.is_uri_online(uri)
+        return bool(self.convert_src_uri())
 
     def convert_homepage(self):
         """"""
@@ -27,6 +27,10 @@ class GPyPiCouldNotUnpackEbuild(GPyPiException):
     """Raised if unpacking failed."""
 
 
+class GPyPiSetupPyError(GPyPiException):
+    """Raised if setup.py failed, timed out or exceeded memory limit."""
+
+
 class GPyPiInvalidParameter(GPyPiException):
     """Raised CLI parameter is not valid."""
 
@@ -35,6 +39,10 @@ class GPyPiCouldNotCreateEbuildPath(GPyPiException):
     """Raised when directory for an ebuild could not be created."""
 
 
+class GPyPiCacheMiss(GPyPiException):
+    """Raised when a response is not cached and PyPI may not be queried."""
+
+
 class GPyPiOverlayDoesNotExist(GPyPiException):
     """"""
 
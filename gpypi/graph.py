@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.graph
+
+Dependency graph
+****************
+
+:class:`DependencyGraph` tracks packages that need ebuilds and
+dependencies between them.
+
+"""
+
+import logging
+import collections
+
+from pkg_resources import safe_name
+
+log = logging.getLogger(__name__)
+
+
+class DependencyGraph(object):
+    """Graph of packages keyed by canonical name (see
+    :meth:`canonical_name`). A package is queued only the first time
+    it is added. Cycles are found once, by :meth:`topological_order`,
+    which ignores edges closing them and records them in :attr:`cycles`.
+
+    :attr:`nodes` -- canonical name -> (project name, version)
+
+    :attr:`edges` -- canonical name -> list of canonical names of dependencies
+
+    :attr:`queue` -- canonical names of packages waiting to be processed
+
+    :attr:`processed` -- set of canonical names of processed packages
+
+    :attr:`cycles` -- list of (canonical name, canonical name) edges
+    skipped by last :meth:`topological_order`
+
+    Example::
+
+        >>> graph = DependencyGraph()
+        >>> graph.add('Foo', '1.0')
+        True
+        >>> graph.add('bar', parent='foo')
+        True
+        >>> graph.add('foo', parent='bar')
+        False
+        >>> graph.topological_order()
+        [('bar', None), ('Foo', '1.0')]
+        >>> graph.cycles
+        [('bar', 'foo')]
+
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+        self.order = []
+        self.queue = collections.deque()
+        self.processed = set()
+        self.cycles = []
+
+    def __repr__(self):
+        return "<DependencyGraph %d nodes, %d queued>" % (len(self.nodes), len(self.queue))
+
+    def __contains__(self, name):
+        return self.canonical_name(name) in self.nodes
+
+    @classmethod
+    def canonical_name(cls, name):
+        """Return name used to compare packages.
+
+        >>> DependencyGraph.canonical_name('Foo_Bar')
+        'foo-bar'
+
+        """
+        return safe_name(name).lower()
+
+    def add(self, name, version=None, parent=None):
+        """Add package to the graph and queue it if it's not known yet.
+
+        :param name: Project name
+        :type name: string
+        :param version: Project version, None for highest
+        :type version: string
+        :param parent: Name of a package that depends on this one
+        :type parent: string
+        :returns: True if package was queued
+        :rtype: bool
+
+        """
+        key = self.canonical_name(name)
+        is_new = key not in self.nodes
+        if is_new:
+            self.nodes[key] = (name, version)
+            self.edges[key] = []
+            self.order.append(key)
+            self.queue.append(key)
+        if parent is not None:
+            self.add_edge(parent, name)
+        return is_new
+
+    def add_edge(self, parent, child):
+        """Record that ``parent`` depends on ``child``. Both must be in graph."""
+        parent = self.canonical_name(parent)
+        child = self.canonical_name(child)
+        if child not in self.edges[parent]:
+            self.edges[parent].append(child)
+
+    def pop(self):
+        """Return (name, version) of next queued package
+
+        :raises: :exc:`IndexError` if queue is empty
+
+        """
+        return self.nodes[self.queue.popleft()]
+
+    def mark_processed(self, name):
+        """Mark package as processed"""
+        self.processed.add(self.canonical_name(name))
+
+    def topological_order(self):
+        """Return packages so that each comes after all of its
+        dependencies (leaves first). Ties keep insertion order.
+        Edges pointing back to a package being visited close a cycle;
+        they are ignored and recorded in :attr:`cycles`.
+
+        :returns: list of (name, version)
+
+        """
+        result = []
+        visited = set()
+        active = set()
+        self.cycles = []
+        for root in self.order:
+            if root in visited:
+                continue
+            visited.add(root)
+            active.add(root)
+            stack = [(root, iter(self.edges[root]))]
+            while stack:
+                key, children = stack[-1]
+                for child in children:
+                    if child in active:
+                        log.warn("Circular dependency: %s -> %s", key, child)
+                        self.cycles.append((key, child))
+                    elif child not in visited:
+                        visited.add(child)
+                        active.add(child)
+                        stack.append((child, iter(self.edges[child])))
+                        break
+                else:
+                    stack.pop()
+                    active.discard(key)
+                    result.append(self.nodes[key])
+        return result
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.pms
+
+Package manager specification
+*****************************
+
+Syntax checks of names, versions and dependency atoms as described in
+the Gentoo package manager specification (PMS), chapters 3 and 8.
+Works without portage, which is slow to import and needed for
+nothing else when converting names and versions.
+
+Only ASCII names are valid and the ``cvs.`` version prefix is not
+supported, portage is more permissive here. Everything else gives the
+same results as :func:`portage.dep.isvalidatom` and
+:func:`portage.pkgsplit`.
+
+"""
+
+import re
+
+CATEGORY = r'[A-Za-z0-9_][A-Za-z0-9+_.-]*'
+PACKAGE = r'[A-Za-z0-9_][A-Za-z0-9+_-]*'
+VERSION = r'\d+(?:\.\d+)*[a-z]?(?:_(?:alpha|beta|pre|rc|p)\d*)*'
+REVISION = r'-r\d+'
+SLOT = r'[A-Za-z0-9_][A-Za-z0-9+_.-]*'
+USE_FLAG = r'[A-Za-z0-9][A-Za-z0-9+_@-]*'
+USE_DEP = r'(?:!?%(flag)s(?:\([+-]\))?[=?]|-?%(flag)s(?:\([+-]\))?)' % {'flag': USE_FLAG}
+
+PN_PATTERN = re.compile(r'^%s$' % PACKAGE)
+VERSION_PATTERN = re.compile(r'^%s(?:%s)?$' % (VERSION, REVISION))
+VERSION_SUFFIX_PATTERN = re.compile(r'-%s(?:%s)?$' % (VERSION, REVISION))
+PKGSPLIT_PATTERN = re.compile(r'^(?P<pn>%s?)-(?P<pv>%s)(?:-r(?P<rev>\d+))?$' % (PACKAGE, VERSION))
+ATOM_PATTERN = re.compile(r'''^
+    (?P<blocker>!!?)?
+    (?:
+        (?P<op>[<>]=?|[=~])
+        (?P<category>%(category)s)/(?P<p>%(package)s-%(version)s(?:%(revision)s)?)
+        (?P<star>\*)?
+    |
+        (?P<cp>%(category)s/(?P<pn>%(package)s))
+    )
+    (?::%(slot)s(?:/%(slot)s)?=?|:[*=])?
+    (?:\[%(use)s(?:,%(use)s)*\])?
+    $''' % {
+        'category': CATEGORY,
+        'package': PACKAGE,
+        'version': VERSION,
+        'revision': REVISION,
+        'slot': SLOT,
+        'use': USE_DEP,
+    }, re.VERBOSE)
+
+
+def is_valid_pn(pn):
+    """Return True if ``pn`` is a valid package name. A name may not
+    end with a hyphen followed by something that looks like a version.
+
+    **Example:**
+
+    >>> is_valid_pn('foo-bar')
+    True
+    >>> is_valid_pn('foo-1.0')
+    False
+
+    """
+    return bool(PN_PATTERN.match(pn)) and not VERSION_SUFFIX_PATTERN.search(pn)
+
+
+def is_valid_version(pv):
+    """Return True if ``pv`` is a valid version, with optional revision.
+
+    **Example:**
+
+    >>> is_valid_version('1.0_beta3_p2-r1')
+    True
+    >>> is_valid_version('1.0b3')
+    False
+
+    """
+    return bool(VERSION_PATTERN.match(pv))
+
+
+def pkgsplit(p):
+    """Split ``p`` into package name, version and revision.
+
+    :param p: Package name and version, e.g. `foobar-1.0-r1`
+    :type p: string
+    :returns: (pn, pv, rev), revision is `r0` if not given; None if
+        ``p`` could not be split
+    :rtype: tuple of strings
+
+    **Example:**
+
+    >>> pkgsplit('foo-bar-2.3_beta3-r5')
+    ('foo-bar', '2.3_beta3', 'r5')
+    >>> pkgsplit('foobar-1.0')
+    ('foobar', '1.0', 'r0')
+    >>> pkgsplit('foobar')
+
+    """
+    match = PKGSPLIT_PATTERN.match(p)
+    if match is None or VERSION_SUFFIX_PATTERN.search(match.group('pn')):
+        return None
+    return match.group('pn'), match.group('pv'), 'r' + (match.group('rev') or '0')
+
+
+def is_valid_atom(atom, allow_blockers=False):
+    """Return True if ``atom`` is a valid dependency atom. Versioned
+    atoms need an operator, ``*`` may only follow ``=``.
+
+    :param atom: Atom like `>=dev-python/foobar-1.0[doc]`
+    :type atom: string
+    :param allow_blockers: Accept blockers (`!` and `!!` prefixes)
+    :type allow_blockers: bool
+    :rtype: bool
+
+    **Example:**
+
+    >>> is_valid_atom('=dev-python/foobar-1.0')
+    True
+    >>> is_valid_atom('dev-python/foobar-1.0')
+    False
+    >>> is_valid_atom('=foobar-1.0')
+    False
+
+    """
+    match = ATOM_PATTERN.match(atom)
+    if match is None:
+        return False
+    if match.group('blocker') and not allow_blockers:
+        return False
+    if match.group('star') and match.group('op') != '=':
+        return False
+    if match.group('p') is not None:
+        return pkgsplit(match.group('p')) is not None
+    return not VERSION_SUFFIX_PATTERN.search(match.group('pn'))
@@ -7,35 +7,393 @@ Various functions dealing with portage
 
 """
 
-import sys
+import re
 import os
+import time
 import commands
 import logging
+import threading
+import collections
+import ConfigParser
 
-from portage import config as portage_config
-from portage import settings as portage_settings
-try:
-    # portage >= 2.2
-    from portage import dep as portage_dep
-except ImportError:
-    # portage <= 2.1
-    from portage import portage_dep
-
-# TODO: find more clean way
-sys.path.insert(0, "/usr/lib/gentoolkit/pym")
-import gentoolkit
-import gentoolkit.query
-
+from gpypi import pms
 from gpypi.exc import *
 
 
 log = logging.getLogger(__name__)
-CONFIG = portage_config(clone=portage_settings)
-ENV = CONFIG.environ()
+VDB_PATH = "var/db/pkg"
+REPOS_CONF_PATHS = ["/usr/share/portage/config/repos.conf", "etc/portage/repos.conf"]
+
+
+class LazyEnvironment(collections.MutableMapping):
+    """Portage environment (``make.conf`` and profile variables),
+    loaded from :meth:`PortageUtils.get_config` on first access. Loading
+    portage configuration takes long, so it is not done on import.
+    Changes are kept for the rest of the process::
+
+        ENV['PORTDIR_OVERLAY'] += ' /usr/local/portage'
+
+    """
+
+    def __init__(self):
+        self._environ = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        if self._environ is None:
+            return "<LazyEnvironment (not loaded)>"
+        return "<LazyEnvironment %r>" % self._environ
+
+    @property
+    def environ(self):
+        """Loaded environment dict"""
+        if self._environ is None:
+            with self._lock:
+                if self._environ is None:
+                    self._environ = PortageUtils.get_config().environ()
+        return self._environ
+
+    def __getitem__(self, key):
+        return self.environ[key]
+
+    def __setitem__(self, key, value):
+        self.environ[key] = value
+
+    def __delitem__(self, key):
+        del self.environ[key]
+
+    def __iter__(self):
+        return iter(self.environ)
+
+    def __len__(self):
+        return len(self.environ)
+
+
+ENV = LazyEnvironment()
+
+
+class EbuildIndex(object):
+    """Set of ebuilds in portage trees, built with one scan of
+    ``category/PN/P.ebuild`` files.
+
+    ``category/PN`` is in the index when package has any ebuild,
+    ``category/PN-PV`` (with or without revision) when that version has one.
+
+    :param trees: Paths of portage trees
+    :type trees: list of strings
+
+    Example::
+
+        >>> index = EbuildIndex([])
+        >>> index.add('/usr/local/portage/dev-python/foobar/foobar-1.0-r1.ebuild')
+        >>> 'dev-python/foobar' in index, '=dev-python/foobar-1.0' in index
+        (True, True)
+
+    """
+    IGNORED_DIRS = set(['eclass', 'licenses', 'metadata', 'profiles', 'scripts', 'distfiles', 'packages'])
+    REVISION = re.compile(r'-r\d+$')
+
+    def __init__(self, trees):
+        self.trees = list(trees)
+        self.packages = set()
+        self.versions = set()
+        for tree in self.trees:
+            self.scan(tree)
+
+    def __repr__(self):
+        return "<EbuildIndex %d packages, %d versions>" % (len(self.packages), len(self.versions))
+
+    def __contains__(self, atom):
+        atom = atom.lstrip('=')
+        return atom in self.packages or atom in self.versions
+
+    @classmethod
+    def listdir(cls, path):
+        """Return directory entries, empty list if ``path`` is not a directory"""
+        try:
+            return os.listdir(path)
+        except OSError:
+            return []
+
+    def scan(self, tree):
+        """Add all ebuilds in a portage tree"""
+        for category in self.listdir(tree):
+            if category.startswith('.') or category in self.IGNORED_DIRS:
+                continue
+            category_dir = os.path.join(tree, category)
+            for pn in self.listdir(category_dir):
+                for filename in self.listdir(os.path.join(category_dir, pn)):
+                    if filename.endswith('.ebuild'):
+                        self.add_cpv(category, pn, filename[:-len('.ebuild')])
+
+    def add_cpv(self, category, pn, p):
+        """Add ebuild given by category, :term:`PN` and :term:`P`"""
+        self.packages.add('%s/%s' % (category, pn))
+        self.versions.add('%s/%s' % (category, p))
+        self.versions.add('%s/%s' % (category, self.REVISION.sub('', p)))
+
+    def add(self, ebuild_path):
+        """Add ebuild given by path"""
+        pkg_dir, filename = os.path.split(ebuild_path)
+        category_dir, pn = os.path.split(pkg_dir)
+        self.add_cpv(os.path.basename(category_dir), pn, filename[:-len('.ebuild')])
+
+
+class MtimeSnapshot(object):
+    """Result of ``scan`` for a directory, computed again when mtime
+    of the directory changes, which is checked at most once per
+    :attr:`CHECK_INTERVAL` seconds.
+
+    :param path: Directory
+    :type path: string
+    :param scan: Function reading the directory, called with ``path``
+    :type scan: callable
+
+    :attr:`value` -- last result of ``scan``
+
+    """
+    CHECK_INTERVAL = 5
+
+    def __init__(self, path, scan):
+        self.path = path
+        self.scan = scan
+        self.value = None
+        self.mtime = None
+        self.checked = None
+        self.refresh()
+
+    def refresh(self, force=False):
+        """Read directory again if it changed since last check"""
+        now = time.time()
+        if not force and self.checked is not None and now - self.checked < self.CHECK_INTERVAL:
+            return
+        self.checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if self.value is None or mtime != self.mtime:
+            self.mtime = mtime
+            self.value = self.scan(self.path)
+            log.debug("Read %r", self)
+
+
+class LicenseIndex(MtimeSnapshot):
+    """Names of licenses in ``${PORTDIR}/licenses``, listed again
+    when the directory changes.
+
+    :param path: Licenses directory
+    :type path: string
+
+    :attr:`licenses` -- frozenset of license names
+
+    """
+
+    def __init__(self, path):
+        super(LicenseIndex, self).__init__(path, self.list_licenses)
+
+    def __repr__(self):
+        return "<LicenseIndex %s: %d licenses>" % (self.path, len(self.licenses))
+
+    def __contains__(self, license):
+        self.refresh()
+        return license in self.licenses
+
+    @property
+    def licenses(self):
+        return self.value
+
+    @staticmethod
+    def list_licenses(path):
+        """Return frozenset of license names in ``path``"""
+        return frozenset(EbuildIndex.listdir(path))
+
+
+class InstalledPackages(MtimeSnapshot):
+    """Snapshot of installed package database (``/var/db/pkg``),
+    category/PN mapped to installed versions. Portage updates mtime
+    of the database directory on every merge and unmerge, so the
+    snapshot is taken again when it changes.
+
+    :param path: Installed package database directory
+    :type path: string
+
+    :attr:`packages` -- dict of category/PN and lists of versions
+
+    """
+
+    def __init__(self, path):
+        super(InstalledPackages, self).__init__(path, self.list_packages)
+
+    def __repr__(self):
+        return "<InstalledPackages %s: %d packages>" % (self.path, len(self.packages))
+
+    def __getitem__(self, cp):
+        self.refresh()
+        return self.packages[cp]
+
+    def get(self, cp, default=None):
+        """Return versions of ``cp`` installed, or ``default``"""
+        try:
+            return self[cp]
+        except KeyError:
+            return default
+
+    @property
+    def packages(self):
+        return self.value
+
+    @staticmethod
+    def list_packages(path):
+        """Return dict of category/PN and installed versions in ``path``"""
+        packages = {}
+        for category in sorted(EbuildIndex.listdir(path)):
+            if category.startswith(('.', '-')):
+                continue
+            for p in sorted(EbuildIndex.listdir(os.path.join(path, category))):
+                # skip -MERGING-* and other temporary entries
+                split = not p.startswith(('.', '-')) and pms.pkgsplit(p)
+                if not split:
+                    continue
+                pn, pv, rev = split
+                if rev != 'r0':
+                    pv = '%s-%s' % (pv, rev)
+                packages.setdefault('%s/%s' % (category, pn), []).append(pv)
+        return packages
+
+
+class OverlayMap(object):
+    """Names of repositories mapped to their paths. Repositories are
+    read from ``repos.conf`` (files or directories of files) and from
+    ``profiles/repo_name`` of ``trees``, which take precedence. The map
+    is read again when mtime of any of these files changes.
+
+    :param trees: PORTDIR and PORTDIR_OVERLAY paths
+    :type trees: list of strings
+    :param repos_conf: Paths of ``repos.conf``, later override earlier
+    :type repos_conf: list of strings
+
+    :attr:`overlays` -- dict of repository names and paths
+
+    :attr:`main_repo` -- ``main-repo`` from ``repos.conf`` or None
+
+    """
+
+    def __init__(self, trees, repos_conf=()):
+        self.trees = trees
+        self.repos_conf = repos_conf
+        self.overlays = {}
+        self.main_repo = None
+        self.stamp = None
+        self.refresh()
+
+    def __repr__(self):
+        return "<OverlayMap %s>" % " ".join(sorted(self.overlays))
+
+    def repos_conf_files(self):
+        """Return list of existing ``repos.conf`` files"""
+        files = []
+        for path in self.repos_conf:
+            if os.path.isdir(path):
+                for name in sorted(EbuildIndex.listdir(path)):
+                    if not name.startswith('.') and not name.endswith('~'):
+                        files.append(os.path.join(path, name))
+            elif os.path.exists(path):
+                files.append(path)
+        return files
+
+    def get_stamp(self):
+        """Return mtimes of files the map is read from"""
+        stamp = []
+        for path in self.repos_conf_files() + \
+                [os.path.join(t, 'profiles', 'repo_name') for t in self.trees]:
+            try:
+                stamp.append((path, os.stat(path).st_mtime))
+            except OSError:
+                stamp.append((path, None))
+        return stamp
+
+    def refresh(self):
+        """Read the map again if any of its files changed"""
+        stamp = self.get_stamp()
+        if stamp != self.stamp:
+            self.read()
+            self.stamp = stamp
+            log.debug("Read overlays: %r", self)
+
+    def read(self):
+        """Read ``repos.conf`` and ``repo_name`` files"""
+        treemap = {}
+        parser = ConfigParser.RawConfigParser()
+        for path in self.repos_conf_files():
+            try:
+                parser.read(path)
+            except ConfigParser.Error, e:
+                log.warn("Could not read %s: %s", path, e)
+        for section in parser.sections():
+            if parser.has_option(section, 'location'):
+                treemap[section] = parser.get(section, 'location').strip()
+        main_repo = parser.defaults().get('main-repo')
+
+        for path in self.trees:
+            repo_name_path = os.path.join(path, 'profiles', 'repo_name')
+            try:
+                with open(repo_name_path, 'r') as f:
+                    treemap[f.readline().strip()] = path
+            except (OSError, IOError):
+                log.warn("No '%s', skipping" % repo_name_path)
+        self.overlays = treemap
+        self.main_repo = main_repo
 
 
 class PortageUtils(object):
     """"""
+    _config = None
+    _config_lock = threading.Lock()
+    _ebuild_index = None
+    _license_index = None
+    _overlay_map = None
+    _installed_packages = None
+    check_atoms = False
+
+    @classmethod
+    def get_config(cls):
+        """Return :class:`portage.config`, loaded on first use"""
+        if cls._config is None:
+            with cls._config_lock:
+                if cls._config is None:
+                    from portage import config, settings
+                    cls._config = config(clone=settings)
+                    log.debug("Loaded portage configuration")
+        return cls._config
+
+    @classmethod
+    def portage_isvalidatom(cls, atom):
+        """Return True if portage considers ``atom`` valid"""
+        try:
+            # portage >= 2.2
+            from portage import dep as portage_dep
+        except ImportError:
+            # portage <= 2.1
+            from portage import portage_dep
+        return bool(portage_dep.isvalidatom(atom))
+
+    @classmethod
+    def get_overlay_map(cls):
+        """Return :class:`OverlayMap` of PORTDIR, PORTDIR_OVERLAY and
+        ``repos.conf``, kept for the life of the process and refreshed
+        when its files change.
+
+        """
+        trees = [ENV['PORTDIR']] if ENV.get('PORTDIR') else []
+        trees += [os.path.realpath(t) for t in ENV.get("PORTDIR_OVERLAY", "").split()]
+        if cls._overlay_map is None or cls._overlay_map.trees != trees:
+            config_root = ENV.get('PORTAGE_CONFIGROOT') or '/'
+            repos_conf = [os.path.join(config_root, path) for path in REPOS_CONF_PATHS]
+            cls._overlay_map = OverlayMap(trees, repos_conf)
+        else:
+            cls._overlay_map.refresh()
+        return cls._overlay_map
 
     @classmethod
     def get_all_overlays(cls):
@@ -47,17 +405,7 @@ class PortageUtils(object):
         :returns: dict with repoman/paths
 
         """
-        porttrees = [ENV['PORTDIR']] + \
-            [os.path.realpath(t) for t in ENV["PORTDIR_OVERLAY"].split()]
-        treemap = {}
-        for path in porttrees:
-            repo_name_path = os.path.join(path, 'profiles/repo_name')
-            try:
-                repo_name = open(repo_name_path, 'r').readline().strip()
-                treemap[repo_name] = path
-            except (OSError, IOError):
-                log.warn("No '%s', skipping" % os.path.join(path, 'profiles/repo_name'))
-        return treemap
+        return dict(cls.get_overlay_map().overlays)
 
     @classmethod
     def get_overlay_path(cls, overlay_name):
@@ -80,28 +428,45 @@ class PortageUtils(object):
                 % (overlay_name, " ".join(overlays.keys())))
         return overlay_path
 
+    @classmethod
+    def get_installed_packages(cls):
+        """Return :class:`InstalledPackages` of ${ROOT}/var/db/pkg,
+        taken on first use.
+
+        """
+        path = os.path.join(ENV.get('ROOT') or '/', VDB_PATH)
+        if cls._installed_packages is None or cls._installed_packages.path != path:
+            cls._installed_packages = InstalledPackages(path)
+        return cls._installed_packages
+
     @classmethod
     def get_installed_ver(cls, cpn):
         """
         Return PV for installed version of package
 
-        :param cpn: cat/pkg-ver
+        :param cpn: category/pkg, USE dependencies and slot are ignored
         :type cpn: string
         :returns: string version or None if not pkg installed
 
+        **Example:**
+
+        >>> PortageUtils.get_installed_ver('dev-python/foobar[doc]')
+
         """
-        try:
+        cp = cpn.split('[', 1)[0].split(':', 1)[0]
+        versions = cls.get_installed_packages().get(cp)
+        if versions:
             #Return first version installed
             #XXX Log warning if more than one installed (SLOT)?
-            pkg = gentoolkit.find_installed_packages(cpn, masked=True)[0]
-            return pkg.get_version()
-        except:
-            return
+            return versions[0]
 
     @classmethod
     def is_valid_atom(cls, atom):
         """
         Return True if atom is valid portage =category/pn-pv.
+        Checked with :func:`gpypi.pms.is_valid_atom`; if
+        :attr:`check_atoms` is set, portage is asked too and
+        disagreements are logged.
 
         :param atom: category/package-version
         :type atom: string
@@ -115,14 +480,51 @@ class PortageUtils(object):
         False
 
         """
-        return bool(portage_dep.isvalidatom(atom))
+        valid = pms.is_valid_atom(atom)
+        if cls.check_atoms and valid != cls.portage_isvalidatom(atom):
+            log.warn("Atom %s is %s according to PMS, but not to portage",
+                atom, valid and "valid" or "invalid")
+        return valid
+
+    @classmethod
+    def get_ebuild_index(cls):
+        """Return :class:`EbuildIndex` of PORTDIR and all overlays,
+        built on first use.
+
+        """
+        if cls._ebuild_index is None:
+            trees = []
+            for path in [cls.get_portdir()] + cls.get_all_overlays().values():
+                path = os.path.realpath(path)
+                if path not in trees:
+                    trees.append(path)
+            cls._ebuild_index = EbuildIndex(trees)
+            log.debug("Indexed ebuilds in %s: %r", " ".join(trees), cls._ebuild_index)
+        return cls._ebuild_index
+
+    @classmethod
+    def get_license_index(cls):
+        """Return :class:`LicenseIndex` of ``${PORTDIR}/licenses``,
+        built on first use.
+
+        """
+        path = os.path.join(cls.get_portdir(), "licenses")
+        if cls._license_index is None or cls._license_index.path != path:
+            cls._license_index = LicenseIndex(path)
+        return cls._license_index
+
+    @classmethod
+    def index_ebuild(cls, ebuild_path):
+        """Add newly written ebuild to index, if it was built already"""
+        if cls._ebuild_index is not None:
+            cls._ebuild_index.add(ebuild_path)
 
     @classmethod
     def ebuild_exists(cls, cat_pkg):
         """
         Checks if an ebuild exists in portage tree or overlay
 
-        :param cat_pkg: category/package_name
+        :param cat_pkg: category/package_name or category/package_name-version
         :type cat_pkg: string
         :returns: bool
 
@@ -132,11 +534,7 @@ class PortageUtils(object):
         True
 
         """
-        pkgs = gentoolkit.query.Query(cat_pkg).find()
-        if len(pkgs):
-            return True
-        else:
-            return False
+        return cat_pkg in cls.get_ebuild_index()
 
     @classmethod
     def unpack_ebuild(cls, ebuild_path):
@@ -165,7 +563,7 @@ class PortageUtils(object):
             raise GPyPiCouldNotUnpackEbuild(output)
 
     @classmethod
-    def find_s_dir(cls, p, cat):
+    def find_s_dir(cls, p, cat, workdir=None):
         """
         Try to get ${S} by determining what directories were unpacked
 
@@ -173,11 +571,14 @@ class PortageUtils(object):
         :type p: string
         :param cat: valid portage category
         :type cat: string
+        :param workdir: directory sources were unpacked into,
+            portage WORKDIR if None
+        :type workdir: string
         :returns: string with directory name if detected, empty string
                   if S=WORKDIR, None if couldn't find S
 
         """
-        workdir = cls.get_workdir(p, cat)
+        workdir = workdir or cls.get_workdir(p, cat)
         files = os.listdir(workdir)
         dirs = []
         for unpacked in files:
@@ -245,11 +646,21 @@ class PortageUtils(object):
         """
         return ENV["PORTAGE_TMPDIR"]
 
+    @classmethod
+    def get_distdir(cls):
+        """Return DISTDIR from /etc/make.conf
+        """
+        return ENV["DISTDIR"]
+
     @classmethod
     def get_portdir(cls):
-        """Return PORTDIR from /etc/make.conf
+        """Return PORTDIR from /etc/make.conf, or path of main
+        repository from ``repos.conf`` if PORTDIR is not set.
         """
-        return ENV["PORTDIR"]
+        if ENV.get("PORTDIR"):
+            return ENV["PORTDIR"]
+        overlay_map = cls.get_overlay_map()
+        return overlay_map.overlays.get(overlay_map.main_repo, "")
 
     @classmethod
     def get_keyword(cls):
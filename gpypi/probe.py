@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.probe
+
+URI probing
+***********
+
+:class:`UriProber` checks with HTTP HEAD requests if files exist on
+mirrors. Probes run concurrently over kept-alive connections and results
+are cached in :class:`gpypi.cache.DiskCache`.
+
+"""
+
+import os
+import socket
+import httplib
+import logging
+import threading
+import urlparse
+from multiprocessing.pool import ThreadPool
+
+from gpypi.cache import DiskCache
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionPool(object):
+    """Idle HTTP connections, kept per host for reuse.
+
+    :param timeout: Socket timeout in seconds
+    :type timeout: int
+
+    """
+    CONNECTIONS = {
+        'http': httplib.HTTPConnection,
+        'https': httplib.HTTPSConnection,
+    }
+
+    def __init__(self, timeout=3):
+        self.timeout = timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def get(self, scheme, netloc):
+        """Return idle or new connection to ``netloc``"""
+        with self.lock:
+            connections = self.idle.get((scheme, netloc))
+            if connections:
+                return connections.pop()
+        return self.connect(scheme, netloc)
+
+    def connect(self, scheme, netloc):
+        """Return new connection to ``netloc``"""
+        return self.CONNECTIONS[scheme](netloc, timeout=self.timeout)
+
+    def put(self, scheme, netloc, conn):
+        """Return connection for reuse"""
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(conn)
+
+    def close(self):
+        """Close all idle connections"""
+        with self.lock:
+            for connections in self.idle.itervalues():
+                for conn in connections:
+                    conn.close()
+            self.idle = {}
+
+
+class UriProber(object):
+    """Checks if URIs are online. ``mirror://`` URIs are probed on
+    the host given in :attr:`MIRRORS`.
+
+    Results are cached for ``ttl`` seconds, negative ones too. Failed
+    requests (timeouts, connection errors) count as offline, but are
+    not cached.
+
+    :param cache: Cache for results, None disables caching
+    :type cache: :class:`gpypi.cache.DiskCache`
+    :param ttl: Seconds a result is valid
+    :type ttl: int
+    :param jobs: Number of concurrent probes
+    :type jobs: int
+    :param timeout: Socket timeout in seconds
+    :type timeout: int
+
+    :attr:`MIRRORS` -- mirror name -> base URL used for probing
+
+    :attr:`ONLINE_STATUS` -- HTTP statuses of HEAD request meaning file exists
+
+    """
+    MIRRORS = {
+        'pypi': 'http://pypi.python.org/packages/source/',
+        'sourceforge': 'http://downloads.sourceforge.net/',
+    }
+    ONLINE_STATUS = (200, 302)
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cache=None, ttl=24 * 60 * 60, jobs=8, timeout=3):
+        self.cache = cache
+        self.ttl = ttl
+        self.jobs = max(jobs, 1)
+        self.connections = ConnectionPool(timeout)
+
+    def __repr__(self):
+        return "<UriProber %r>" % self.cache
+
+    @classmethod
+    def from_config(cls, options):
+        """Create prober from `cache_dir`, `probe_cache_ttl` and
+        `probe_jobs` options.
+
+        :param options: Configuration
+        :type options: :class:`gpypi.config.ConfigManager` instance
+        :returns: :class:`UriProber` instance
+
+        """
+        cache = None
+        if options.cache_dir:
+            path = os.path.join(options.cache_dir, 'probes')
+            try:
+                cache = DiskCache.open(path)
+            except OSError, e:
+                log.warn("Could not use probe cache %s: %s", path, e)
+        return cls(cache, options.probe_cache_ttl, options.probe_jobs)
+
+    @classmethod
+    def get(cls, options):
+        """Return prober shared within the process, created from
+        ``options`` on first use.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_config(options)
+            return cls._shared
+
+    @classmethod
+    def resolve(cls, uri):
+        """Return URL to probe for ``uri``.
+
+        **Example:**
+
+        >>> UriProber.resolve('mirror://pypi/f/foobar/foobar-1.0.tar.gz')
+        'http://pypi.python.org/packages/source/f/foobar/foobar-1.0.tar.gz'
+        >>> UriProber.resolve('mirror://unknown/foobar-1.0.tar.gz')
+
+        """
+        if uri.startswith('mirror://'):
+            name, _, path = uri[len('mirror://'):].partition('/')
+            if name not in cls.MIRRORS:
+                return None
+            return cls.MIRRORS[name] + path
+        return uri
+
+    def probe(self, uri):
+        """Return True if ``uri`` is online
+
+        :param uri: HTTP(S) or mirror URI
+        :type uri: string
+        :rtype: bool
+
+        """
+        if self.cache is not None:
+            try:
+                online, fresh = self.cache.get('head', uri, self.ttl)
+            except KeyError:
+                pass
+            else:
+                if fresh:
+                    return online
+
+        url = self.resolve(uri)
+        up = urlparse.urlparse(url or '')
+        if up.scheme not in ConnectionPool.CONNECTIONS:
+            log.debug('probe: can not probe %s', uri)
+            return False
+
+        try:
+            status = self.head(up)
+        except (httplib.HTTPException, socket.error), e:
+            log.debug('probe: %s failed: %s', url, e)
+            return False
+        log.debug('probe: %s status(%r)', url, status)
+
+        online = status in self.ONLINE_STATUS
+        if self.cache is not None:
+            self.cache.set('head', uri, online)
+        return online
+
+    def head(self, up):
+        """Issue HEAD request over pooled connection, return status.
+        If a kept-alive connection fails (server closed it meanwhile),
+        request is retried once over a new connection.
+        """
+        path = up.path or '/'
+        if up.query:
+            path += '?' + up.query
+        conn = self.connections.get(up.scheme, up.netloc)
+        reused = conn.sock is not None
+        try:
+            resp = self.request(conn, path)
+        except socket.timeout:
+            raise
+        except (httplib.HTTPException, socket.error), e:
+            if not reused:
+                raise
+            log.debug('probe: kept-alive connection to %s failed (%s), reconnecting', up.netloc, e)
+            conn = self.connections.connect(up.scheme, up.netloc)
+            resp = self.request(conn, path)
+        if resp.will_close:
+            conn.close()
+        else:
+            self.connections.put(up.scheme, up.netloc, conn)
+        return resp.status
+
+    def request(self, conn, path):
+        """Send HEAD request over ``conn``, return read response.
+        Connection is closed on failure.
+        """
+        try:
+            conn.request('HEAD', path)
+            resp = conn.getresponse()
+            resp.read()
+        except:
+            conn.close()
+            raise
+        return resp
+
+    def probe_many(self, uris):
+        """Probe ``uris`` concurrently, each one once.
+
+        :param uris: URIs to probe
+        :type uris: list of strings
+        :returns: dict of uri -> bool
+
+        """
+        uris = list(set(uris))
+        if len(uris) < 2 or self.jobs == 1:
+            return dict((uri, self.probe(uri)) for uri in uris)
+        pool = ThreadPool(min(self.jobs, len(uris)))
+        try:
+            return dict(zip(uris, pool.map(self.probe, uris)))
+        finally:
+            pool.terminate()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.pypi
+
+PyPI client
+***********
+
+:class:`CachedCheeseShop` wraps :class:`yolk.pypi.CheeseShop` and keeps
+responses of metadata queries in :class:`gpypi.cache.DiskCache`, so
+repeated runs do not query :term:`PyPi` again. Everything needed to
+generate an ebuild is fetched at once as :class:`PackageSnapshot`.
+:class:`MultiCallBatcher` groups many calls into few requests.
+
+"""
+
+import os
+import socket
+import logging
+import xmlrpclib
+from functools import partial
+
+from pkg_resources import parse_version
+from yolk.pypi import CheeseShop, filter_url
+
+from gpypi.cache import DiskCache
+from gpypi.exc import *
+
+log = logging.getLogger(__name__)
+
+
+class PackageSnapshot(object):
+    """Release information of a package as known to :term:`PyPi`.
+
+    :attr:`name` -- project name with proper case
+
+    :attr:`versions` -- all versions, sorted from lowest to highest
+
+    :attr:`version` -- selected version, None if requested version does not exist
+
+    :attr:`urls` -- source distribution URLs of selected version
+
+    :attr:`release_data` -- metadata of selected version
+
+    """
+
+    def __init__(self, name, versions, version=None, urls=None, release_data=None):
+        self.name = name
+        self.versions = versions
+        self.version = version
+        self.urls = urls or []
+        self.release_data = release_data
+
+    def __repr__(self):
+        return "<PackageSnapshot %s %s>" % (self.name, self.version)
+
+    @classmethod
+    def source_urls(cls, release_urls, release_data):
+        """Return URLs of source distributions, the same way as
+        :meth:`yolk.pypi.CheeseShop.get_download_urls` does.
+
+        :param release_urls: Response of `release_urls` XML-RPC call
+        :type release_urls: list of dicts
+        :param release_data: Response of `release_data` XML-RPC call
+        :type release_data: dict
+        :rtype: list of strings
+
+        **Example:**
+
+        >>> PackageSnapshot.source_urls([{'packagetype': 'sdist', 'url': 'http://a/foo-1.0.zip'}],
+        ...     {'download_url': 'http://b/foo-1.0.tar.gz?modtime=1'})
+        ['http://a/foo-1.0.zip', 'http://b/foo-1.0.tar.gz']
+
+        """
+        urls = [u['url'] for u in release_urls or [] if u['packagetype'] == 'sdist']
+        download_url = (release_data or {}).get('download_url')
+        if download_url and download_url != 'UNKNOWN' and download_url not in urls:
+            url = filter_url('source', download_url)
+            if url:
+                urls.append(url)
+        return urls
+
+
+class CachedCheeseShop(object):
+    """Proxy to :class:`yolk.pypi.CheeseShop` that caches responses
+    of methods listed in :attr:`TTL`. Other attributes are passed through.
+
+    Expired entries are revalidated against :term:`PyPi`; if that fails,
+    expired entry is used.
+
+    :param cache: Cache for responses, None disables caching
+    :type cache: :class:`gpypi.cache.DiskCache`
+    :param offline: Never query :term:`PyPi`, use only cached responses
+    :type offline: bool
+    :param refresh: Ignore cached responses, but store new ones
+    :type refresh: bool
+    :param factory: Callable returning the real client, created on
+        first use (default :class:`yolk.pypi.CheeseShop`)
+
+    :attr:`TTL` -- seconds a response of a method is considered fresh
+
+    """
+    TTL = {
+        'list_packages': 60 * 60,
+        'package_releases': 60 * 60,
+        'query_versions_pypi': 60 * 60,
+        'release_urls': 24 * 60 * 60,
+        'release_data': 24 * 60 * 60,
+        'get_download_urls': 24 * 60 * 60,
+    }
+
+    def __init__(self, cache=None, offline=False, refresh=False, factory=CheeseShop):
+        self.cache = cache
+        self.offline = offline
+        self.refresh = refresh
+        self.factory = factory
+        self._cheeseshop = None
+
+    def __repr__(self):
+        return "<CachedCheeseShop %r>" % self.cache
+
+    @classmethod
+    def from_config(cls, options, **kw):
+        """Create client from `cache_dir`, `pypi_cache_size`,
+        `offline` and `refresh` options.
+
+        :param options: Configuration
+        :type options: :class:`gpypi.config.ConfigManager` instance
+        :returns: :class:`CachedCheeseShop` instance
+
+        """
+        cache = None
+        if options.cache_dir:
+            path = os.path.join(options.cache_dir, 'pypi')
+            try:
+                cache = DiskCache.open(path, options.pypi_cache_size * 1024 * 1024)
+            except OSError, e:
+                log.warn("Could not use PyPI cache %s: %s", path, e)
+        return cls(cache, options.offline, options.refresh, **kw)
+
+    def copy(self):
+        """Return client sharing configuration and cache, but not
+        the connection (used after fork).
+
+        """
+        return self.__class__(self.cache, self.offline, self.refresh, self.factory)
+
+    @property
+    def cheeseshop(self):
+        """Real client, created on first access"""
+        if self._cheeseshop is None:
+            if self.offline:
+                raise GPyPiCacheMiss("Offline mode, PyPI may not be queried.")
+            self._cheeseshop = self.factory()
+        return self._cheeseshop
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name in self.TTL:
+            return partial(self.call, name)
+        return getattr(self.cheeseshop, name)
+
+    def lookup(self, method, key):
+        """Return cached response.
+
+        :returns: (value, fresh) or None if not cached, caching
+            is disabled or responses are being refreshed
+        :rtype: tuple
+
+        """
+        if self.cache is None or self.refresh:
+            return
+        try:
+            value, fresh = self.cache.get(method, key, self.TTL[method])
+        except KeyError:
+            return
+        return value, fresh or self.offline
+
+    def store(self, method, key, value):
+        """Put response into cache"""
+        if self.cache is not None:
+            self.cache.set(method, key, value)
+
+    def call(self, method, *args, **kwargs):
+        """Return response of client's `method`, from cache if possible.
+
+        :param method: Name of the method, must be in :attr:`TTL`
+        :type method: string
+        :raises: :exc:`gpypi.exc.GPyPiCacheMiss` if response is not
+            cached in offline mode
+
+        """
+        key = args + tuple(sorted(kwargs.items()))
+        cached = self.lookup(method, key)
+        if cached and cached[1]:
+            return cached[0]
+
+        if self.offline:
+            raise GPyPiCacheMiss("%s%r is not cached." % (method, args))
+
+        try:
+            value = getattr(self.cheeseshop, method)(*args, **kwargs)
+        except (socket.error, xmlrpclib.ProtocolError), e:
+            if cached is None:
+                raise
+            log.warn("Could not query PyPI (%s), using expired %s%r", e, method, args)
+            return cached[0]
+
+        self.store(method, key, value)
+        return value
+
+    def call_many(self, calls, skip_missing=False):
+        """Return responses of several XML-RPC calls. Responses that
+        are not cached are fetched with one `system.multicall` request.
+        Calls that result in a fault return None.
+
+        :param calls: (method, args) pairs, methods must be in :attr:`TTL`
+            and be XML-RPC methods of :term:`PyPi`
+        :type calls: list of tuples
+        :param skip_missing: In offline mode, return None for responses
+            that are not cached instead of raising
+        :type skip_missing: bool
+        :returns: list of responses in order of ``calls``
+        :raises: :exc:`gpypi.exc.GPyPiCacheMiss` if a response is not
+            cached in offline mode
+
+        """
+        results = [None] * len(calls)
+        stale = {}
+        misses = []
+        for i, (method, args) in enumerate(calls):
+            cached = self.lookup(method, tuple(args))
+            if cached and cached[1]:
+                results[i] = cached[0]
+            else:
+                if cached:
+                    stale[i] = cached[0]
+                misses.append(i)
+
+        if not misses:
+            return results
+        if self.offline:
+            if skip_missing:
+                return results
+            raise GPyPiCacheMiss("%s%r is not cached." % calls[misses[0]])
+
+        multicall = xmlrpclib.MultiCall(self.cheeseshop.xmlrpc)
+        for i in misses:
+            method, args = calls[i]
+            getattr(multicall, method)(*args)
+
+        try:
+            responses = multicall()
+        except (socket.error, xmlrpclib.ProtocolError), e:
+            if len(stale) < len(misses):
+                raise
+            log.warn("Could not query PyPI (%s), using expired responses", e)
+            for i in misses:
+                results[i] = stale[i]
+            return results
+
+        for n, i in enumerate(misses):
+            method, args = calls[i]
+            try:
+                results[i] = responses[n]
+            except xmlrpclib.Fault, e:
+                log.debug("%s%r failed: %s", method, args, e)
+                continue
+            self.store(method, tuple(args), results[i])
+        return results
+
+    def snapshot(self, package_name, version=None):
+        """Fetch :class:`PackageSnapshot` of a package. Takes two
+        round-trips to :term:`PyPi` at most: one for versions, and one
+        `system.multicall` for release data and URLs.
+
+        :param package_name: case-insensitive package name
+        :type package_name: string
+        :param version: package version, highest if not given
+        :type version: string
+        :returns: :class:`PackageSnapshot` instance
+
+        """
+        name, versions = self.query_versions_pypi(package_name)
+        versions = sorted(versions, key=parse_version)
+        if not versions:
+            return PackageSnapshot(name, versions)
+        if version and version not in versions:
+            return PackageSnapshot(name, versions)
+
+        version = version or versions[-1]
+        release_data, release_urls = self.call_many([
+            ('release_data', (name, version)),
+            ('release_urls', (name, version)),
+        ])
+        urls = PackageSnapshot.source_urls(release_urls, release_data)
+        return PackageSnapshot(name, versions, version, urls, release_data)
+
+
+class MultiCallBatcher(object):
+    """Collects XML-RPC calls and sends them in `system.multicall`
+    requests of up to ``size`` calls (see
+    :meth:`CachedCheeseShop.call_many`). Each response is passed to
+    the callback given with the call, in the order calls were added.
+    Callbacks may add more calls.
+
+    :param client: PyPI client
+    :type client: :class:`CachedCheeseShop`
+    :param size: Maximum number of calls in one request
+    :type size: int
+
+    """
+
+    def __init__(self, client, size=100):
+        self.client = client
+        self.size = max(size, 1)
+        self.pending = []
+        self.flushing = False
+
+    def __repr__(self):
+        return "<MultiCallBatcher %d pending>" % len(self.pending)
+
+    def add(self, method, args, callback):
+        """Queue a call, send queued calls if there are enough of them.
+
+        :param method: XML-RPC method name
+        :type method: string
+        :param args: Arguments of the call
+        :type args: tuple
+        :param callback: Called with the response
+        :type callback: callable
+
+        """
+        self.pending.append((method, args, callback))
+        if len(self.pending) >= self.size and not self.flushing:
+            self.flush()
+
+    def flush(self):
+        """Send all queued calls, including those added by callbacks"""
+        self.flushing = True
+        try:
+            while self.pending:
+                batch = self.pending[:self.size]
+                del self.pending[:self.size]
+                results = self.client.call_many([(method, args) for method, args, callback in batch])
+                for (method, args, callback), result in zip(batch, results):
+                    callback(result)
+        finally:
+            self.flushing = False
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.sandbox
+
+setup.py sandbox
+****************
+
+:class:`SetupPyPool` runs ``setup.py`` of unpacked packages in worker
+processes with :func:`setuptools.setup` and :func:`distutils.core.setup`
+patched to record their keywords, which are sent back as plain data.
+Workers are separate interpreters, so packages are examined
+concurrently; a worker running longer than timeout is killed and
+replaced, and address space ``setup.py`` may allocate is limited, so it
+can not hang or exhaust gpypi itself. A worker is reused for a few
+packages, so global state changed by ``setup.py`` that
+:func:`run_setup` does not restore may leak into following ones.
+
+"""
+
+import os
+import sys
+import time
+import atexit
+import select
+import signal
+import logging
+import threading
+import subprocess
+import distutils.core
+import cPickle as pickle
+
+import setuptools
+
+from gpypi import utils
+from gpypi.exc import *
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+log = logging.getLogger(__name__)
+TOP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLAIN_TYPES = (basestring, int, long, float, bool, type(None))
+
+
+def plain(value):
+    """Convert ``value`` to plain data: strings, numbers, lists and
+    dicts of them. Tuples and sets become lists, other objects (like
+    command classes or extensions) their :func:`repr`.
+
+    **Example:**
+
+    >>> plain({'packages': ('foo',)})
+    {'packages': ['foo']}
+    >>> plain({'cmdclass': {'test': object}})
+    {'cmdclass': {'test': "<type 'object'>"}}
+
+    """
+    if isinstance(value, PLAIN_TYPES):
+        return value
+    elif isinstance(value, dict):
+        return dict((plain(k), plain(v)) for k, v in value.iteritems())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        return [plain(v) for v in value]
+    else:
+        return repr(value)
+
+
+def run_setup(unpacked_dir):
+    """Import ``setup.py`` in ``unpacked_dir`` and return keywords
+    passed to setup function. Changes process-wide state, so it is
+    meant to be run in a worker of :class:`SetupPyPool`.
+
+    :param unpacked_dir: Directory with setup.py
+    :type unpacked_dir: string
+    :returns: dict of plain data
+    :raises: :exc:`gpypi.exc.GPyPiNoSetupFile`
+    :raises: :exc:`gpypi.exc.GPyPiNoDistribution`
+
+    """
+    setup_file = os.path.join(unpacked_dir, "setup.py")
+    if not os.path.exists(unpacked_dir):
+        raise GPyPiNoDistribution("Unpacked dir could not be found: %s" % unpacked_dir)
+    if not os.path.exists(setup_file):
+        raise GPyPiNoSetupFile("%s does not exists." % setup_file)
+
+    setup_keywords = {}
+
+    def wrapper(**kw):
+        setup_keywords.update(kw)
+
+    temp_setup = setuptools.setup
+    temp_distutils = distutils.core.setup
+    setuptools.setup = wrapper
+    distutils.core.setup = wrapper
+    cwd = os.getcwdu()
+    path = list(sys.path)
+    argv = list(sys.argv)
+    environ = dict(os.environ)
+    modules = set(sys.modules)
+    try:
+        # run setup file from unpacked_dir
+        os.chdir(unpacked_dir)
+        utils.import_path(setup_file)
+    finally:
+        os.chdir(cwd)
+        sys.path[:] = path
+        sys.argv[:] = argv
+        os.environ.clear()
+        os.environ.update(environ)
+        # modules of the package must not be reused for the next one
+        for name in set(sys.modules) - modules:
+            del sys.modules[name]
+        setuptools.setup = temp_setup
+        distutils.core.setup = temp_distutils
+    return plain(setup_keywords)
+
+
+def address_space():
+    """Return current address space of the process in bytes, 0 if
+    unknown.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (IOError, OSError, ValueError):
+        # peak resident size in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def worker(input, output, memory_limit):
+    """Run :func:`run_setup` for directories read from ``input``
+    and write results to ``output`` until None is read. Both are
+    pickled.
+
+    :param memory_limit: Address space ``setup.py`` may allocate on
+        top of what the worker uses, in bytes, 0 for no limit
+    :type memory_limit: int
+
+    """
+    # interrupts are handled by parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory_limit and resource is not None:
+        limit = address_space() + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    while True:
+        try:
+            unpacked_dir = pickle.load(input)
+        except EOFError:
+            # parent exited without stopping the worker
+            break
+        if unpacked_dir is None:
+            break
+        try:
+            result = (True, run_setup(unpacked_dir))
+        except GPyPiException, e:
+            result = (False, e)
+        except BaseException, e:
+            result = (False, GPyPiSetupPyError("setup.py in %s failed: %s: %s"
+                % (unpacked_dir, e.__class__.__name__, e)))
+        try:
+            data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except MemoryError:
+            data = pickle.dumps((False, GPyPiSetupPyError("setup.py in %s exceeded memory limit"
+                % unpacked_dir)), pickle.HIGHEST_PROTOCOL)
+        output.write(data)
+        output.flush()
+
+
+def main():
+    """Entry point of worker processes started by :class:`SetupPyPool`"""
+    # keep stdout for results, output of setup.py goes to stderr
+    output = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    memory_limit = int(sys.argv[1])
+    # as if setup.py was run as a script
+    sys.argv[:] = ['setup.py']
+    worker(sys.stdin, output, memory_limit)
+
+
+class SetupPyPool(object):
+    """Pool of worker processes running ``setup.py``. Workers are
+    started on demand, reused for ``max_tasks`` packages and then
+    replaced, to limit state one ``setup.py`` leaves to the next ones.
+    Safe to use from multiple threads.
+
+    Workers are new interpreters rather than forks of gpypi, so they
+    do not inherit its threads, locks or memory.
+
+    :param processes: Maximum number of workers
+    :type processes: int
+    :param timeout: Seconds a ``setup.py`` may run
+    :type timeout: int
+    :param memory_limit: Address space ``setup.py`` may allocate in
+        bytes, 0 for no limit
+    :type memory_limit: int
+    :param max_tasks: Number of packages a worker runs before it is
+        replaced
+    :type max_tasks: int
+
+    """
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, processes=1, timeout=60, memory_limit=0, max_tasks=10):
+        self.processes = max(1, processes)
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.max_tasks = max(1, max_tasks)
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.processes)
+
+    def __repr__(self):
+        return "<SetupPyPool %d processes, %d idle>" % (self.processes, len(self.idle))
+
+    @classmethod
+    def from_config(cls, options):
+        """Create pool from `jobs`, `setup_py_timeout` and
+        `setup_py_memory_limit` options.
+
+        :param options: Configuration
+        :type options: :class:`gpypi.config.ConfigManager` instance
+        :returns: :class:`SetupPyPool` instance
+
+        """
+        return cls(options.jobs, options.setup_py_timeout,
+            options.setup_py_memory_limit * 1024 * 1024)
+
+    @classmethod
+    def get(cls, options):
+        """Return pool shared within the process, created from
+        ``options`` on first use. Its workers are stopped at exit.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_config(options)
+                atexit.register(cls._shared.close)
+            return cls._shared
+
+    def start_worker(self):
+        """Start new worker interpreter, return its
+        :class:`subprocess.Popen`"""
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([TOP_DIR] + filter(None,
+            [env.get('PYTHONPATH')]))
+        process = subprocess.Popen([sys.executable, '-c',
+            'from gpypi.sandbox import main; main()', str(self.memory_limit)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            close_fds=True, env=env)
+        process.tasks = 0
+        return process
+
+    def stop_worker(self, process):
+        """Ask worker to exit, kill it if it does not"""
+        try:
+            pickle.dump(None, process.stdin)
+            process.stdin.close()
+        except IOError:
+            pass
+        for i in xrange(10):
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+        self.kill_worker(process)
+
+    def idle_worker(self):
+        """Return idle worker that is still running, or a new one"""
+        with self.lock:
+            while self.idle:
+                process = self.idle.pop()
+                if process.poll() is None:
+                    return process
+                # killed while idle (for example by OOM killer)
+                self.kill_worker(process)
+        return self.start_worker()
+
+    def send(self, process, unpacked_dir):
+        """Send ``unpacked_dir`` to worker"""
+        pickle.dump(os.path.abspath(unpacked_dir), process.stdin,
+            pickle.HIGHEST_PROTOCOL)
+        process.stdin.flush()
+
+    def kill_worker(self, process):
+        """Kill worker and wait for it to exit"""
+        if process.poll() is None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+        process.wait()
+        process.stdin.close()
+        process.stdout.close()
+
+    def run(self, unpacked_dir):
+        """Run ``setup.py`` in ``unpacked_dir`` in a worker.
+
+        :param unpacked_dir: Directory with setup.py
+        :type unpacked_dir: string
+        :returns: dict of setup keywords, see :func:`plain`
+        :raises: :exc:`gpypi.exc.GPyPiSetupPyError` if setup.py failed,
+            timed out or worker died
+        :raises: :exc:`gpypi.exc.GPyPiNoSetupFile`
+        :raises: :exc:`gpypi.exc.GPyPiNoDistribution`
+
+        """
+        with self.slots:
+            process = self.idle_worker()
+            try:
+                try:
+                    self.send(process, unpacked_dir)
+                except IOError:
+                    if not process.tasks:
+                        raise
+                    # reused worker died before receiving the task
+                    self.kill_worker(process)
+                    process = self.start_worker()
+                    self.send(process, unpacked_dir)
+                if not select.select([process.stdout], [], [], self.timeout)[0]:
+                    self.kill_worker(process)
+                    raise GPyPiSetupPyError("setup.py in %s did not finish in %d seconds"
+                        % (unpacked_dir, self.timeout))
+                ok, result = pickle.load(process.stdout)
+            except (EOFError, IOError, pickle.UnpicklingError):
+                self.kill_worker(process)
+                raise GPyPiSetupPyError("Worker running setup.py in %s exited: %s"
+                    % (unpacked_dir, process.returncode))
+
+            process.tasks += 1
+            if process.tasks >= self.max_tasks:
+                self.stop_worker(process)
+            else:
+                with self.lock:
+                    self.idle.append(process)
+        if not ok:
+            raise result
+        return result
+
+    def close(self):
+        """Stop idle workers"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for process in idle:
+            self.stop_worker(process)
@@ -0,0 +1,498 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.sync
+
+Populate an overlay with all packages from :term:`PyPi`.
+
+"""
+
+import os
+import sys
+import signal
+import hashlib
+import logging
+import tempfile
+import multiprocessing
+import json
+from functools import partial
+
+from gpypi.cli import GPyPI
+from gpypi.enamer import Enamer
+from gpypi.exc import *
+from gpypi.graph import DependencyGraph
+from gpypi.portage_utils import PortageUtils
+from gpypi.pypi import CachedCheeseShop, MultiCallBatcher
+
+log = logging.getLogger(__name__)
+
+# Sync instance used by worker processes, inherited when pool forks
+_worker_sync = None
+
+
+class Sync(object):
+    """Creates ebuilds for every version of every package on
+    :term:`PyPi` that has no ebuild yet.
+
+    Versions and download URLs are queried with
+    :class:`gpypi.pypi.MultiCallBatcher`, `multicall_size` calls per request.
+
+    Serial of :term:`PyPi` changelog is stored in the overlay
+    (see :attr:`SERIAL_FILE`) after each run, so next run only checks
+    packages changed since then, bypassing cached :term:`PyPi` responses
+    for them (also when creating their ebuilds). Option `full_sync`
+    ignores stored serial.
+
+    Each finished (package, version) is appended to a journal
+    (see :attr:`JOURNAL_FILE`). An interrupted run is resumed from it,
+    and it is removed when run completes.
+
+    Option `shard` (``I/N``) limits sync to packages whose name hash
+    falls into shard I, so N hosts may split one sync. Serial and
+    journal are stored per shard. Option `processes` syncs with a pool
+    of worker processes.
+
+    :meth:`write_plan` stores what sync would do without doing it,
+    :meth:`run_plan` executes such plan.
+
+    :param config: Options to be used when making ebuilds
+    :type config: :class:`gpypi.config.ConfigManager`
+    :param pypi: PyPI client, created from config if not given
+    :type pypi: :class:`gpypi.pypi.CachedCheeseShop`
+    :raises: :exc:`gpypi.exc.GPyPiInvalidParameter` if `shard` is invalid
+
+    :attr:`SERIAL_FILE` -- path of stored serial, relative to overlay
+
+    :attr:`JOURNAL_FILE` -- path of journal, relative to overlay
+
+    """
+    SERIAL_FILE = 'metadata/gpypi-serial'
+    JOURNAL_FILE = 'metadata/gpypi-journal'
+
+    def __init__(self, config, pypi=None):
+        self.config = config
+        self.pypi = pypi or CachedCheeseShop.from_config(config)
+        self.batcher = MultiCallBatcher(self.pypi, config.multicall_size)
+        self.shard = self.parse_shard(config.shard)
+        self.done = set()
+        self.journal = None
+
+    def run(self):
+        """Sync packages changed since last run, or all of them"""
+        serial = None
+        if not self.config.full_sync:
+            serial = self.read_serial()
+
+        if serial is None:
+            # query serial first, changes made during sync are picked up next time
+            last_serial = self.pypi.xmlrpc.changelog_last_serial()
+            packages = self.pypi.list_packages()
+        else:
+            changes = self.pypi.xmlrpc.changelog_since_serial(serial)
+            last_serial = max([serial] + [change[4] for change in changes])
+            packages = self.changed_packages(changes)
+            # cached responses of changed packages predate the changes
+            self.pypi = self.pypi.copy()
+            self.pypi.refresh = True
+            self.batcher = MultiCallBatcher(self.pypi, self.batcher.size)
+        packages = [package for package in packages if self.in_shard(package)]
+
+        self.done = self.read_journal()
+        if serial is None:
+            log.info("Syncing all %d packages", len(packages))
+        else:
+            log.info("Syncing %d packages changed since serial %d", len(packages), serial)
+        if self.done:
+            log.info("Resuming, %d versions already done", len(self.done))
+
+        self.process(packages, 'sync_packages')
+        self.write_serial(last_serial)
+        self.remove_journal()
+
+    def process(self, items, method):
+        """Call ``method`` with ``items``, in worker processes if
+        `processes` option is greater than one.
+
+        """
+        try:
+            if self.config.processes > 1:
+                self.sync_in_processes(items, self.config.processes, method)
+            else:
+                getattr(self, method)(items)
+        except KeyboardInterrupt:
+            log.info("Sync interrupted, progress is kept in %s", self.journal_path())
+            raise
+        finally:
+            self.close_journal()
+
+    def sync_packages(self, packages):
+        """Sync given packages.
+
+        :param packages: names of packages on :term:`PyPi`
+        :type packages: iterable
+
+        """
+        for package in packages:
+            self.batcher.add('package_releases', (package,),
+                partial(self.handle_versions, package))
+        self.batcher.flush()
+
+    def sync_in_processes(self, items, processes, method='sync_packages'):
+        """Call ``method`` with chunks of ``items`` in a pool of
+        ``processes`` workers. Chunks are `multicall_size` long.
+
+        """
+        global _worker_sync
+        size = self.batcher.size
+        chunks = [(method, items[i:i + size]) for i in range(0, len(items), size)]
+
+        self.close_journal()
+        # built once here, workers inherit it
+        PortageUtils.get_ebuild_index()
+        _worker_sync = self
+        pool = multiprocessing.Pool(processes, init_worker)
+        try:
+            # timeout makes the wait interruptible
+            pool.map_async(sync_worker, chunks, 1).get(sys.maxint)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+            _worker_sync = None
+
+    def handle_versions(self, pn, versions):
+        """Queue URL query for each version that has no ebuild"""
+        versions = [version for version in versions or [] if (pn, version) not in self.done]
+        for version, atom in self.atoms(pn, versions):
+            # we skip existing ebuilds
+            if PortageUtils.ebuild_exists(atom):
+                continue
+            self.batcher.add('release_urls', (pn, version),
+                partial(self.handle_urls, pn, version, atom))
+
+    def handle_urls(self, pn, version, atom, urls):
+        """Create ebuild from source distribution of a version"""
+        source = self.source_release(urls)
+        # TODO: use setuptools way also
+        if source is None:
+            log.warn('Skipping %s, no source download url', atom)
+        else:
+            self.create(pn, version, source['url'])
+        self.record(pn, version)
+
+    def atoms(self, pn, versions):
+        """Yield (version, atom of ebuild) for versions of a package"""
+        pn = Enamer.parse_pn(pn)[0] or pn
+        for version, (pv, my_pv) in Enamer.parse_pv_many(versions):
+            yield version, Enamer.construct_atom(pn, self.config.category, pv or version)
+
+    @classmethod
+    def source_release(cls, urls):
+        """Return first source distribution from `release_urls` response.
+
+        :returns: dict with `url` and `size` keys, or None
+
+        **Example:**
+
+        >>> Sync.source_release([{'packagetype': 'bdist_egg', 'url': 'http://a/foo-1.0.egg', 'size': 20},
+        ...     {'packagetype': 'sdist', 'url': 'http://a/foo-1.0.zip', 'size': 10}])['url']
+        'http://a/foo-1.0.zip'
+
+        """
+        for release in urls or []:
+            if release.get('packagetype') == 'sdist':
+                return release
+
+    def create(self, pn, version, url):
+        """Create ebuild (and dependencies) for one version"""
+        try:
+            self.config.configs['argparse']['uri'] = url
+            self.config.configs['argparse']['up_pn'] = pn
+            self.config.configs['argparse']['up_pv'] = version
+            gpypi = GPyPI(pn, version, self.config, pypi=self.pypi)
+            gpypi.create_ebuilds()
+        except KeyboardInterrupt:
+            raise
+        except:
+            log.exception('Unexpected error occured during ebuild creation:')
+
+    def create_entries(self, entries):
+        """Create ebuilds for plan entries, see :meth:`write_plan`"""
+        for entry in entries:
+            self.create(entry['pn'], entry['pv'], entry['url'])
+            self.record(entry['pn'], entry['pv'])
+
+    def make_plan(self):
+        """Find versions that need ebuilds, using only cached
+        :term:`PyPi` responses and the ebuild index. Versions without
+        source distribution are left out.
+
+        :returns: (entries, stats) where entries are dicts with `pn`,
+            `pv`, `url` and `size` keys
+        :raises: :exc:`gpypi.exc.GPyPiCacheMiss` if package list is not cached
+
+        """
+        pypi = self.pypi.copy()
+        pypi.offline = True
+        size = self.batcher.size
+        stats = dict.fromkeys(['packages', 'versions', 'existing', 'no_source',
+            'not_cached', 'planned', 'bytes'], 0)
+        entries = []
+
+        packages = [package for package in pypi.list_packages() if self.in_shard(package)]
+        stats['packages'] = len(packages)
+        for i in range(0, len(packages), size):
+            chunk = packages[i:i + size]
+            needed = []
+            releases = pypi.call_many([('package_releases', (pn,)) for pn in chunk], skip_missing=True)
+            for pn, versions in zip(chunk, releases):
+                if versions is None:
+                    stats['not_cached'] += 1
+                    continue
+                for version, atom in self.atoms(pn, versions):
+                    stats['versions'] += 1
+                    if PortageUtils.ebuild_exists(atom):
+                        stats['existing'] += 1
+                    else:
+                        needed.append((pn, version))
+
+            for j in range(0, len(needed), size):
+                calls = needed[j:j + size]
+                responses = pypi.call_many([('release_urls', args) for args in calls], skip_missing=True)
+                for (pn, version), urls in zip(calls, responses):
+                    if urls is None:
+                        stats['not_cached'] += 1
+                        continue
+                    source = self.source_release(urls)
+                    if source is None:
+                        stats['no_source'] += 1
+                        continue
+                    entries.append({'pn': pn, 'pv': version, 'url': source['url'],
+                        'size': source.get('size') or 0})
+                    stats['bytes'] += entries[-1]['size']
+
+        stats['planned'] = len(entries)
+        return entries, stats
+
+    def write_plan(self, path):
+        """Write plan made by :meth:`make_plan` to a file and report it.
+
+        :param path: Plan file
+        :type path: string
+
+        """
+        entries, stats = self.make_plan()
+        with open(path, 'w') as f:
+            json.dump({'category': self.config.category, 'stats': stats, 'entries': entries}, f, indent=1)
+
+        log.info("Checked %(versions)d versions of %(packages)d packages", stats)
+        log.info("Skipping %(existing)d versions with ebuild and %(no_source)d without source download url", stats)
+        if stats['not_cached']:
+            log.warn("%(not_cached)d packages or versions are not in PyPI cache, sync to fetch them", stats)
+        log.info("Plan for %d ebuilds, about %.1f MB to download, written to %s",
+            stats['planned'], stats['bytes'] / 1024.0 / 1024.0, path)
+
+    @classmethod
+    def read_plan(cls, path):
+        """Read plan written by :meth:`write_plan`
+
+        :returns: dict with `category`, `stats` and `entries` keys
+        :raises: :exc:`gpypi.exc.GPyPiInvalidParameter` if file is not a plan
+
+        """
+        try:
+            with open(path) as f:
+                plan = json.load(f)
+            plan['entries']
+        except (IOError, ValueError, KeyError, TypeError), e:
+            raise GPyPiInvalidParameter("Could not read sync plan %s: %s" % (path, e))
+        return plan
+
+    def run_plan(self, path):
+        """Create ebuilds listed in plan file, without querying
+        :term:`PyPi` or checking for existing ebuilds. Progress is
+        journaled as in :meth:`run`.
+
+        :param path: Plan file
+        :type path: string
+
+        """
+        plan = self.read_plan(path)
+        if plan.get('category') != self.config.category:
+            log.warn("Plan was made for category %s, using %s", plan.get('category'), self.config.category)
+
+        self.done = self.read_journal()
+        entries = [entry for entry in plan['entries'] if (entry['pn'], entry['pv']) not in self.done]
+        log.info("Creating %d ebuilds from %s", len(entries), path)
+        self.process(entries, 'create_entries')
+        self.remove_journal()
+
+    @classmethod
+    def changed_packages(cls, changes):
+        """Return names of packages in changelog entries, each once.
+
+        :param changes: Response of `changelog_since_serial` XML-RPC call,
+            (name, version, timestamp, action, serial) tuples
+        :type changes: list
+        :rtype: list of strings
+
+        **Example:**
+
+        >>> Sync.changed_packages([('foo', '1.0', 0, 'new release', 1),
+        ...     ('bar', None, 0, 'create', 2), ('foo', '1.0', 0, 'add source file', 3)])
+        ['foo', 'bar']
+
+        """
+        seen = set()
+        packages = []
+        for change in changes:
+            if change[0] not in seen:
+                seen.add(change[0])
+                packages.append(change[0])
+        return packages
+
+    @classmethod
+    def parse_shard(cls, shard):
+        """Parse ``I/N`` shard specification.
+
+        :param shard: Shard number and count, empty for no sharding
+        :type shard: string
+        :returns: (zero-based index, count) or None
+        :raises: :exc:`gpypi.exc.GPyPiInvalidParameter`
+
+        **Example:**
+
+        >>> Sync.parse_shard('2/4')
+        (1, 4)
+
+        """
+        if not shard:
+            return None
+        try:
+            index, count = [int(n) for n in shard.split('/')]
+        except ValueError:
+            raise GPyPiInvalidParameter("Shard must be given as I/N: %s" % shard)
+        if not 1 <= index <= count:
+            raise GPyPiInvalidParameter("Shard number must be between 1 and %d: %s" % (count, shard))
+        return index - 1, count
+
+    @classmethod
+    def shard_of(cls, name, count):
+        """Return zero-based shard of package, same on every host.
+
+        >>> Sync.shard_of('Foo_Bar', 4) == Sync.shard_of('foo-bar', 4)
+        True
+
+        """
+        key = DependencyGraph.canonical_name(name)
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return int(hashlib.md5(key).hexdigest(), 16) % count
+
+    def in_shard(self, name):
+        """Return True if package belongs to shard being synced"""
+        if self.shard is None:
+            return True
+        index, count = self.shard
+        return self.shard_of(name, count) == index
+
+    def state_path(self, filename):
+        """Return path of sync state file in the overlay, separate
+        for each shard.
+
+        """
+        overlay_path = PortageUtils.get_overlay_path(self.config.overlay)
+        path = os.path.join(overlay_path, filename)
+        if self.shard is not None:
+            path += '-%d-of-%d' % (self.shard[0] + 1, self.shard[1])
+        return path
+
+    def serial_path(self):
+        """Return path of file storing changelog serial in the overlay"""
+        return self.state_path(self.SERIAL_FILE)
+
+    def journal_path(self):
+        """Return path of journal in the overlay"""
+        return self.state_path(self.JOURNAL_FILE)
+
+    def read_serial(self):
+        """Return changelog serial stored by last run, None if not available"""
+        path = self.serial_path()
+        try:
+            with open(path) as f:
+                return int(f.read().strip())
+        except (IOError, ValueError), e:
+            log.debug("No changelog serial in %s: %s", path, e)
+            return None
+
+    def write_serial(self, serial):
+        """Store changelog serial atomically"""
+        path = self.serial_path()
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write('%d\n' % serial)
+        os.chmod(tmp_path, 0644)
+        os.rename(tmp_path, path)
+        log.debug("Stored changelog serial %d in %s", serial, path)
+
+    def read_journal(self):
+        """Return set of (package, version) recorded in journal"""
+        done = set()
+        try:
+            f = open(self.journal_path())
+        except IOError:
+            return done
+        with f:
+            for line in f:
+                # last line may be cut short by interruption
+                if line.endswith('\n') and '\t' in line:
+                    pn, version = line[:-1].decode('utf-8').split('\t', 1)
+                    done.add((pn, version))
+        return done
+
+    def record(self, pn, version):
+        """Append finished (package, version) to journal"""
+        if self.journal is None:
+            path = self.journal_path()
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.journal = open(path, 'a')
+        line = u'%s\t%s\n' % (pn, version)
+        self.journal.write(line.encode('utf-8'))
+        self.journal.flush()
+        self.done.add((pn, version))
+
+    def remove_journal(self):
+        """Remove journal of completed run"""
+        path = self.journal_path()
+        if os.path.exists(path):
+            os.unlink(path)
+
+    def close_journal(self):
+        """Close journal if open"""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+
+def init_worker():
+    """Prepare forked worker process for :func:`sync_worker`"""
+    # interrupts are handled by parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # connection to PyPI must not be shared with parent
+    _worker_sync.pypi = _worker_sync.pypi.copy()
+    _worker_sync.batcher = MultiCallBatcher(_worker_sync.pypi, _worker_sync.batcher.size)
+
+
+def sync_worker(args):
+    """Call :class:`Sync` method with chunk of items in worker process"""
+    method, items = args
+    try:
+        getattr(_worker_sync, method)(items)
+    finally:
+        _worker_sync.close_journal()
+    return len(items)
@@ -3,7 +3,10 @@
 
 import os
 import logging
+import threading
+import xmlrpclib
 import unittest2
+from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 
 
 class BaseTestCase(unittest2.TestCase):
@@ -30,3 +33,81 @@ class ListHandler(logging.Handler):
         for attr in dir(self):
             if isinstance(getattr(self, attr), list):
                 setattr(self, attr, [])
+
+
+class LocalPyPI(SimpleXMLRPCServer):
+    """Stand-in for :term:`PyPi` XML-RPC interface, served on localhost
+    from ``packages``, a dict of name -> {version: release_urls}.
+
+    :attr:`requests` -- number of HTTP requests received
+
+    :attr:`changelog` -- list of (name, version, timestamp, action, serial)
+
+    """
+
+    def __init__(self, packages, changelog=None):
+        self.packages = packages
+        self.changelog = changelog or []
+        self.requests = 0
+        server = self
+
+        class Handler(SimpleXMLRPCRequestHandler):
+            rpc_paths = ('/pypi',)
+
+            def do_POST(self):
+                server.requests += 1
+                SimpleXMLRPCRequestHandler.do_POST(self)
+
+            def log_message(self, *args):
+                pass
+
+        SimpleXMLRPCServer.__init__(self, ('127.0.0.1', 0), Handler,
+            logRequests=False, allow_none=True)
+        self.register_multicall_functions()
+        for name in ['list_packages', 'package_releases', 'release_urls', 'release_data',
+                     'changelog_last_serial', 'changelog_since_serial']:
+            self.register_function(getattr(self, name), name)
+
+    @property
+    def url(self):
+        return 'http://%s:%d/pypi' % self.server_address
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def list_packages(self):
+        return sorted(self.packages)
+
+    def package_releases(self, name):
+        return sorted(self.packages.get(name, {}))
+
+    def release_urls(self, name, version):
+        return self.packages[name][version]
+
+    def release_data(self, name, version):
+        return {'name': name, 'version': version}
+
+    def changelog_last_serial(self):
+        return max([0] + [change[4] for change in self.changelog])
+
+    def changelog_since_serial(self, serial):
+        return [change for change in self.changelog if change[4] > serial]
+
+
+class LocalCheeseShop(object):
+    """Minimal :class:`yolk.pypi.CheeseShop` talking to :class:`LocalPyPI`"""
+
+    def __init__(self, url):
+        self.xmlrpc = xmlrpclib.ServerProxy(url, allow_none=True)
+
+    def __getattr__(self, name):
+        return getattr(self.xmlrpc, name)
+
+    def query_versions_pypi(self, package_name):
+        return package_name, self.xmlrpc.package_releases(package_name)
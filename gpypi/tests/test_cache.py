@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import tempfile
+import shutil
+
+from gpypi.cache import *
+from gpypi.tests import *
+
+
+class TestDiskCache(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.cache = DiskCache(self.path)
+
+    def test_get_missing(self):
+        self.assertRaises(KeyError, self.cache.get, 'release_data', ('foobar', '1.0'))
+
+    def test_set_get(self):
+        self.cache.set('release_data', ('foobar', '1.0'), {'name': 'foobar'})
+        self.assertEqual(({'name': 'foobar'}, True),
+            self.cache.get('release_data', ('foobar', '1.0'), 60))
+
+    def test_unicode_key(self):
+        self.cache.set('release_data', ('foobar', '1.0'), 1)
+        self.assertEqual((1, True), self.cache.get('release_data', (u'foobar', u'1.0')))
+
+    def test_namespaces(self):
+        self.cache.set('release_data', ('foobar',), 1)
+        self.assertRaises(KeyError, self.cache.get, 'release_urls', ('foobar',))
+
+    def test_expired(self):
+        self.cache.set('release_data', ('foobar',), 1)
+        self.assertEqual((1, False), self.cache.get('release_data', ('foobar',), -1))
+
+    def test_delete(self):
+        self.cache.set('release_data', ('foobar',), 1)
+        self.cache.delete('release_data', ('foobar',))
+        self.assertRaises(KeyError, self.cache.get, 'release_data', ('foobar',))
+
+    def test_evict(self):
+        self.cache.set('release_data', ('old',), 'x' * 1000)
+        path = self.cache.key_path('release_data', ('old',))
+        os.utime(path, (time.time() - 100, time.time() - 100))
+
+        self.cache.max_size = 1500
+        self.cache.set('release_data', ('new',), 'x' * 1000)
+
+        self.assertRaises(KeyError, self.cache.get, 'release_data', ('old',))
+        self.assertEqual('x' * 1000, self.cache.get('release_data', ('new',))[0])
+
+    def test_open(self):
+        path = os.path.join(self.path, 'pypi')
+        cache = DiskCache.open(path)
+        self.assertTrue(os.path.isdir(path))
+        self.assertIs(cache, DiskCache.open(path))
+
+
+class TestDistfileCache(BaseTestCase):
+    """"""
+
+    URL = 'http://pypi.python.org/packages/source/f/foobar/foobar-1.0.tar.gz'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.cache = DistfileCache(self.path)
+
+    def make_file(self, content):
+        fd, path = tempfile.mkstemp(dir=self.path, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_lookup_missing(self):
+        self.assertRaises(KeyError, self.cache.lookup, self.URL)
+
+    def test_add_lookup(self):
+        path = self.cache.add(self.URL, self.make_file('foobar'))
+        self.assertEqual(path, self.cache.lookup(self.URL))
+        self.assertEqual('foobar', open(path).read())
+        self.assertEqual(DistfileCache.file_digest(path), path.replace(os.sep, '')[-64:])
+
+    def test_same_content(self):
+        """Archive is stored once for all its URLs"""
+        path = self.cache.add(self.URL, self.make_file('foobar'))
+        self.assertEqual(path, self.cache.add('http://example.com/foobar-1.0.tar.gz', self.make_file('foobar')))
+
+    def test_corrupted(self):
+        path = self.cache.add(self.URL, self.make_file('foobar'))
+        open(path, 'w').write('corrupted')
+        self.assertRaises(KeyError, self.cache.lookup, self.URL)
+        self.assertFalse(os.path.exists(path))
+        self.assertRaises(KeyError, self.cache.get, 'urls', self.URL)
+
+    def test_evict(self):
+        old = self.cache.add(self.URL, self.make_file('x' * 1000))
+        os.utime(old, (time.time() - 100, time.time() - 100))
+
+        self.cache.max_size = 1500
+        new = self.cache.add('http://example.com/new-1.0.tar.gz', self.make_file('y' * 1000))
+
+        self.assertRaises(KeyError, self.cache.lookup, self.URL)
+        self.assertEqual(new, self.cache.lookup('http://example.com/new-1.0.tar.gz'))
@@ -4,6 +4,9 @@
 
 """
 
+import sys
+import subprocess
+
 import unittest2
 import mock
 from pkg_resources import parse_requirements
@@ -21,6 +24,13 @@ class TestGPyPI(BaseTestCase):
             overwrite = False
             category = False
             uri = None
+            jobs = 1
+            cache_dir = ''
+            offline = False
+            refresh = False
+
+            def copy(self):
+                return self
 
         self.gpypi = GPyPI('foobar', '1.0', Options())
         self.packages = []
@@ -40,10 +50,59 @@ class TestGPyPI(BaseTestCase):
 
         self.assertEqual([['foobar', '1.0'], ['sphinx', None], ['foobar2', None]], self.packages)
 
+    def test_create_ebuild_with_circular_deps(self):
+        """Processed packages are not queued again, names are case-insensitive"""
+        deps = {
+            'foobar': parse_requirements(['Sphinx', 'jinja2']),
+            'Sphinx': parse_requirements(['FooBar', 'Jinja2']),
+        }
+        def do_ebuild():
+            self.packages.append([self.gpypi.package_name, self.gpypi.version])
+            return deps.get(self.gpypi.package_name)
+
+        with mock.patch.object(self.gpypi, 'do_ebuild', do_ebuild):
+            self.gpypi.create_ebuilds()
+
+        self.assertEqual([['foobar', '1.0'], ['Sphinx', None], ['jinja2', None]], self.packages)
+        self.assertEqual([('sphinx', 'foobar')], self.gpypi.graph.cycles)
+
+    def test_create_ebuilds_concurrently(self):
+        """All dependencies are processed when using more jobs"""
+        deps = {
+            'foobar': parse_requirements(['sphinx==0.6', 'foobar2>=1.0']),
+            'sphinx': parse_requirements(['jinja2']),
+        }
+        def do_ebuild_job(project_name, version):
+            self.packages.append([project_name, version])
+            return deps.get(project_name)
+
+        self.gpypi.options.jobs = 2
+        with mock.patch.object(self.gpypi, 'do_ebuild_job', do_ebuild_job):
+            self.gpypi.create_ebuilds()
+
+        self.assertEqual(['foobar', '1.0'], self.packages[0])
+        self.assertItemsEqual([['foobar', '1.0'], ['sphinx', None], ['foobar2', None], ['jinja2', None]],
+            self.packages)
+
 
 class TestCLI(BaseTestCase):
     """"""
 
+    def make_config(self, command):
+        return mock.Mock(command=command, no_memoize=False, check_atoms=False,
+            plan=None, from_plan=None)
+
+    @mock.patch('gpypi.cli.CLI.check_permissions')
+    @mock.patch('gpypi.cli.GPyPI')
+    def test_check_permissions(self, GPyPI, check_permissions):
+        """Only commands writing to an overlay check permissions"""
+        CLI(self.make_config('echo'))
+        self.assertFalse(check_permissions.called)
+        CLI(self.make_config('create'))
+        self.assertEqual(1, check_permissions.call_count)
+        with mock.patch('gpypi.sync.Sync'):
+            CLI(self.make_config('sync'))
+        self.assertEqual(2, check_permissions.call_count)
 
 
 class TestMain(BaseTestCase):
@@ -52,3 +111,15 @@ class TestMain(BaseTestCase):
     def test_help(self):
         """docstring for test_help"""
         self.assertRaises(SystemExit, main, ['--help'])
+
+    def test_lazy_imports(self):
+        """--version does not import modules needed only by commands"""
+        code = ("import sys\n"
+                "from gpypi.cli import main\n"
+                "try: main(['--version'])\n"
+                "except SystemExit: pass\n"
+                "print [m for m in sys.modules if m.split('.')[0] in "
+                "('yolk', 'jinja2', 'pygments', 'metagen', 'portage') or m == 'gpypi.ebuild']")
+        process = subprocess.Popen([sys.executable, '-c', code],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual('[]', process.communicate()[0].strip())
@@ -66,6 +66,11 @@ category = dev-python
         self.assertEqual(u'foobar', Config.validate('uri', u'foobar'))
         self.assertRaises(GPyPiValidationError, Config.validate, 'uri', True)
 
+    def test_validate_int(self):
+        self.assertEqual(4, Config.validate('jobs', '4'))
+        self.assertEqual(4, Config.validate('jobs', 4))
+        self.assertRaises(GPyPiValidationError, Config.validate, 'jobs', 'foobar')
+
 
 class TestConfigManager(BaseTestCase):
     """"""
@@ -115,6 +120,15 @@ class TestConfigManager(BaseTestCase):
         self.assertEqual([('ask', ('category',), {})], self.mgr.q.method_calls)
         self.assertEqual(1, self.mgr.q.ask.call_count)
 
+    def test_copy(self):
+        self.mgr.configs['pypi'] = Config.from_pypi({'overlay': 'foo'})
+        mgr = self.mgr.copy()
+        mgr.configs['pypi']['overlay'] = 'bar'
+
+        self.assertEqual('foo', self.mgr.overlay)
+        self.assertEqual('bar', mgr.overlay)
+        self.assertIs(self.mgr.configs['questionnaire'], mgr.configs['questionnaire'])
+
     def test_non_existent_option(self):
         self.mgr.configs['pypi'] = Config.from_pypi({})
 
@@ -4,12 +4,18 @@
 
 """
 
+import sys
 import unittest2
+import tarfile
 import tempfile
 import shutil
+from StringIO import StringIO
+
+import mock
 
 from gpypi import portage_utils
 from gpypi.ebuild import *
+from gpypi.unpack import NativeUnpacker
 from gpypi.config import *
 from gpypi.tests import *
 from gpypi.exc import *
@@ -172,6 +178,23 @@ class TestEbuild(BaseTestCase):
         self.ebuild.discover_tests()
         self.assertEqual('nosetests', self.ebuild['tests_method'])
 
+    def test_shared_template(self):
+        config = ConfigManager(['pypi', 'ini'])
+        config.configs['ini'] = dict(up_pn='foo', up_pv='2.0', category='dev-python')
+        self.assertIs(self.ebuild.template, Ebuild(config).template)
+        self.assertEqual('b', self.ebuild.env.filters['replace_re']('a', 'a', 'b'))
+
+    def test_template_bytecode_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        options = mock.Mock(cache_dir=cache_dir, template_cache=True)
+
+        with mock.patch.multiple(Ebuild, _template_envs={}, _templates={}):
+            template = Ebuild.get_template(options)
+            self.assertIs(template, Ebuild.get_template())
+        self.assertIsNot(template, Ebuild.get_template())
+        self.assertTrue(os.listdir(os.path.join(cache_dir, 'templates')))
+
     def test_render_mirror_url(self):
         self.ebuild['src_uri'] = 'http://pypi.python.org/packages/source/F/Flask/Flask-0.8.tar.gz'
         self.assertTrue('mirror://pypi/F/Flask/Flask-0.8.tar.gz' in self.ebuild.render())
@@ -187,6 +210,88 @@ class TestEbuild(BaseTestCase):
         self.ebuild.discover_tests()
         self.assertEqual('setup.py', self.ebuild['tests_method'])
 
+    def test_update_with_s_workdir(self):
+        os.mkdir(os.path.join(self.s, 'foobar-1.0'))
+        self.ebuild.unpacked_dir = None
+        self.ebuild.workdir = self.s
+
+        self.ebuild.update_with_s()
+        self.assertEqual(os.path.join(self.s, 'foobar-1.0'), self.ebuild.unpacked_dir)
+
+    def test_inspect_fallback(self):
+        """All files are extracted if setup.py needs more than setup files"""
+        self.addCleanup(setattr, sys, 'path', list(sys.path))
+        inspected, unpacked = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, inspected)
+        self.addCleanup(shutil.rmtree, unpacked)
+        for workdir in [inspected, unpacked]:
+            os.mkdir(os.path.join(workdir, 'foobar-1.0'))
+            open(os.path.join(workdir, 'foobar-1.0', 'setup.py'), 'w').write(
+                "import foobar_version\n"
+                "from setuptools import setup\n"
+                "setup(name='foobar', install_requires=['bar'])\n")
+        open(os.path.join(unpacked, 'foobar-1.0', 'foobar_version.py'), 'w').write('')
+
+        unpacker = mock.Mock()
+        unpacker.inspect.return_value = inspected
+        unpacker.unpack.return_value = unpacked
+        self.ebuild.unpacked_dir = None
+        self.ebuild.inspect(unpacker)
+
+        self.assertEqual(os.path.join(unpacked, 'foobar-1.0'), self.ebuild.unpacked_dir)
+        self.assertEqual(['bar'], self.ebuild.setup_keywords['install_requires'])
+
+    def test_inspect_find_packages(self):
+        """Packages found by find_packages() set PYTHON_MODNAME"""
+        self.addCleanup(setattr, sys, 'path', list(sys.path))
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, 'foobar-1.0.tar.gz')
+        tar = tarfile.open(path, 'w:gz')
+        for name, content in [
+                ('foobar-1.0/setup.py', "from setuptools import setup, find_packages\n"
+                    "setup(name='foobar', packages=find_packages())\n"),
+                ('foobar-1.0/foobar_core/__init__.py', ''),
+                ('foobar-1.0/foobar_core/core.py', 'x = 1\n')]:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, StringIO(content))
+        tar.close()
+
+        unpacker = NativeUnpacker(tmpdir=tmp)
+        self.addCleanup(unpacker.cleanup)
+        self.ebuild.options.configs['ini']['uri'] = 'file://' + path
+        self.ebuild.unpacked_dir = None
+        with mock.patch.object(unpacker, 'unpack', wraps=unpacker.unpack) as unpack:
+            self.ebuild.inspect(unpacker)
+        self.assertEqual(['foobar_core'], self.ebuild.setup_keywords['packages'])
+        self.assertEqual(['foobar_core'], self.ebuild['python_modname'])
+        # inspected only, not extracted in full
+        self.assertEqual(1, unpack.call_count)
+        self.assertFalse(os.path.exists(os.path.join(self.ebuild.unpacked_dir, 'foobar_core', 'core.py')))
+
+    def test_inspect_no_packages(self):
+        """All files are extracted if setup.py finds nothing to install"""
+        self.addCleanup(setattr, sys, 'path', list(sys.path))
+        inspected, unpacked = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, inspected)
+        self.addCleanup(shutil.rmtree, unpacked)
+        for workdir in [inspected, unpacked]:
+            os.mkdir(os.path.join(workdir, 'foobar-1.0'))
+            open(os.path.join(workdir, 'foobar-1.0', 'setup.py'), 'w').write(
+                "import os\nfrom setuptools import setup\n"
+                "setup(name='foobar', py_modules=[m[:-3] for m in os.listdir('.') if m.startswith('foobar_')])\n")
+        open(os.path.join(unpacked, 'foobar-1.0', 'foobar_mod.py'), 'w').write('')
+
+        unpacker = mock.Mock()
+        unpacker.inspect.return_value = inspected
+        unpacker.unpack.return_value = unpacked
+        self.ebuild.unpacked_dir = None
+        self.ebuild.inspect(unpacker)
+
+        self.assertEqual(os.path.join(unpacked, 'foobar-1.0'), self.ebuild.unpacked_dir)
+        self.assertEqual(['foobar_mod'], self.ebuild.setup_keywords['py_modules'])
+
     ## post_unpack tests
 
     def test_post_unpack_no_setup_file(self):
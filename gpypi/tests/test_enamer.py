@@ -13,9 +13,11 @@ Test ``get_vars`` with all types of URI's we can come up with.
 """
 
 import unittest2
+import mock
 
 from gpypi.enamer import *
 from gpypi.tests import *
+from gpypi.utils import memoize
 
 
 class TestEnamer(BaseTestCase):
@@ -68,6 +70,7 @@ class TestEnamer(BaseTestCase):
         self.assertEqual(Enamer.convert_license(["License :: Public Domain"]), "public-domain")
         self.assertEqual(Enamer.convert_license([]), "")
         self.assertEqual(Enamer.convert_license([], 'GPL alike'), 'GPL-2')
+        self.assertEqual(Enamer.convert_license([], 'LGPL v3'), 'LGPL-2.1')
 
     def test_is_valid_license(self):
         """Check if license string matches a valid one in ${PORTDIR}/licenses"""
@@ -1005,6 +1008,52 @@ class TestEnamer(BaseTestCase):
         results = Enamer.get_vars(uri, up_pn, up_pv)
         self.assertEqual(correct, results)
 
+class TestEnamerMany(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        memoize.enabled = False
+        self.addCleanup(setattr, memoize, 'enabled', True)
+
+    def test_parse_pv_many(self):
+        versions = ['1.0b2', '1.0', '2.0rc1', '1.0b2'] * 3
+        with mock.patch.object(Enamer, 'parse_pv', wraps=Enamer.parse_pv) as parse_pv:
+            results = list(Enamer.parse_pv_many(iter(versions), batch_size=5))
+        self.assertEqual([(v, Enamer.parse_pv(v)) for v in versions], results)
+        # 3 distinct in first and second batch, 2 in last
+        self.assertEqual(8, parse_pv.call_count)
+
+        # results are immutable, duplicates may share them
+        self.assertEqual(('${PV/_beta/b}',), results[3][1][1])
+
+    def test_get_vars_many(self):
+        args = [
+            ('http://www.foo.com/pkgfoo-1.0.tbz2', 'pkgfoo', '1.0'),
+            ('http://www.foo.com/pkgfoo-1.0.tbz2', 'pkgfoo', '1.0'),
+            ('http://www.foo.com/pkg.foo-1.0b1.tbz2', 'pkg.foo', '1.0b1'),
+            ['http://www.foo.com/pkgfoo-1.0.tbz2', 'pkgfoo', '1.0', 'bar'],
+        ]
+        with mock.patch.object(Enamer, '_get_vars', wraps=Enamer._get_vars) as get_vars:
+            with mock.patch.object(PortageUtils, 'is_valid_atom',
+                                   wraps=PortageUtils.is_valid_atom) as is_valid_atom:
+                results = list(Enamer.get_vars_many(args))
+        self.assertEqual(3, get_vars.call_count)
+        # =dev-python/pkgfoo-1.0 is checked once for upstream and converted names
+        self.assertEqual(['=dev-python/pkgfoo-1.0', '=dev-python/pkg.foo-1.0b1',
+                          '=dev-python/pkg-foo-1.0_beta1', '=dev-python/bar-1.0'],
+                         [c[0][0] for c in is_valid_atom.call_args_list])
+        self.assertEqual([tuple(a) for a in args], [a for a, d in results])
+        self.assertEqual(Enamer.get_vars(*args[2]), results[2][1])
+        self.assertEqual('bar-1.0', results[3][1]['p'])
+
+    def test_get_vars_many_invalid(self):
+        args = [('http://www.foo.com/pkgfoo-1.0.tbz2', 'pkgfoo', '1.0')] * 2
+        with mock.patch.object(Enamer, '_get_vars', side_effect=GPyPiInvalidAtom('foo')):
+            results = list(Enamer.get_vars_many(args))
+        self.assertTrue(isinstance(results[0][1], GPyPiInvalidAtom))
+        self.assertEqual(2, len(results))
+
+
 # TODO: URLs don't actually match MY_P (case sensitivity, special chars..., SRC_URI class should handle this)
 
 class TestSrcUriNamer(BaseTestCase):
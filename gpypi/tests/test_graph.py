@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from gpypi.graph import *
+from gpypi.tests import *
+
+
+class TestDependencyGraph(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.graph = DependencyGraph()
+        self.graph.add('foobar', '1.0')
+
+    def test_add(self):
+        self.assertTrue(self.graph.add('sphinx', parent='foobar'))
+        self.assertFalse(self.graph.add('Sphinx', parent='foobar'))
+        self.assertIn('SPHINX', self.graph)
+        self.assertEqual(['foobar', 'sphinx'], list(self.graph.queue))
+        self.assertEqual(['sphinx'], self.graph.edges['foobar'])
+
+    def test_pop(self):
+        self.assertEqual(('foobar', '1.0'), self.graph.pop())
+        self.assertRaises(IndexError, self.graph.pop)
+
+    def test_processed(self):
+        self.graph.pop()
+        self.graph.mark_processed('FooBar')
+        self.assertEqual(set(['foobar']), self.graph.processed)
+        self.assertFalse(self.graph.add('foobar', parent=None))
+        self.assertEqual(0, len(self.graph.queue))
+
+    def test_cycle(self):
+        self.graph.add('a', parent='foobar')
+        self.graph.add('b', parent='a')
+        self.graph.add_edge('b', 'foobar')
+        self.graph.add_edge('b', 'b')
+        self.assertEqual([('b', None), ('a', None), ('foobar', '1.0')],
+            self.graph.topological_order())
+        self.assertEqual([('b', 'foobar'), ('b', 'b')], self.graph.cycles)
+        # cycles are found again on each call
+        self.graph.topological_order()
+        self.assertEqual(2, len(self.graph.cycles))
+
+    def test_topological_order_diamond(self):
+        self.graph.add('a', parent='foobar')
+        self.graph.add('b', parent='foobar')
+        self.graph.add('c', parent='a')
+        self.graph.add('c', parent='b')
+        self.assertEqual([('c', None), ('a', None), ('b', None), ('foobar', '1.0')],
+            self.graph.topological_order())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import mock
+
+from gpypi.pms import *
+from gpypi.portage_utils import PortageUtils
+from gpypi.tests import *
+
+
+class TestPMS(BaseTestCase):
+    """"""
+
+    def test_is_valid_version(self):
+        for pv in ['1', '1.0', '1.0a', '1.0_alpha', '1.0_p', '1.0_pre2_p3',
+                   '2.3_rc1-r5', '20100101', '1.0-r0']:
+            self.assertTrue(is_valid_version(pv), pv)
+        for pv in ['', '1.', '.1', '1.0ab', '1.0_dev', '1.0-r', '1.0-1',
+                   '1.0b3', 'cvs.1.0', '1.0_Beta', 'v1.0']:
+            self.assertFalse(is_valid_version(pv), pv)
+
+    def test_is_valid_pn(self):
+        for pn in ['foobar', 'foo-bar', 'foo_bar', 'gtk+', 'foo-1a2', 'py3k', '_foo']:
+            self.assertTrue(is_valid_pn(pn), pn)
+        for pn in ['-foo', '+foo', 'foo.bar', 'foo-1', 'foo-1.0-r1', 'foo-2b', u'fo\xf6']:
+            self.assertFalse(is_valid_pn(pn), pn)
+
+    def test_pkgsplit(self):
+        self.assertEqual(('foo', '1.0', 'r0'), pkgsplit('foo-1.0'))
+        self.assertEqual(('foo-bar', '1.0_rc1', 'r3'), pkgsplit('foo-bar-1.0_rc1-r3'))
+        self.assertEqual(('foo-bar2', '2', 'r0'), pkgsplit('foo-bar2-2'))
+        self.assertEqual(None, pkgsplit('foo'))
+        self.assertEqual(None, pkgsplit('foo-1.0-2.0'))
+        self.assertEqual(None, pkgsplit('foo-1.0b3'))
+
+    def test_is_valid_atom(self):
+        for atom in ['dev-python/foo', '=dev-python/foo-1.0', '>=dev-python/foo-1.0-r1',
+                     '<dev-python/foo-bar-1', '~dev-python/foo-1.0', '=dev-python/foo-1*',
+                     'dev-python/foo[doc]', '>=dev-python/foo-1.0[doc,-test,ssl?,!x=]',
+                     'dev-python/foo:2', 'dev-python/foo:2/2.1=', 'dev-python/foo:=',
+                     'virtual/python-foo', 'dev-python/foo-1a2']:
+            self.assertTrue(is_valid_atom(atom), atom)
+        for atom in ['foo', '=foo-1.0', 'dev-python/foo-1.0', '=dev-python/foo',
+                     '>dev-python/foo-1.0*', '=dev-python/foo-1.0b1', '!dev-python/foo',
+                     'dev-python/foo[do.c]', 'dev-python/foo[]', '==dev-python/foo-1',
+                     '=dev-python/foo-1.0-2.0', '.dev/foo']:
+            self.assertFalse(is_valid_atom(atom), atom)
+
+    def test_is_valid_atom_blockers(self):
+        self.assertTrue(is_valid_atom('!dev-python/foo', allow_blockers=True))
+        self.assertTrue(is_valid_atom('!!<dev-python/foo-1', allow_blockers=True))
+        self.assertFalse(is_valid_atom('!!!dev-python/foo', allow_blockers=True))
+
+
+class TestCheckAtoms(BaseTestCase):
+    """"""
+
+    def tearDown(self):
+        PortageUtils.check_atoms = False
+
+    @mock.patch.object(PortageUtils, 'portage_isvalidatom')
+    def test_disabled(self, portage_isvalidatom):
+        self.assertTrue(PortageUtils.is_valid_atom('=dev-python/foo-1.0'))
+        self.assertFalse(portage_isvalidatom.called)
+
+    @mock.patch('gpypi.portage_utils.log')
+    @mock.patch.object(PortageUtils, 'portage_isvalidatom')
+    def test_disagreement(self, portage_isvalidatom, log):
+        PortageUtils.check_atoms = True
+        portage_isvalidatom.return_value = True
+        self.assertTrue(PortageUtils.is_valid_atom('=dev-python/foo-1.0'))
+        self.assertFalse(log.warn.called)
+
+        self.assertFalse(PortageUtils.is_valid_atom(u'=dev-python/fo\xf6-1.0'))
+        self.assertTrue(log.warn.called)
@@ -2,13 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
 import tempfile
 import shutil
+import subprocess
 
+from gpypi import portage_utils
 from gpypi.portage_utils import *
 from gpypi.tests import *
 from gpypi.exc import *
 
+import mock
 import mocker
 
 
@@ -29,9 +33,71 @@ class TestPortageUtils(BaseTestCase):
         d = PortageUtils.get_all_overlays()
         # TODO: mock overlays locations
 
+    def make_overlay(self, name):
+        path = os.path.join(self.overlay, name)
+        os.makedirs(os.path.join(path, 'profiles'))
+        open(os.path.join(path, 'profiles', 'repo_name'), 'w').write(name + '\n')
+        return path
+
+    def test_overlay_map(self):
+        """"""
+        foo, bar = self.make_overlay('foo'), self.make_overlay('bar')
+        repos_conf = os.path.join(self.overlay, 'repos.conf')
+        os.mkdir(repos_conf)
+        open(os.path.join(repos_conf, 'gentoo.conf'), 'w').write(
+            "[DEFAULT]\nmain-repo = gentoo\n\n[gentoo]\nlocation = /usr/portage\n")
+
+        overlay_map = OverlayMap([foo, bar], [os.path.join(self.overlay, 'missing.conf'), repos_conf])
+        self.assertEqual({'foo': foo, 'bar': bar, 'gentoo': '/usr/portage'}, overlay_map.overlays)
+        self.assertEqual('gentoo', overlay_map.main_repo)
+
+        with mock.patch.object(overlay_map, 'read') as read:
+            overlay_map.refresh()
+            self.assertFalse(read.called)
+
+        repo_name = os.path.join(bar, 'profiles', 'repo_name')
+        open(repo_name, 'w').write('baz\n')
+        os.utime(repo_name, (0, 0))
+        open(os.path.join(repos_conf, 'local.conf'), 'w').write("[local]\nlocation = /usr/local/portage\n")
+        overlay_map.refresh()
+        self.assertEqual({'foo': foo, 'baz': bar, 'gentoo': '/usr/portage',
+            'local': '/usr/local/portage'}, overlay_map.overlays)
+
+    def test_get_overlay_map(self):
+        """"""
+        foo = self.make_overlay('foo')
+        env = {'PORTDIR': foo, 'PORTDIR_OVERLAY': '', 'PORTAGE_CONFIGROOT': self.overlay}
+        with mock.patch.object(portage_utils, 'ENV', env):
+            with mock.patch.object(PortageUtils, '_overlay_map', None):
+                overlay_map = PortageUtils.get_overlay_map()
+                self.assertEqual({'foo': foo}, PortageUtils.get_all_overlays())
+                self.assertIs(overlay_map, PortageUtils.get_overlay_map())
+
+                env['PORTDIR_OVERLAY'] = self.make_overlay('bar')
+                self.assertEqual(foo, PortageUtils.get_overlay_path('foo'))
+                self.assertEqual(env['PORTDIR_OVERLAY'], PortageUtils.get_overlay_path('bar'))
+
     def test_installed_ver(self):
         """"""
-        pass
+        vdb = os.path.join(self.overlay, VDB_PATH)
+        for p in ['dev-python/foobar-1.0', 'dev-python/foo-2.0-r1', 'dev-python/-MERGING-foo-2.1',
+                  'app-misc/foo-3', 'dev-python/.lock']:
+            os.makedirs(os.path.join(vdb, p))
+        os.utime(vdb, (0, 0))
+
+        with mock.patch.object(portage_utils, 'ENV', {'ROOT': self.overlay}):
+            with mock.patch.object(PortageUtils, '_installed_packages', None):
+                self.assertEqual('1.0', PortageUtils.get_installed_ver('dev-python/foobar'))
+                self.assertEqual('2.0-r1', PortageUtils.get_installed_ver('dev-python/foo[doc]'))
+                self.assertEqual(None, PortageUtils.get_installed_ver('dev-python/bar'))
+                installed = PortageUtils.get_installed_packages()
+
+        # portage bumps mtime of vdb on merge
+        os.mkdir(os.path.join(vdb, 'dev-python', 'bar-1.1'))
+        os.utime(vdb, None)
+        self.assertEqual(None, installed.get('dev-python/bar'))
+        installed.checked -= installed.CHECK_INTERVAL
+        self.assertEqual(['1.1'], installed.get('dev-python/bar'))
 
     def test_is_valid_atom(self):
         """"""
@@ -42,6 +108,78 @@ class TestPortageUtils(BaseTestCase):
         self.assertTrue(PortageUtils.ebuild_exists('sys-devel/gcc'))
         self.assertFalse(PortageUtils.ebuild_exists('sys-devel/foobar'))
 
+    def test_ebuild_index(self):
+        """"""
+        for path in ['dev-python/foobar/foobar-1.0.ebuild',
+                     'dev-python/foobar/foobar-1.1-r2.ebuild',
+                     'dev-python/foobar/metadata.xml',
+                     'profiles/repo_name',
+                     'metadata/layout.conf']:
+            path = os.path.join(self.overlay, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+        index = EbuildIndex([self.overlay, os.path.join(self.overlay, 'missing')])
+        self.assertEqual(set(['dev-python/foobar']), index.packages)
+        self.assertTrue('dev-python/foobar-1.0' in index)
+        self.assertTrue('=dev-python/foobar-1.1' in index)
+        self.assertTrue('dev-python/foobar-1.1-r2' in index)
+        self.assertFalse('dev-python/foobar-2.0' in index)
+        self.assertFalse('dev-python/foo' in index)
+
+        index.add(os.path.join(self.overlay, 'dev-python', 'foo', 'foo-2.0.ebuild'))
+        self.assertTrue('dev-python/foo' in index)
+        self.assertTrue('dev-python/foo-2.0' in index)
+
+    def test_index_ebuild(self):
+        """"""
+        index = EbuildIndex([])
+        with mock.patch.object(PortageUtils, '_ebuild_index', index):
+            PortageUtils.index_ebuild('/overlay/dev-python/foo/foo-2.0.ebuild')
+            self.assertTrue(PortageUtils.ebuild_exists('dev-python/foo-2.0'))
+
+    def test_license_index(self):
+        """"""
+        licenses = os.path.join(self.overlay, 'licenses')
+        os.mkdir(licenses)
+        open(os.path.join(licenses, 'GPL-2'), 'w').close()
+        index = LicenseIndex(licenses)
+        self.assertEqual(frozenset(['GPL-2']), index.licenses)
+        self.assertFalse('' in index)
+
+        open(os.path.join(licenses, 'MIT'), 'w').close()
+        os.utime(licenses, (0, 0))
+        self.assertFalse('MIT' in index)
+        index.checked -= index.CHECK_INTERVAL
+        self.assertTrue('MIT' in index)
+
+        shutil.rmtree(licenses)
+        index.refresh(force=True)
+        self.assertEqual(frozenset(), index.licenses)
+
+        index = LicenseIndex(licenses)
+        self.assertEqual(frozenset(), index.licenses)
+
+    def test_lazy_environment(self):
+        """"""
+        config = mock.Mock()
+        config.environ.return_value = {'PORTDIR_OVERLAY': '/a'}
+        with mock.patch.object(PortageUtils, 'get_config', return_value=config):
+            env = LazyEnvironment()
+            self.assertFalse(config.environ.called)
+
+            env['PORTDIR_OVERLAY'] += ' /b'
+            self.assertEqual('/a /b', env['PORTDIR_OVERLAY'])
+            self.assertEqual(None, env.get('ARCH'))
+            self.assertEqual(1, config.environ.call_count)
+
+    def test_import_without_portage(self):
+        """Importing enamer does not load portage"""
+        code = "import sys, gpypi.enamer; print [m for m in sys.modules if m.startswith('portage')]"
+        output = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE).communicate()[0]
+        self.assertEqual('[]', output.strip())
+
     def test_unpack_ebuild(self):
         """"""
         pass
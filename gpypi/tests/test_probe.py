@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import shutil
+import tempfile
+import threading
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+import mock
+
+from gpypi.cache import DiskCache
+from gpypi.enamer import Enamer, SrcUriNamer
+from gpypi.probe import *
+from gpypi.tests import *
+
+
+class MirrorServer(ThreadingMixIn, HTTPServer):
+    """Answers HEAD requests with 200 for ``files``, 404 otherwise"""
+    daemon_threads = True
+
+    def __init__(self, files):
+        self.files = files
+        self.requests = []
+        self.connections = 0
+        self.keep_alive = True
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                server.connections += 1
+                BaseHTTPRequestHandler.setup(self)
+
+            def do_HEAD(self):
+                server.requests.append(self.path)
+                self.send_response(200 if self.path in server.files else 404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                if not server.keep_alive:
+                    # close without telling the client
+                    self.close_connection = 1
+
+            def log_message(self, *args):
+                pass
+
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class TestUriProber(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.server = MirrorServer(['/f/foobar/foobar-1.0.tar.gz'])
+        self.addCleanup(self.server.stop)
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.prober = UriProber(DiskCache(self.path), jobs=1)
+        self.addCleanup(self.prober.connections.close)
+
+    def test_probe(self):
+        self.assertTrue(self.prober.probe(self.server.url + '/f/foobar/foobar-1.0.tar.gz'))
+        self.assertFalse(self.prober.probe(self.server.url + '/f/foobar/foobar-1.0.zip'))
+        self.assertEqual(1, self.server.connections)
+
+    def test_probe_cached(self):
+        for i in range(2):
+            self.assertTrue(self.prober.probe(self.server.url + '/f/foobar/foobar-1.0.tar.gz'))
+            self.assertFalse(self.prober.probe(self.server.url + '/f/foobar/foobar-1.0.zip'))
+        self.assertEqual(2, len(self.server.requests))
+
+        self.prober.ttl = -1
+        self.prober.probe(self.server.url + '/f/foobar/foobar-1.0.zip')
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_probe_closed_connection(self):
+        """Kept-alive connection closed by server is replaced"""
+        self.server.keep_alive = False
+        self.server.files.append('/f/foobar/foobar-1.0.zip')
+        self.assertTrue(self.prober.probe(self.server.url + '/f/foobar/foobar-1.0.tar.gz'))
+        self.assertTrue(self.prober.probe(self.server.url + '/f/foobar/foobar-1.0.zip'))
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual(2, self.server.connections)
+
+    def test_probe_error_not_cached(self):
+        self.server.stop()
+        uri = self.server.url + '/f/foobar/foobar-1.0.tar.gz'
+        self.assertFalse(self.prober.probe(uri))
+        self.assertRaises(KeyError, self.prober.cache.get, 'head', uri)
+
+    def test_probe_mirror(self):
+        with mock.patch.dict(UriProber.MIRRORS, {'pypi': self.server.url + '/'}):
+            self.assertTrue(self.prober.probe('mirror://pypi/f/foobar/foobar-1.0.tar.gz'))
+        self.assertFalse(self.prober.probe('mirror://unknown/foobar-1.0.tar.gz'))
+        self.assertFalse(self.prober.probe('ftp://localhost/foobar-1.0.tar.gz'))
+
+    def test_probe_many(self):
+        self.prober.jobs = 4
+        uris = [self.server.url + '/f/foobar/foobar-1.0' + ext for ext in Enamer.VALID_EXTENSIONS]
+        result = self.prober.probe_many(uris + uris)
+        self.assertEqual(dict((uri, uri.endswith('.tar.gz')) for uri in uris), result)
+        self.assertEqual(5, len(self.server.requests))
+        self.assertTrue(self.server.connections <= 4)
+
+
+class TestSrcUriNamer(BaseTestCase):
+    """"""
+
+    def test_call(self):
+        prober = mock.Mock()
+        prober.probe_many.side_effect = lambda uris: dict((uri,
+            uri == 'mirror://pypi/f/foobar/foobar-1.0.tar.gz') for uri in uris)
+
+        namer = SrcUriNamer('http://a/foobar-1.0.tar.gz', Enamer, 'foobar', '', '1.0', '', '', '', prober)
+        self.assertEqual((['mirror://pypi/${PN:0:1}/${PN}/${P}.tar.gz'],
+            ['http://pypi.python.org/pypi/foobar/']), namer())
+        self.assertEqual(1, prober.probe_many.call_count)
+        self.assertEqual(10, len(prober.probe_many.call_args[0][0]))
+
+    def test_shared_prober(self):
+        """Second run is answered from cache of the shared prober"""
+        server = MirrorServer(['/f/foobar/foobar-1.0.tar.gz'])
+        self.addCleanup(server.stop)
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        options = mock.Mock(cache_dir=path, probe_jobs=2, probe_cache_ttl=60)
+        self.addCleanup(setattr, UriProber, '_shared', None)
+        UriProber._shared = None
+
+        with mock.patch.dict(UriProber.MIRRORS, {'pypi': server.url + '/',
+                'sourceforge': server.url + '/'}):
+            for i in range(2):
+                namer = SrcUriNamer('http://a/foobar-1.0.tar.gz', Enamer, 'foobar', '', '1.0', '', '', '',
+                    options=options)
+                self.assertEqual(['mirror://pypi/${PN:0:1}/${PN}/${P}.tar.gz'], namer()[0])
+                if not i:
+                    requests = len(server.requests)
+        self.assertTrue(requests)
+        self.assertTrue(namer.prober is UriProber.get(options))
+        self.assertEqual(2, namer.prober.jobs)
+        self.assertEqual(requests, len(server.requests))
+
+    def test_default_prober(self):
+        namer = SrcUriNamer('http://a/foobar-1.0.tar.gz', Enamer, 'foobar', '', '1.0', '', '', '')
+        self.assertEqual(None, namer.prober.cache)
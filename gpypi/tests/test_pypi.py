@@ -4,13 +4,21 @@
 Tests against live PyPi.
 """
 import os
+import socket
+import tempfile
+import shutil
 import unittest2
+from functools import partial
 
+import mock
 from yolk.pypi import CheeseShop
 
 from gpypi.enamer import *
 from gpypi.cli import *
+from gpypi.cache import DiskCache
+from gpypi.pypi import *
 from gpypi.tests import *
+from gpypi.exc import *
 
 @unittest2.skipIf(not os.environ.get('TEST_LIVE_PYPI', None),
     "set TEST_LIVE_PYPI env variable to test against PyPi")
@@ -48,3 +56,153 @@ class TestPyPi(BaseTestCase):
                 #pass
             # TODO: maybe assert some of dictionary stuff?
         self.fail('Fail!')
+
+
+class TestCachedCheeseShop(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.client = mock.Mock()
+        self.client.release_data.return_value = {'name': 'foobar'}
+        self.pypi = CachedCheeseShop(DiskCache(self.path), factory=lambda: self.client)
+
+    def test_cached(self):
+        self.assertEqual({'name': 'foobar'}, self.pypi.release_data('foobar', '1.0'))
+        self.assertEqual({'name': 'foobar'}, self.pypi.release_data('foobar', '1.0'))
+        self.assertEqual(1, self.client.release_data.call_count)
+
+    def test_not_cached_method(self):
+        self.pypi.search({'name': 'foobar'}, 'or')
+        self.client.search.assert_called_with({'name': 'foobar'}, 'or')
+
+    def test_refresh(self):
+        self.pypi.release_data('foobar', '1.0')
+        self.pypi.refresh = True
+        self.pypi.release_data('foobar', '1.0')
+        self.assertEqual(2, self.client.release_data.call_count)
+
+    def test_offline(self):
+        self.pypi.release_data('foobar', '1.0')
+        self.pypi.offline = True
+        self.assertEqual({'name': 'foobar'}, self.pypi.release_data('foobar', '1.0'))
+        self.assertRaises(GPyPiCacheMiss, self.pypi.release_data, 'foobar', '2.0')
+
+    def test_offline_skip_missing(self):
+        self.pypi.release_data('foobar', '1.0')
+        self.pypi.offline = True
+        calls = [('release_data', ('foobar', '1.0')), ('release_data', ('foobar', '2.0'))]
+        self.assertRaises(GPyPiCacheMiss, self.pypi.call_many, calls)
+        self.assertEqual([{'name': 'foobar'}, None], self.pypi.call_many(calls, skip_missing=True))
+
+    def test_expired(self):
+        self.pypi.release_data('foobar', '1.0')
+        self.pypi.TTL = {'release_data': -1}
+        self.client.release_data.return_value = {'name': 'FooBar'}
+        self.assertEqual({'name': 'FooBar'}, self.pypi.release_data('foobar', '1.0'))
+
+    def test_expired_network_error(self):
+        self.pypi.release_data('foobar', '1.0')
+        self.pypi.TTL = {'release_data': -1}
+        self.client.release_data.side_effect = socket.error
+        self.assertEqual({'name': 'foobar'}, self.pypi.release_data('foobar', '1.0'))
+
+    def test_no_cache(self):
+        self.pypi.cache = None
+        self.pypi.release_data('foobar', '1.0')
+        self.pypi.release_data('foobar', '1.0')
+        self.assertEqual(2, self.client.release_data.call_count)
+
+    def test_call_many(self):
+        self.pypi.release_data('foobar', '1.0')
+        self.client.xmlrpc.system.multicall.return_value = [
+            [[{'packagetype': 'sdist', 'url': 'http://foo/foobar-1.0.tar.gz'}]],
+            {'faultCode': 1, 'faultString': 'No such release'},
+        ]
+
+        results = self.pypi.call_many([
+            ('release_data', ('foobar', '1.0')),
+            ('release_urls', ('foobar', '1.0')),
+            ('release_data', ('foobar', '2.0')),
+        ])
+
+        self.assertEqual([{'name': 'foobar'}, [{'packagetype': 'sdist', 'url': 'http://foo/foobar-1.0.tar.gz'}], None],
+            results)
+        self.assertEqual(1, self.client.xmlrpc.system.multicall.call_count)
+        # cached now
+        self.pypi.call_many([('release_urls', ('foobar', '1.0'))])
+        self.assertEqual(1, self.client.xmlrpc.system.multicall.call_count)
+
+    def test_snapshot(self):
+        self.client.query_versions_pypi.return_value = ('FooBar', ['1.0', '1.10', '1.9'])
+        self.client.xmlrpc.system.multicall.return_value = [
+            [{'name': 'FooBar', 'download_url': 'UNKNOWN'}],
+            [[{'packagetype': 'sdist', 'url': 'http://foo/FooBar-1.10.tar.gz'},
+              {'packagetype': 'bdist_egg', 'url': 'http://foo/FooBar-1.10.egg'}]],
+        ]
+
+        snapshot = self.pypi.snapshot('foobar')
+
+        self.assertEqual('FooBar', snapshot.name)
+        self.assertEqual(['1.0', '1.9', '1.10'], snapshot.versions)
+        self.assertEqual('1.10', snapshot.version)
+        self.assertEqual(['http://foo/FooBar-1.10.tar.gz'], snapshot.urls)
+        self.assertEqual({'name': 'FooBar', 'download_url': 'UNKNOWN'}, snapshot.release_data)
+
+    def test_snapshot_no_version(self):
+        self.client.query_versions_pypi.return_value = ('FooBar', ['1.0'])
+        snapshot = self.pypi.snapshot('foobar', '2.0')
+        self.assertEqual(['1.0'], snapshot.versions)
+        self.assertIsNone(snapshot.version)
+
+
+class TestMultiCallBatcher(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.server = LocalPyPI({
+            'foo': {'1.0': [], '1.1': []},
+            'bar': {'0.1': []},
+            'baz': {},
+        })
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.pypi = CachedCheeseShop(factory=lambda: LocalCheeseShop(self.server.url))
+
+    def test_batches(self):
+        results = []
+        batcher = MultiCallBatcher(self.pypi, 2)
+        for name in ['foo', 'bar', 'baz']:
+            batcher.add('package_releases', (name,), results.append)
+        self.assertEqual(1, self.server.requests)
+        self.assertEqual(1, len(batcher.pending))
+
+        batcher.flush()
+        self.assertEqual(2, self.server.requests)
+        self.assertEqual([['1.0', '1.1'], ['0.1'], []], results)
+
+    def test_callback_adds_calls(self):
+        results = []
+
+        def add_urls(name, versions):
+            for version in versions:
+                batcher.add('release_urls', (name, version),
+                    lambda urls, v=version: results.append((name, v)))
+
+        batcher = MultiCallBatcher(self.pypi, 100)
+        for name in ['foo', 'bar']:
+            batcher.add('package_releases', (name,), partial(add_urls, name))
+        batcher.flush()
+
+        self.assertEqual([('foo', '1.0'), ('foo', '1.1'), ('bar', '0.1')], results)
+        self.assertEqual(2, self.server.requests)
+        self.assertEqual([], batcher.pending)
+
+    def test_fault(self):
+        results = []
+        batcher = MultiCallBatcher(self.pypi)
+        batcher.add('release_urls', ('foo', '2.0'), results.append)
+        batcher.add('release_urls', ('foo', '1.0'), results.append)
+        batcher.flush()
+        self.assertEqual([None, []], results)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import signal
+import shutil
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+from gpypi.sandbox import *
+from gpypi.exc import *
+from gpypi.tests import *
+
+
+class TestSetupPyPool(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.s = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.s)
+        self.pool = SetupPyPool(timeout=5, memory_limit=1024 * 1024 * 1024)
+        self.addCleanup(self.pool.close)
+
+    def write_setup(self, contents):
+        with open(os.path.join(self.s, 'setup.py'), 'w') as f:
+            f.write(contents)
+
+    def test_plain(self):
+        self.assertEqual({'a': [1, u'b', None], 'c': [["d", 2.0]]},
+            plain({'a': (1, u'b', None), 'c': set([("d", 2.0)])}))
+        self.assertEqual(['<Foo>'], plain([type('Foo', (object,), {'__repr__': lambda s: '<Foo>'})()]))
+
+    def test_run(self):
+        self.write_setup("from setuptools import setup\n"
+            "setup(name='foobar', install_requires=['bar>=1.0'], cmdclass={'test': object})\n")
+        keywords = self.pool.run(self.s)
+        self.assertEqual({'name': 'foobar', 'install_requires': ['bar>=1.0'],
+            'cmdclass': {'test': "<type 'object'>"}}, keywords)
+
+        # worker is reused
+        self.assertEqual(1, len(self.pool.idle))
+        self.assertEqual(keywords, self.pool.run(self.s))
+        self.assertEqual(1, len(self.pool.idle))
+
+    def test_distutils(self):
+        self.write_setup("import os\nfrom distutils.core import setup\n"
+            "setup(name='foobar', packages=[os.path.basename(os.getcwd())])\n")
+        self.assertEqual({'name': 'foobar', 'packages': [os.path.basename(self.s)]},
+            self.pool.run(self.s))
+
+    def test_package_modules(self):
+        """Modules imported by setup.py are not reused for other packages"""
+        for name in ('a', 'b'):
+            s = os.path.join(self.s, name)
+            os.mkdir(s)
+            with open(os.path.join(s, 'foo_reqs.py'), 'w') as f:
+                f.write("REQS = ['dep-%s']\n" % name)
+            with open(os.path.join(s, 'setup.py'), 'w') as f:
+                f.write("from setuptools import setup\nfrom foo_reqs import REQS\n"
+                    "setup(install_requires=REQS)\n")
+
+        self.assertEqual({'install_requires': ['dep-a']}, self.pool.run(os.path.join(self.s, 'a')))
+        self.assertEqual({'install_requires': ['dep-b']}, self.pool.run(os.path.join(self.s, 'b')))
+        self.assertEqual(1, len(self.pool.idle))
+
+    def test_missing(self):
+        self.assertRaises(GPyPiNoSetupFile, self.pool.run, self.s)
+        self.assertRaises(GPyPiNoDistribution, self.pool.run, os.path.join(self.s, 'missing'))
+
+    def test_error(self):
+        self.write_setup("import foobar_missing\n")
+        self.assertRaises(GPyPiSetupPyError, self.pool.run, self.s)
+        self.write_setup("import sys\nsys.exit(1)\n")
+        self.assertRaises(GPyPiSetupPyError, self.pool.run, self.s)
+
+    def test_timeout(self):
+        self.pool.timeout = 0.5
+        self.write_setup("import time\ntime.sleep(60)\n")
+        self.assertRaises(GPyPiSetupPyError, self.pool.run, self.s)
+        self.assertEqual([], self.pool.idle)
+
+        self.write_setup("from distutils.core import setup\nsetup(name='foobar')\n")
+        self.assertEqual({'name': 'foobar'}, self.pool.run(self.s))
+
+    def test_memory_limit(self):
+        self.write_setup("x = 'x' * (2 * 1024 ** 3)\n")
+        self.assertRaises(GPyPiSetupPyError, self.pool.run, self.s)
+
+    def test_memory_limit_allowance(self):
+        """Limit is added to address space of the worker"""
+        self.pool.memory_limit = 32 * 1024 * 1024
+        self.write_setup("from distutils.core import setup\nx = 'x' * (8 * 1024 ** 2)\n"
+            "setup(name='foobar')\n")
+        self.assertEqual({'name': 'foobar'}, self.pool.run(self.s))
+
+    def test_stdout(self):
+        self.write_setup("from distutils.core import setup\nprint 'running setup'\n"
+            "setup(name='foobar')\n")
+        self.assertEqual({'name': 'foobar'}, self.pool.run(self.s))
+        self.assertEqual({'name': 'foobar'}, self.pool.run(self.s))
+
+    def test_threads(self):
+        self.pool = SetupPyPool(processes=3, timeout=10)
+        self.addCleanup(self.pool.close)
+        self.write_setup("from distutils.core import setup\nsetup(name='foobar')\n")
+        threads = ThreadPool(3)
+        self.addCleanup(threads.terminate)
+        self.assertEqual([{'name': 'foobar'}] * 6, threads.map(self.pool.run, [self.s] * 6))
+        self.assertTrue(len(self.pool.idle) <= 3)
+
+    def test_worker_exit(self):
+        self.write_setup("import os\nos._exit(1)\n")
+        self.assertRaises(GPyPiSetupPyError, self.pool.run, self.s)
+        self.assertEqual([], self.pool.idle)
+
+    def test_worker_eof(self):
+        """Worker exits cleanly when gpypi exits without stopping it"""
+        process = self.pool.start_worker()
+        process.stdin.close()
+        self.assertEqual(0, process.wait())
+        process.stdout.close()
+
+    def test_dead_idle_worker(self):
+        self.write_setup("from distutils.core import setup\nsetup(name='foobar')\n")
+        self.pool.run(self.s)
+        process = self.pool.idle[0]
+        os.kill(process.pid, signal.SIGKILL)
+        process.wait()
+        self.assertEqual({'name': 'foobar'}, self.pool.run(self.s))
+        self.assertNotEqual(process.pid, self.pool.idle[0].pid)
+
+    def test_max_tasks(self):
+        self.pool.max_tasks = 2
+        self.write_setup("import os\nfrom distutils.core import setup\nsetup(name=str(os.getpid()))\n")
+        pids = [self.pool.run(self.s)['name'] for i in range(3)]
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+
+    def test_global_state(self):
+        """Environment and argv changed by setup.py are restored"""
+        self.write_setup("import os, sys\nfrom distutils.core import setup\n"
+            "os.environ['GPYPI_TEST'] = '1'\nsys.argv[:] = ['setup.py', 'install']\n"
+            "setup(name='foobar')\n")
+        self.pool.run(self.s)
+        self.write_setup("import os, sys\nfrom distutils.core import setup\n"
+            "setup(name=os.environ.get('GPYPI_TEST', ''), scripts=sys.argv[1:])\n")
+        self.assertEqual({'name': '', 'scripts': []}, self.pool.run(self.s))
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from gpypi.exc import *
+from gpypi.sync import Sync
+from gpypi.cache import DiskCache
+from gpypi.pypi import CachedCheeseShop
+from gpypi.tests import *
+
+
+class Options(object):
+    category = 'dev-python'
+    overlay = 'local'
+    multicall_size = 2
+    full_sync = False
+    processes = 1
+    shard = ''
+
+    def __init__(self):
+        self.configs = {'argparse': {}}
+
+
+class TestSync(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.server = LocalPyPI({
+            'foo': {
+                '1.0': [{'url': 'http://a/foo-1.0.tar.gz', 'packagetype': 'sdist', 'size': 100}],
+                '1.1': [{'url': 'http://a/foo-1.1.egg', 'packagetype': 'bdist_egg', 'size': 50}],
+            },
+            'bar': {'0.1': [{'url': 'http://a/bar-0.1.zip', 'packagetype': 'sdist', 'size': 10}]},
+            'Baz': {'2.0': [{'url': 'http://a/Baz-2.0.tar.gz', 'packagetype': 'sdist', 'size': 1}]},
+        }, [
+            ('foo', '1.0', 0, 'new release', 1),
+            ('bar', '0.1', 0, 'new release', 2),
+            ('Baz', '2.0', 0, 'new release', 3),
+            ('bar', '0.1', 0, 'add source file bar-0.1.zip', 4),
+        ])
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.overlay = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.overlay)
+
+        cache = DiskCache(os.path.join(self.overlay, 'cache', 'pypi'))
+        self.pypi = CachedCheeseShop(cache, factory=lambda: LocalCheeseShop(self.server.url))
+        self.sync = Sync(Options(), self.pypi)
+        patcher = mock.patch('gpypi.sync.PortageUtils.get_overlay_path')
+        patcher.start().return_value = self.overlay
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.Sync.create')
+    def test_run(self, create, ebuild_exists):
+        ebuild_exists.side_effect = lambda atom: atom == 'dev-python/bar-0.1'
+        self.sync.run()
+
+        self.assertEqual([
+            mock.call('Baz', '2.0', 'http://a/Baz-2.0.tar.gz'),
+            mock.call('foo', '1.0', 'http://a/foo-1.0.tar.gz'),
+        ], create.call_args_list)
+        # changelog_last_serial, list_packages, 3x package_releases, 3x release_urls
+        self.assertEqual(6, self.server.requests)
+        self.assertEqual(4, self.sync.read_serial())
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.Sync.sync_packages')
+    def test_run_incremental(self, sync_packages, ebuild_exists):
+        self.sync.write_serial(1)
+        self.sync.run()
+        sync_packages.assert_called_with(['bar', 'Baz'])
+        self.assertEqual(4, self.sync.read_serial())
+
+        self.sync.run()
+        sync_packages.assert_called_with([])
+        self.assertEqual(4, self.sync.read_serial())
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.Sync.create')
+    def test_run_incremental_refresh(self, create, ebuild_exists):
+        """Changed packages are not served from cache"""
+        ebuild_exists.return_value = False
+        self.server.packages['qux'] = {'1.0': []}
+        self.server.changelog.append(('qux', '1.0', 0, 'new release', 5))
+        self.sync.write_serial(4)
+        self.sync.run()
+        self.assertFalse(create.called)
+
+        self.server.packages['qux']['1.0'] = [{'url': 'http://a/qux-1.0.tar.gz', 'packagetype': 'sdist', 'size': 1}]
+        self.server.changelog.append(('qux', '1.0', 0, 'add source file qux-1.0.tar.gz', 6))
+        self.sync = Sync(Options(), self.pypi)
+        self.sync.run()
+        create.assert_called_once_with('qux', '1.0', 'http://a/qux-1.0.tar.gz')
+        self.assertEqual(6, self.sync.read_serial())
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    def test_run_incremental_stale_versions(self, ebuild_exists):
+        """Ebuilds of changed packages are not made from cached versions"""
+        ebuild_exists.return_value = False
+        self.assertEqual(['1.0', '1.1'], self.pypi.snapshot('foo').versions)
+        self.server.packages['foo']['1.2'] = [{'url': 'http://a/foo-1.2.tar.gz', 'packagetype': 'sdist', 'size': 1}]
+        self.server.changelog.append(('foo', '1.2', 0, 'new release', 5))
+        self.sync.write_serial(4)
+        # clients made from options would share the cache
+        config = self.sync.config
+        config.cache_dir, config.pypi_cache_size = os.path.join(self.overlay, 'cache'), 10
+        config.offline = config.refresh = False
+
+        snapshots = []
+        def create_ebuilds(gpypi):
+            snapshots.append(gpypi.pypi.snapshot(gpypi.package_name, gpypi.version))
+        with mock.patch('gpypi.cli.GPyPI.create_ebuilds', create_ebuilds):
+            self.sync.run()
+        self.assertEqual(['1.0', '1.2'], [snapshot.version for snapshot in snapshots])
+        self.assertEqual(['http://a/foo-1.2.tar.gz'], snapshots[-1].urls)
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.Sync.sync_packages')
+    def test_run_full(self, sync_packages, ebuild_exists):
+        self.sync.write_serial(3)
+        self.sync.config.full_sync = True
+        self.sync.run()
+        sync_packages.assert_called_with(['Baz', 'bar', 'foo'])
+        self.assertEqual(4, self.sync.read_serial())
+
+    def test_serial(self):
+        self.assertEqual(None, self.sync.read_serial())
+        self.sync.write_serial(42)
+        self.assertEqual(42, self.sync.read_serial())
+        self.assertTrue(os.path.exists(os.path.join(self.overlay, 'metadata', 'gpypi-serial')))
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.GPyPI')
+    def test_create(self, GPyPI, ebuild_exists):
+        ebuild_exists.return_value = False
+        self.sync.sync_packages(['bar'])
+
+        GPyPI.assert_called_with('bar', '0.1', self.sync.config, pypi=self.sync.pypi)
+        self.assertTrue(GPyPI.return_value.create_ebuilds.called)
+        self.assertEqual({'uri': 'http://a/bar-0.1.zip', 'up_pn': 'bar', 'up_pv': '0.1'},
+            self.sync.config.configs['argparse'])
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.GPyPI')
+    def test_create_error(self, GPyPI, ebuild_exists):
+        ebuild_exists.return_value = False
+        GPyPI.return_value.create_ebuilds.side_effect = ValueError
+        self.sync.sync_packages(['bar', 'Baz'])
+        self.assertEqual(2, GPyPI.call_count)
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.Sync.create')
+    def test_resume(self, create, ebuild_exists):
+        ebuild_exists.return_value = False
+        self.sync.record('foo', '1.0')
+        self.sync.close_journal()
+        with open(self.sync.journal_path(), 'a') as f:
+            f.write('Baz\t2.')
+        self.sync.run()
+
+        self.assertEqual([
+            mock.call('Baz', '2.0', 'http://a/Baz-2.0.tar.gz'),
+            mock.call('bar', '0.1', 'http://a/bar-0.1.zip'),
+        ], create.call_args_list)
+        self.assertFalse(os.path.exists(self.sync.journal_path()))
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.Sync.create')
+    def test_interrupted(self, create, ebuild_exists):
+        ebuild_exists.return_value = False
+        create.side_effect = [None, KeyboardInterrupt]
+        self.assertRaises(KeyboardInterrupt, self.sync.run)
+
+        self.assertEqual(set([('Baz', '2.0')]), self.sync.read_journal())
+        self.assertEqual(None, self.sync.read_serial())
+
+    def test_parse_shard(self):
+        self.assertEqual(None, Sync.parse_shard(''))
+        self.assertEqual((0, 1), Sync.parse_shard('1/1'))
+        self.assertRaises(GPyPiInvalidParameter, Sync.parse_shard, '0/4')
+        self.assertRaises(GPyPiInvalidParameter, Sync.parse_shard, '5/4')
+        self.assertRaises(GPyPiInvalidParameter, Sync.parse_shard, '4')
+
+    @mock.patch('gpypi.sync.Sync.sync_packages')
+    def test_shard(self, sync_packages):
+        synced = []
+        for i in range(1, 4):
+            self.sync.config.shard = '%d/3' % i
+            sync = Sync(self.sync.config, self.pypi)
+            sync.run()
+            synced.extend(sync_packages.call_args[0][0])
+            self.assertEqual(4, sync.read_serial())
+            self.assertTrue(sync.serial_path().endswith('gpypi-serial-%d-of-3' % i))
+        self.assertItemsEqual(['Baz', 'bar', 'foo'], synced)
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.Sync.create')
+    def test_processes(self, create, ebuild_exists):
+        # workers run in other processes, mocks can't record calls
+        created = os.path.join(self.overlay, 'created')
+
+        def write(pn, version, url):
+            with open(created, 'a') as f:
+                f.write('%s %s\n' % (pn, version))
+
+        create.side_effect = write
+        ebuild_exists.return_value = False
+        self.sync.config.processes = 2
+        self.sync.config.multicall_size = 1
+        self.sync.run()
+
+        with open(created) as f:
+            self.assertItemsEqual(['Baz 2.0\n', 'bar 0.1\n', 'foo 1.0\n'], f.readlines())
+        self.assertEqual(4, self.sync.read_serial())
+        self.assertFalse(os.path.exists(self.sync.journal_path()))
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    def test_plan(self, ebuild_exists):
+        ebuild_exists.side_effect = lambda atom: atom == 'dev-python/bar-0.1'
+        path = os.path.join(self.overlay, 'plan')
+        self.assertRaises(GPyPiCacheMiss, self.sync.write_plan, path)
+
+        self.pypi.list_packages()
+        self.pypi.call_many([('package_releases', ('foo',)), ('package_releases', ('bar',)),
+            ('release_urls', ('foo', '1.0')), ('release_urls', ('foo', '1.1'))])
+        requests = self.server.requests
+        self.sync.write_plan(path)
+        self.assertEqual(requests, self.server.requests)
+
+        plan = Sync.read_plan(path)
+        self.assertEqual([{'pn': 'foo', 'pv': '1.0', 'url': 'http://a/foo-1.0.tar.gz', 'size': 100}],
+            plan['entries'])
+        self.assertEqual({'packages': 3, 'versions': 3, 'existing': 1, 'no_source': 1,
+            'not_cached': 1, 'planned': 1, 'bytes': 100}, plan['stats'])
+
+    @mock.patch('gpypi.sync.PortageUtils.ebuild_exists')
+    @mock.patch('gpypi.sync.Sync.create')
+    def test_run_plan(self, create, ebuild_exists):
+        path = os.path.join(self.overlay, 'plan')
+        with open(path, 'w') as f:
+            f.write('{"category": "dev-python", "entries": ['
+                '{"pn": "foo", "pv": "1.0", "url": "http://a/foo-1.0.tar.gz", "size": 100},'
+                '{"pn": "bar", "pv": "0.1", "url": "http://a/bar-0.1.zip", "size": 10}]}')
+        self.sync.record('foo', '1.0')
+        self.sync.close_journal()
+
+        self.sync.run_plan(path)
+        self.assertEqual([mock.call('bar', '0.1', 'http://a/bar-0.1.zip')], create.call_args_list)
+        self.assertFalse(ebuild_exists.called)
+        self.assertEqual(0, self.server.requests)
+        self.assertFalse(os.path.exists(self.sync.journal_path()))
+
+    def test_read_plan(self):
+        path = os.path.join(self.overlay, 'plan')
+        self.assertRaises(GPyPiInvalidParameter, Sync.read_plan, path)
+        with open(path, 'w') as f:
+            f.write('{}')
+        self.assertRaises(GPyPiInvalidParameter, Sync.read_plan, path)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import urllib
+from StringIO import StringIO
+
+from gpypi.cache import DistfileCache
+from gpypi.unpack import *
+from gpypi.exc import *
+from gpypi.tests import *
+
+
+class TestNativeUnpacker(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.unpacker = NativeUnpacker(tmpdir=self.tmp)
+        self.addCleanup(self.unpacker.cleanup)
+
+    def url(self, path):
+        return 'file://' + urllib.pathname2url(path)
+
+    def make_tar(self, members, name='foobar-1.0.tar.gz'):
+        path = os.path.join(self.tmp, name)
+        content = 'from distutils.core import setup\n'
+        tar = tarfile.open(path, 'w:gz')
+        for member in members:
+            info = tarfile.TarInfo(member)
+            info.size = len(content)
+            tar.addfile(info, StringIO(content))
+        tar.close()
+        return path
+
+    def test_unpack_tar(self):
+        path = self.make_tar(['foobar-1.0/setup.py', 'foobar-1.0/foobar/__init__.py'])
+        workdir = self.unpacker.unpack(self.url(path))
+        self.assertEqual(['foobar-1.0'], os.listdir(workdir))
+        self.assertTrue(os.path.isfile(os.path.join(workdir, 'foobar-1.0', 'foobar', '__init__.py')))
+
+    def test_unpack_zip(self):
+        path = os.path.join(self.tmp, 'foobar-1.0.zip')
+        archive = zipfile.ZipFile(path, 'w')
+        archive.writestr('foobar-1.0/setup.py', 'from distutils.core import setup\n')
+        archive.close()
+
+        workdir = self.unpacker.unpack(self.url(path))
+        self.assertTrue(os.path.isfile(os.path.join(workdir, 'foobar-1.0', 'setup.py')))
+
+    def test_unsafe_members(self):
+        path = self.make_tar(['foobar-1.0/setup.py', '../evil.py', '/tmp/evil.py'])
+        with Archive(path) as archive:
+            self.assertEqual('tar', archive.kind)
+        workdir = self.unpacker.unpack(self.url(path))
+        self.assertEqual(['foobar-1.0'], os.listdir(workdir))
+        self.assertFalse(os.path.exists(os.path.join(self.unpacker.scratch, 'evil.py')))
+
+    def test_unsafe_symlink(self):
+        path = os.path.join(self.tmp, 'foobar-1.0.tar')
+        tar = tarfile.open(path, 'w')
+        for name, target in [('foobar-1.0/passwd', '../../../etc/passwd'), ('foobar-1.0/link', 'setup.py')]:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tar.addfile(info)
+        tar.close()
+
+        workdir = self.unpacker.unpack(self.url(path))
+        self.assertEqual(['link'], os.listdir(os.path.join(workdir, 'foobar-1.0')))
+
+    def test_cleanup(self):
+        workdir = self.unpacker.unpack(self.url(self.make_tar(['foobar-1.0/setup.py'])))
+        self.unpacker.cleanup()
+        self.assertFalse(os.path.exists(workdir))
+        self.assertEqual(None, self.unpacker.scratch)
+
+    def test_fetch_failure(self):
+        self.assertRaises(GPyPiCouldNotUnpackEbuild, self.unpacker.unpack,
+            self.url(os.path.join(self.tmp, 'missing-1.0.tar.gz')))
+        self.assertRaises(GPyPiCouldNotUnpackEbuild, self.unpacker.unpack,
+            'mirror://unknown/foobar-1.0.tar.gz')
+        self.assertRaises(GPyPiCouldNotUnpackEbuild, self.unpacker.unpack, '')
+
+    def test_not_an_archive(self):
+        path = os.path.join(self.tmp, 'foobar-1.0.tar.gz')
+        open(path, 'w').write('not an archive')
+        self.assertRaises(GPyPiCouldNotUnpackEbuild, self.unpacker.unpack, self.url(path))
+
+    def test_fetch_once(self):
+        path = self.make_tar(['foobar-1.0/setup.py'])
+        self.unpacker.unpack(self.url(path))
+        os.unlink(path)
+        workdir = self.unpacker.unpack(self.url(path))
+        self.assertEqual(['foobar-1.0'], os.listdir(workdir))
+
+    def test_distfile_cache(self):
+        path = self.make_tar(['foobar-1.0/setup.py'])
+        cache = DistfileCache(os.path.join(self.tmp, 'distfiles'))
+        unpacker = NativeUnpacker(tmpdir=self.tmp, cache=cache)
+        unpacker.unpack(self.url(path))
+        unpacker.cleanup()
+        os.unlink(path)
+
+        workdir = unpacker.unpack(self.url(path))
+        self.assertEqual(['foobar-1.0'], os.listdir(workdir))
+        unpacker.cleanup()
+
+    def test_seed_distdir(self):
+        path = self.make_tar(['foobar-1.0/setup.py'])
+        distdir = os.path.join(self.tmp, 'distfiles')
+        os.mkdir(distdir)
+
+        target = self.unpacker.seed_distdir(self.url(path), distdir)
+        self.assertEqual(os.path.join(distdir, 'foobar-1.0.tar.gz'), target)
+        self.assertEqual(open(path).read(), open(target).read())
+
+        os.unlink(path)
+        self.assertEqual(target, self.unpacker.seed_distdir(self.url(path), distdir))
+        self.assertEqual(None, self.unpacker.seed_distdir(self.url(path), os.path.join(self.tmp, 'missing')))
+
+    def test_inspect(self):
+        path = self.make_tar(['foobar-1.0/setup.py', 'foobar-1.0/PKG-INFO',
+            'foobar-1.0/foobar.egg-info/requires.txt', 'foobar-1.0/foobar.egg-info/SOURCES.txt',
+            'foobar-1.0/docs/index.rst', 'foobar-1.0/foobar/tests/setup.py',
+            'foobar-1.0/foobar/__init__.py', 'foobar-1.0/foobar/core.py'])
+        workdir = self.unpacker.inspect(self.url(path))
+
+        s = os.path.join(workdir, 'foobar-1.0')
+        extracted = set()
+        for root, dirs, files in os.walk(s):
+            extracted.update(os.path.relpath(os.path.join(root, name), s) for name in files)
+        self.assertEqual(set(['setup.py', 'PKG-INFO', 'foobar.egg-info/requires.txt',
+            'foobar/__init__.py']), extracted)
+        self.assertTrue(os.path.isdir(os.path.join(s, 'docs')))
+        self.assertTrue(os.path.isdir(os.path.join(s, 'foobar', 'tests')))
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import logging
 
 import gpypi
 from gpypi.utils import *
@@ -34,3 +35,85 @@ class TestUtils(BaseTestCase):
         file_ = recursivley_find_file(os.path.dirname(
             os.path.abspath(gpypi.__file__)), 'test_pypi.py')
         self.assertRegexpMatches(file_, '.+gpypi/tests/test_pypi.py$')
+
+
+class TestMemoize(BaseTestCase):
+    """"""
+
+    def setUp(self):
+        self.calls = calls = []
+
+        class Foo(object):
+            @classmethod
+            @memoize(maxsize=2)
+            def split(cls, value, sep='-'):
+                calls.append((cls.__name__, value))
+                return value.split(sep)
+
+        class Bar(Foo):
+            pass
+
+        self.Foo, self.Bar = Foo, Bar
+        self.addCleanup(memoize.functions.remove, Foo.split.im_func)
+
+    def test_cached(self):
+        self.assertEqual(['a', 'b'], self.Foo.split('a-b'))
+        self.assertEqual(['a', 'b'], self.Foo.split('a-b'))
+        self.assertEqual(['a-b'], self.Foo.split('a-b', sep='.'))
+        self.assertEqual([('Foo', 'a-b'), ('Foo', 'a-b')], self.calls)
+        self.assertEqual((1, 2, 2), self.Foo.split.cache_info())
+
+    def test_result_copied(self):
+        self.Foo.split('a-b').append('c')
+        self.assertEqual(['a', 'b'], self.Foo.split('a-b'))
+
+    def test_immutable(self):
+        class Foo(object):
+            @classmethod
+            @memoize(immutable=True)
+            def split(cls, value):
+                return tuple(value.split('-'))
+        self.addCleanup(memoize.functions.remove, Foo.split.im_func)
+        self.assertTrue(Foo.split('a-b') is Foo.split('a-b'))
+
+    def test_lru(self):
+        self.Foo.split('a')
+        self.Foo.split('b')
+        self.Foo.split('a')
+        self.Foo.split('c')
+        self.Foo.split('a')
+        self.Foo.split('b')
+        self.assertEqual(['a', 'b', 'c', 'b'], [value for cls, value in self.calls])
+
+    def test_subclass(self):
+        self.Foo.split('a')
+        self.Bar.split('a')
+        self.assertEqual([('Foo', 'a'), ('Bar', 'a')], self.calls)
+
+    def test_unhashable(self):
+        class Unhashable(str):
+            __hash__ = None
+
+        self.assertEqual(['a', 'b'], self.Foo.split(Unhashable('a-b')))
+        self.assertEqual(['a', 'b'], self.Foo.split(Unhashable('a-b')))
+        self.assertEqual(2, len(self.calls))
+
+    def test_disabled(self):
+        self.addCleanup(setattr, memoize, 'enabled', True)
+        memoize.enabled = False
+        self.Foo.split('a')
+        self.Foo.split('a')
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual((0, 0, 0), self.Foo.split.cache_info())
+
+    def test_log_stats(self):
+        handler = ListHandler()
+        logger = logging.getLogger('test_memoize')
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        self.addCleanup(logger.removeHandler, handler)
+
+        self.Foo.split('a')
+        self.Foo.split('a')
+        memoize.log_stats(logger)
+        self.assertTrue('Memoized %s.split: 1 hits, 1 misses, 1 cached' % __name__ in handler.debug)
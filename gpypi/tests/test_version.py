@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import itertools
+
+import mock
+
+from gpypi.enamer import Enamer
+from gpypi.version import *
+from gpypi.tests import *
+
+
+class TestVersionTokenizer(BaseTestCase):
+    """"""
+
+    TOKENS = ['1', '0', '.', '-', '_', 'a', 'b', 'c', 'r', 'p', 'dev', 'pre',
+              'beta', 'RC', 'test', 'patch', 'final', 'preview', 'x', u'\xe4']
+
+    def test_same_as_regex(self):
+        """Tokenizer gives the same results as regexes"""
+        for tokens in itertools.product(self.TOKENS, repeat=3):
+            up_pv = ''.join(tokens)
+            self.assertEqual(Enamer.parse_pv_regex(up_pv), VersionTokenizer.parse(up_pv), repr(up_pv))
+
+    def test_parse(self):
+        self.assertEqual(('1.0_pre5.3', ['${PV: -2}-r3', '${PV/_pre/.devr}']), VersionTokenizer.parse('1.0.devr5-r3'))
+        self.assertEqual(('1.0.1234', ['${PV: -5}-r1234', '${PV}.dev']), VersionTokenizer.parse('1.0.dev-r1234'))
+        self.assertEqual(('1.0_rc2.3', ['${PV: -2}-r3', '${PV/_rc/c}']), VersionTokenizer.parse('1.0c2-r3'))
+        self.assertEqual(('1.0', ['${PV}-Final']), VersionTokenizer.parse('1.0-Final'))
+        self.assertEqual(('', []), VersionTokenizer.parse('1.0'))
+        self.assertEqual(('1.0', ['foo']), VersionTokenizer.parse('1.0', '1.0', ['foo']))
+
+    def test_long_version(self):
+        """Long versions are converted quickly"""
+        self.assertEqual(('', []), VersionTokenizer.parse('1' + '.-' * 50000 + 'x'))
+        self.assertEqual(('1.0' + 'a' * 49999 + '_alpha', ['${PV/_alpha/a}']),
+            VersionTokenizer.parse('1.0' + 'a' * 50000))
+
+    def test_regex_fallback(self):
+        class RegexEnamer(Enamer):
+            PV_TOKENIZER = None
+
+        with mock.patch.object(VersionTokenizer, 'parse') as parse:
+            self.assertEqual(('1.0_beta2', ('${PV/_beta/b}',)), RegexEnamer.parse_pv('1.0b2'))
+            self.assertFalse(parse.called)
@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.unpack
+
+Source unpacking
+****************
+
+:class:`NativeUnpacker` downloads source distribution of a package and
+extracts it with :mod:`tarfile` or :mod:`zipfile` into a private
+scratch directory. That is all :class:`gpypi.ebuild.Ebuild` needs
+from ``ebuild <path> digest setup clean unpack``, which is still used
+with ``--unpack portage``.
+
+Downloaded archives are kept in :class:`gpypi.cache.DistfileCache` and
+copied to ${DISTDIR} for portage and repoman, so each archive is
+fetched once per host.
+
+"""
+
+import os
+import socket
+import shutil
+import httplib
+import fnmatch
+import logging
+import tarfile
+import zipfile
+import tempfile
+import urllib2
+import urlparse
+
+from gpypi.cache import DistfileCache
+from gpypi.probe import UriProber
+from gpypi.exc import *
+
+log = logging.getLogger(__name__)
+
+
+class Archive(object):
+    """Tar (any compression) or zip archive.
+
+    :param path: Path to archive
+    :type path: string
+    :raises: :exc:`gpypi.exc.GPyPiCouldNotUnpackEbuild` if file is
+        not a supported archive
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            if zipfile.is_zipfile(path):
+                self.kind = 'zip'
+                self.archive = zipfile.ZipFile(path)
+            else:
+                self.kind = 'tar'
+                self.archive = tarfile.open(path, 'r:*')
+        except (tarfile.TarError, zipfile.BadZipfile, IOError), e:
+            raise GPyPiCouldNotUnpackEbuild("Could not open archive %s: %s" % (path, e))
+
+    def __repr__(self):
+        return "<Archive %s %s>" % (self.kind, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close archive file"""
+        self.archive.close()
+
+    @classmethod
+    def is_safe(cls, name):
+        """Return True if member ``name`` stays inside extraction directory.
+
+        **Example:**
+
+        >>> Archive.is_safe('foobar-1.0/setup.py')
+        True
+        >>> Archive.is_safe('../foobar-1.0/setup.py'), Archive.is_safe('/etc/passwd')
+        (False, False)
+
+        """
+        name = name.replace('\\', '/')
+        return not name.startswith('/') and '..' not in name.split('/')
+
+    def members(self):
+        """Return list of archive members (:class:`tarfile.TarInfo`
+        or :class:`zipfile.ZipInfo`)"""
+        if self.kind == 'zip':
+            return self.archive.infolist()
+        return self.archive.getmembers()
+
+    @classmethod
+    def member_name(cls, member):
+        """Return path of a member"""
+        if isinstance(member, zipfile.ZipInfo):
+            return member.filename
+        return member.name
+
+    @classmethod
+    def is_dir(cls, member):
+        """Return True if member is a directory"""
+        if isinstance(member, zipfile.ZipInfo):
+            return member.filename.endswith('/')
+        return member.isdir()
+
+    def safe_members(self):
+        """Yield members that can be extracted safely. Members with
+        unsafe paths, links pointing outside and device files are
+        skipped.
+        """
+        for member in self.members():
+            name = self.member_name(member)
+            if not self.is_safe(name):
+                log.warn("Skipping unsafe archive member %s", name)
+                continue
+            if self.kind == 'tar':
+                if member.issym() or member.islnk():
+                    target = member.linkname
+                    if member.issym():
+                        target = os.path.join(os.path.dirname(name), target)
+                    if not self.is_safe(os.path.normpath(target)):
+                        log.warn("Skipping archive link %s -> %s", name, member.linkname)
+                        continue
+                elif not (member.isfile() or member.isdir()):
+                    continue
+            yield member
+
+    def extractall(self, directory, members=None):
+        """Extract ``members`` (default :meth:`safe_members`) into ``directory``.
+
+        :raises: :exc:`gpypi.exc.GPyPiCouldNotUnpackEbuild`
+
+        """
+        if members is None:
+            members = list(self.safe_members())
+        try:
+            self.archive.extractall(directory, members)
+        except (tarfile.TarError, zipfile.BadZipfile, IOError, OSError), e:
+            raise GPyPiCouldNotUnpackEbuild("Could not extract %s: %s" % (self.path, e))
+
+    def extract_matching(self, directory, patterns):
+        """Extract only files matching one of ``patterns`` into
+        ``directory``. Patterns are matched against path of a member
+        and path below its top level directory. Directories of all
+        members are created (empty), so layout of the archive can
+        still be examined.
+
+        :param patterns: :mod:`fnmatch` patterns
+        :type patterns: sequence of strings
+        :returns: number of extracted files
+        :raises: :exc:`gpypi.exc.GPyPiCouldNotUnpackEbuild`
+
+        """
+        members = []
+        dirs = set()
+        for member in self.safe_members():
+            name = self.member_name(member).rstrip('/')
+            if self.is_dir(member):
+                dirs.add(name)
+                continue
+            dirs.add(os.path.dirname(name))
+            if self.kind == 'tar' and not member.isfile():
+                continue
+            tail = name.split('/', 1)[-1]
+            for pattern in patterns:
+                if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(tail, pattern):
+                    members.append(member)
+                    break
+
+        for name in dirs:
+            path = os.path.join(directory, name)
+            if name and not os.path.isdir(path):
+                os.makedirs(path)
+        self.extractall(directory, members)
+        return len(members)
+
+
+class NativeUnpacker(object):
+    """Fetches and extracts sources in process. Files are kept in a
+    scratch directory until :meth:`cleanup`.
+
+    :param timeout: Socket timeout for downloads in seconds
+    :type timeout: int
+    :param tmpdir: Directory to create scratch directory in,
+        system default if None
+    :type tmpdir: string
+    :param cache: Cache of downloaded archives, None to download
+        every time
+    :type cache: :class:`gpypi.cache.DistfileCache`
+
+    :attr:`scratch` -- scratch directory, None before first download
+
+    :attr:`fetched` -- dict of URLs fetched by this instance and paths
+        to their archives
+
+    :attr:`ANALYSIS_FILES` -- files :meth:`inspect` extracts;
+        ``__init__.py`` files let :func:`setuptools.find_packages` work
+
+    """
+    ANALYSIS_FILES = ('setup.py', 'setup.cfg', 'PKG-INFO', '*.egg-info/requires.txt',
+        '__init__.py', '*/__init__.py')
+
+    def __init__(self, timeout=60, tmpdir=None, cache=None):
+        self.timeout = timeout
+        self.tmpdir = tmpdir
+        self.cache = cache
+        self.scratch = None
+        self.fetched = {}
+
+    def __repr__(self):
+        return "<NativeUnpacker %s>" % self.scratch
+
+    @classmethod
+    def from_config(cls, options):
+        """Create unpacker from `cache_dir` and `distfile_cache_size`
+        options.
+
+        :param options: Configuration
+        :type options: :class:`gpypi.config.ConfigManager` instance
+        :returns: :class:`NativeUnpacker` instance
+
+        """
+        cache = None
+        if options.cache_dir:
+            path = os.path.join(options.cache_dir, 'distfiles')
+            try:
+                cache = DistfileCache.open(path, options.distfile_cache_size * 1024 * 1024)
+            except OSError, e:
+                log.warn("Could not use distfile cache %s: %s", path, e)
+        return cls(cache=cache)
+
+    @classmethod
+    def distfile_name(cls, url):
+        """Return file name of archive at ``url``.
+
+        **Example:**
+
+        >>> NativeUnpacker.distfile_name('http://pypi.python.org/packages/source/f/foobar/foobar-1.0.tar.gz#md5=00')
+        'foobar-1.0.tar.gz'
+
+        """
+        return os.path.basename(urlparse.urlparse(url).path) or 'source'
+
+    def mkdtemp(self):
+        """Return new directory inside :attr:`scratch`"""
+        if self.scratch is None:
+            self.scratch = tempfile.mkdtemp(prefix='gpypi-', dir=self.tmpdir)
+        return tempfile.mkdtemp(dir=self.scratch)
+
+    def fetch(self, uri, directory):
+        """Download ``uri`` into ``directory``, unless it was already
+        fetched or is in cache.
+
+        :param uri: HTTP(S), FTP, file or ``mirror://`` URI
+        :type uri: string
+        :returns: path of the archive
+        :raises: :exc:`gpypi.exc.GPyPiCouldNotUnpackEbuild`
+
+        """
+        url = UriProber.resolve(uri)
+        if not url:
+            raise GPyPiCouldNotUnpackEbuild("Unknown mirror in %s" % uri)
+        if url in self.fetched:
+            return self.fetched[url]
+        if self.cache is not None:
+            try:
+                path = self.fetched[url] = self.cache.lookup(url)
+                log.debug("Using cached distfile %s for %s", path, url)
+                return path
+            except KeyError:
+                pass
+
+        path = os.path.join(directory, self.distfile_name(url))
+        log.info("Fetching %s", url)
+        try:
+            response = urllib2.urlopen(url, timeout=self.timeout)
+            try:
+                with open(path, 'wb') as f:
+                    shutil.copyfileobj(response, f, 64 * 1024)
+            finally:
+                response.close()
+        except (urllib2.URLError, httplib.HTTPException, socket.error, IOError), e:
+            raise GPyPiCouldNotUnpackEbuild("Could not fetch %s: %s" % (url, e))
+
+        if self.cache is not None:
+            try:
+                path = self.cache.add(url, path)
+            except (IOError, OSError), e:
+                log.warn("Could not cache distfile %s: %s", url, e)
+        self.fetched[url] = path
+        return path
+
+    def unpack(self, uri, patterns=None):
+        """Fetch ``uri`` and extract it.
+
+        :param uri: Source URI
+        :type uri: string
+        :param patterns: Extract only files matching these patterns,
+            see :meth:`Archive.extract_matching`
+        :type patterns: sequence of strings
+        :returns: WORKDIR, directory the sources were extracted into
+        :raises: :exc:`gpypi.exc.GPyPiCouldNotUnpackEbuild`
+
+        """
+        if not uri:
+            raise GPyPiCouldNotUnpackEbuild("No source URI to unpack.")
+        build = self.mkdtemp()
+        workdir = os.path.join(build, 'work')
+        os.mkdir(workdir)
+
+        with Archive(self.fetch(uri, build)) as archive:
+            if patterns is None:
+                archive.extractall(workdir)
+            else:
+                archive.extract_matching(workdir, patterns)
+        log.debug("Unpacked %s into %s", uri, workdir)
+        return workdir
+
+    def inspect(self, uri):
+        """Fetch ``uri`` and extract only :attr:`ANALYSIS_FILES`
+        and directories.
+
+        :returns: WORKDIR
+        :raises: :exc:`gpypi.exc.GPyPiCouldNotUnpackEbuild`
+
+        """
+        return self.unpack(uri, self.ANALYSIS_FILES)
+
+    def seed_distdir(self, uri, distdir):
+        """Put archive of ``uri`` into ``distdir``, so portage
+        does not download it again. Failures are only logged.
+
+        :param uri: Source URI
+        :type uri: string
+        :param distdir: portage ${DISTDIR}
+        :type distdir: string
+        :returns: path of the archive in ``distdir`` or None
+
+        """
+        if not uri or not distdir:
+            return None
+        url = UriProber.resolve(uri) or uri
+        target = os.path.join(distdir, self.distfile_name(url))
+        if os.path.exists(target):
+            return target
+
+        try:
+            path = self.fetch(uri, self.mkdtemp())
+        except GPyPiCouldNotUnpackEbuild, e:
+            log.warn(e)
+            return None
+        try:
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copy(path, target)
+        except (IOError, OSError), e:
+            log.warn("Could not copy distfile to %s: %s", distdir, e)
+            return None
+        log.debug("Copied %s to %s", url, target)
+        return target
+
+    def cleanup(self):
+        """Remove scratch directory"""
+        if self.scratch is not None:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+            self.scratch = None
+        self.fetched = {}
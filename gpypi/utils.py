@@ -5,10 +5,14 @@
 
 import os
 import sys
+import copy
 import types
 import logging
+import functools
+import itertools
+import threading
+import collections
 
-from portage.output import EOutput
 from pkg_resources import EntryPoint
 
 
@@ -106,6 +110,7 @@ class PortageFormatter(logging.Formatter):
 
     def format(self, record):
         """format according to logging level"""
+        from portage.output import EOutput
         output = logging.Formatter(self._fmt, self.datefmt).format(record)
 
         class LoggingOutput(EOutput):
@@ -128,6 +133,171 @@ class PortageFormatter(logging.Formatter):
         return l.output or output
 
 
+class ThreadLogBuffer(logging.Filter):
+    """Logging filter that holds back records emitted while
+    :meth:`capture` runs in a thread. Held records are shown later with
+    :meth:`replay`, so output of concurrent jobs appears in a
+    deterministic order.
+
+    Filter must be added to handlers with :meth:`install`.
+    """
+
+    def __init__(self):
+        logging.Filter.__init__(self)
+        self.local = threading.local()
+
+    def filter(self, record):
+        records = getattr(self.local, 'records', None)
+        if records is None:
+            return True
+        # same record passes through every handler
+        if not records or records[-1] is not record:
+            records.append(record)
+        return False
+
+    def install(self, logger=None):
+        """Add filter to all handlers of ``logger`` (root by default)"""
+        for handler in (logger or logging.getLogger()).handlers:
+            handler.addFilter(self)
+
+    def uninstall(self, logger=None):
+        """Remove filter from all handlers of ``logger`` (root by default)"""
+        for handler in (logger or logging.getLogger()).handlers:
+            handler.removeFilter(self)
+
+    def capture(self, func, *args, **kwargs):
+        """Call ``func`` and hold back all log records it emits.
+
+        :returns: (records, return value, exc_info or None)
+        :rtype: tuple
+
+        """
+        records = self.local.records = []
+        try:
+            return records, func(*args, **kwargs), None
+        except Exception:
+            return records, None, sys.exc_info()
+        finally:
+            self.local.records = None
+
+    def replay(self, records, logger=None):
+        """Pass held back records to handlers of ``logger`` (root by default)"""
+        logger = logger or logging.getLogger()
+        for record in records:
+            logger.handle(record)
+
+
+class memoize(object):
+    """Decorator keeping up to ``maxsize`` least recently used results
+    of a function. Meant to be wrapped with :func:`classmethod`, so
+    the class is part of the key and subclasses get their own results.
+
+    Calls with unhashable arguments are not cached. Results are copied,
+    so callers may change them, unless ``immutable`` is set. Set
+    :attr:`enabled` to False to disable all caches.
+
+    :param maxsize: Maximum number of results kept
+    :type maxsize: int
+    :param immutable: Results can not be changed (tuples of strings),
+        so they are returned without copying
+    :type immutable: bool
+
+    :attr:`functions` -- all memoized functions, see :meth:`log_stats`
+
+    Example::
+
+        >>> class Foo(object):
+        ...     @classmethod
+        ...     @memoize(maxsize=10)
+        ...     def double(cls, x):
+        ...         return [x, x]
+        >>> Foo.double(1), Foo.double(1)
+        ([1, 1], [1, 1])
+        >>> Foo.double.cache_info()
+        (1, 1, 1)
+
+    """
+    enabled = True
+    functions = []
+
+    def __init__(self, maxsize=1024, immutable=False):
+        self.maxsize = maxsize
+        self.immutable = immutable
+
+    def __call__(self, func):
+        results = collections.OrderedDict()
+        stats = {'hits': 0, 'misses': 0}
+        lock = threading.Lock()
+        copy_result = (lambda result: result) if self.immutable else copy.deepcopy
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not memoize.enabled:
+                return func(*args, **kwargs)
+            try:
+                key = (args, frozenset(kwargs.iteritems()))
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+
+            with lock:
+                if key in results:
+                    stats['hits'] += 1
+                    result = results.pop(key)
+                    results[key] = result
+                    return copy_result(result)
+                stats['misses'] += 1
+
+            result = func(*args, **kwargs)
+            with lock:
+                results[key] = result
+                if len(results) > self.maxsize:
+                    results.popitem(last=False)
+            return copy_result(result)
+
+        def cache_info():
+            """Return (hits, misses, size)"""
+            return stats['hits'], stats['misses'], len(results)
+
+        def cache_clear():
+            """Remove all results and reset statistics"""
+            with lock:
+                results.clear()
+                stats.update(hits=0, misses=0)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        memoize.functions.append(wrapper)
+        return wrapper
+
+    @classmethod
+    def log_stats(cls, logger=None):
+        """Log hits and misses of all memoized functions at debug level"""
+        logger = logger or logging.getLogger(__name__)
+        for func in cls.functions:
+            hits, misses, size = func.cache_info()
+            if hits or misses:
+                logger.debug("Memoized %s.%s: %d hits, %d misses, %d cached",
+                    func.__module__, func.__name__, hits, misses, size)
+
+
+def chunked(iterable, size):
+    """Yield lists of up to ``size`` items from ``iterable``
+
+    Example::
+
+        >>> list(chunked(xrange(5), 2))
+        [[0, 1], [2, 3], [4]]
+
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def recursivley_find_file(path, filename, in_text=None):
     """Find filename in specified path recursively"""
     for root, dirs, files in os.walk(path):
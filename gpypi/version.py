@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+.. currentmodule:: gpypi.version
+
+Version conversion
+******************
+
+:class:`VersionTokenizer` converts upstream versions to :term:`PV` and
+:term:`MY_PV` the same way as regexes of
+:meth:`gpypi.enamer.Enamer.parse_pv_regex`, but in a single pass over
+the version. Every rule only looks at the end of a version, which is
+split from the right into tokens::
+
+    1.0-rc.2
+    ^^^      head
+       ^^^   keyword with separators
+          ^  separators
+           ^ number
+
+so conversion takes linear time regardless of input.
+
+"""
+
+import string
+import logging
+
+log = logging.getLogger(__name__)
+
+SEPARATORS = frozenset('._-')
+DIGITS = frozenset(string.digits)
+ASCII_LOWER = dict((ord(c), ord(c.lower())) for c in string.ascii_uppercase)
+ASCII_LOWER_BYTES = string.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def ascii_lower(s):
+    """Lowercase ASCII letters only, as case-insensitive regexes do.
+
+    >>> ascii_lower(u'1.0B\\xc4')
+    u'1.0b\\xc4'
+
+    """
+    if isinstance(s, unicode):
+        return s.translate(ASCII_LOWER)
+    return s.translate(ASCII_LOWER_BYTES)
+
+
+class VersionTokenizer(object):
+    """Converts upstream versions to Gentoo versions by looking at
+    their suffix.
+
+    :attr:`REVISION_RULE` -- rule for revision-like suffixes, tried first
+
+    :attr:`SUFFIX_RULES` -- rules tried in order, first match wins
+
+    :attr:`BAD_SUFFIXES` -- suffixes dropped from version if no rule matches
+
+    A rule is tuple of (portage suffix, keywords, separators allowed
+    after keyword, "r" allowed after keyword, number required).
+
+    """
+    REVISION_RULE = ('', ('r', 'patch', 'p'), True, False, False)
+    SUFFIX_RULES = [
+        ('_beta', ('beta',), True, False, False),
+        ('_beta', ('b',), False, False, False),
+        ('_rc', ('rc',), True, False, False),
+        ('_rc', ('c',), True, False, False),
+        ('_pre', ('dev',), True, True, True),
+        ('_pre', ('pre', 'preview'), True, False, False),
+        ('_alpha', ('alpha', 'test'), True, False, False),
+        ('_alpha', ('a',), True, False, False),
+    ]
+    BAD_SUFFIXES = ('dev', 'devel', 'final', 'stable', 'snapshot')
+
+    @classmethod
+    def tokenize(cls, up_pv):
+        """Split version from the right into head, trailing
+        separators and number.
+
+        :param up_pv: Upstream version
+        :type up_pv: string
+        :returns: (lowercased version, end of head, end of separators)
+        :rtype: tuple
+
+        **Example:**
+
+        >>> VersionTokenizer.tokenize('1.0-RC.2')
+        ('1.0-rc.2', 6, 7)
+
+        """
+        lower = ascii_lower(up_pv)
+        number = len(lower)
+        while number and lower[number - 1] in DIGITS:
+            number -= 1
+        head = number
+        while head and lower[head - 1] in SEPARATORS:
+            head -= 1
+        return lower, head, number
+
+    @classmethod
+    def skip_separators(cls, lower, end):
+        """Return start of separators ending at ``end``"""
+        while end and lower[end - 1] in SEPARATORS:
+            end -= 1
+        return end
+
+    @classmethod
+    def match(cls, rule, tokens):
+        """Match rule against tokens of a version.
+
+        :param rule: One of :attr:`SUFFIX_RULES`
+        :param tokens: Result of :meth:`tokenize`
+        :returns: start of the part replaced with portage suffix, None
+            if rule does not match
+        :rtype: int
+
+        """
+        suffix, keywords, separators, revision, number_required = rule
+        lower, head, number = tokens
+        if number_required and number == len(lower):
+            return None
+        if head == number:
+            # keyword directly before number, maybe an "r"
+            if revision and head and lower[head - 1] == 'r':
+                end = cls.skip_separators(lower, head - 1)
+                for keyword in keywords:
+                    if lower.endswith(keyword, 0, end):
+                        return cls.skip_separators(lower, end - len(keyword))
+        elif not separators:
+            return None
+        # number is preceded by something else than separators
+        if head and lower[head - 1] in DIGITS:
+            return None
+        for keyword in keywords:
+            if lower.endswith(keyword, 0, head):
+                return cls.skip_separators(lower, head - len(keyword))
+        return None
+
+    @classmethod
+    def parse(cls, up_pv, pv="", my_pv=None):
+        """Convert upstream version, see
+        :meth:`gpypi.enamer.Enamer.parse_pv`.
+
+        **Example:**
+
+        >>> VersionTokenizer.parse('1.0dev20091118')
+        ('1.0_pre20091118', ['${PV/_pre/dev}'])
+        >>> VersionTokenizer.parse('1.0-r1')
+        ('1.0.1', ['${PV: -2}-r1'])
+
+        """
+        my_pv = my_pv or []
+        additional_version = ""
+
+        tokens = cls.tokenize(up_pv)
+        start = cls.match(cls.REVISION_RULE, tokens)
+        if start is not None:
+            number = tokens[2]
+            replace_me, rev = up_pv[start:number], up_pv[number:]
+            pv = up_pv = up_pv[:start]
+            additional_version = '.' + rev
+            my_pv.append("${PV: -%d}%s" % (len(additional_version), replace_me + rev))
+            log.debug("parse_pv: new up_pv(%s), additional_version(%s), my_pv(%s)",
+                up_pv, additional_version, my_pv)
+            tokens = cls.tokenize(up_pv)
+
+        lower, head, number = tokens
+        for rule in cls.SUFFIX_RULES:
+            start = cls.match(rule, tokens)
+            if start is not None:
+                portage_suffix = rule[0]
+                major_ver, replace_me, rev = up_pv[:start], up_pv[start:number], up_pv[number:]
+                pv = major_ver + portage_suffix + rev
+                my_pv.append("${PV/%s/%s}" % (portage_suffix, replace_me))
+                log.debug("parse_pv: major_ver(%s) replace_me(%s), rev(%s)", major_ver, replace_me, rev)
+                break
+        else:
+            # Single suffixes with no numeric component are simply removed.
+            if head == len(lower):
+                for bad_suffix in cls.BAD_SUFFIXES:
+                    if lower.endswith(bad_suffix):
+                        suffix = up_pv[cls.skip_separators(lower, head - len(bad_suffix)):]
+                        my_pv.append("${PV}%s" % suffix)
+                        pv = up_pv[:-len(suffix)]
+                        break
+
+        pv = pv + additional_version
+        log.debug("parse_pv: pv(%s), my_pv(%s)", pv, my_pv)
+        return pv, my_pv